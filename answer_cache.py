@@ -0,0 +1,201 @@
+"""
+Answer cache for repeated questions about the same video
+Near-duplicate phrasings are found with MinHash signatures over character shingles, then have to
+agree word for word on everything but minor words, so "risks of X" never answers "benefits of X"
+"""
+
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+# Words that don't change what is being asked
+FILLER_WORDS = {
+    'a', 'an', 'the', 'please', 'can', 'could', 'would', 'you', 'me', 'tell', 'give',
+    'us', 'i', 'want', 'to', 'know', 'video', 'in', 'of', 'is', 'are', 'what', 'whats',
+}
+
+# Words that flip or narrow a question; two questions must use the same ones to match, whatever else agrees
+NEGATIONS = {
+    'not', 'no', 'never', 'none', 'nothing', 'without', 'dont', 'doesnt', 'didnt', 'isnt', 'arent',
+    'wasnt', 'werent', 'cant', 'cannot', 'wont', 'shouldnt', 'nor', 'neither', 'except', 'but',
+}
+
+# Words two phrasings of the same question may differ in; any other difference is a different question
+MINOR_WORDS = {
+    'this', 'that', 'does', 'do', 'did', 'about', 'on', 'for', 'from', 'with', 'by', 'there', 'be',
+    'any', 'some', 'all', 'say', 'says', 'said', 'talk', 'talks', 'discuss', 'discussed', 'mentioned',
+    'speaker', 'clip', 'talked', 'covered', 'cover', 'main', 'key', 'briefly', 'quick', 'quickly',
+}
+
+# Words that usually point back at earlier turns ("explain that", "what about him?")
+REFERRING_WORDS = {
+    'it', 'that', 'this', 'these', 'those', 'they', 'them', 'he', 'she', 'him', 'her',
+    'his', 'its', 'their', 'more', 'else', 'again', 'above', 'previous', 'earlier',
+    'elaborate', 'expand', 'also', 'same', 'why', 'instead',
+}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUM_PERM = 64
+_SHINGLE_SIZE = 3
+
+# Fixed seeds so signatures are stable across processes
+_PERMUTATIONS = [
+    ((i * 0x9E3779B97F4A7C15 + 1) % _MERSENNE_PRIME | 1, (i * 0xBF58476D1CE4E5B9 + 7) % _MERSENNE_PRIME)
+    for i in range(1, _NUM_PERM + 1)
+]
+
+
+def normalize_question(question):
+    """Lowercase, strip punctuation and filler words"""
+    words = re.findall(r"[a-z0-9]+", question.lower().replace("'", ""))
+    kept = [w for w in words if w not in FILLER_WORDS]
+    return ' '.join(kept or words)
+
+
+def _words(normalized):
+    # Stemmed just enough to make "point"/"points" and "risk"/"risks" the same word
+    return {
+        w[:-1] if len(w) > 3 and w.endswith('s') and not w.endswith('ss') and w not in MINOR_WORDS else w
+        for w in normalized.split()
+    }
+
+
+def content_words_agree(normalized_a, normalized_b, min_overlap=0.5):
+    """Whether two normalized questions ask the same thing, word for word
+
+    All their words must overlap by at least min_overlap (Jaccard), and apart from minor words they must
+    be the same words: a negation or a different content word on either side means a different question
+    """
+    words_a, words_b = _words(normalized_a), _words(normalized_b)
+    if words_a & NEGATIONS != words_b & NEGATIONS:
+        return False
+    union = words_a | words_b
+    if not union or len(words_a & words_b) / len(union) < min_overlap:
+        return False
+    return words_a - MINOR_WORDS == words_b - MINOR_WORDS
+
+
+def minhash_signature(normalized):
+    """MinHash signature over character shingles of a normalized question"""
+    text = f" {normalized} "
+    shingles = {text[i:i + _SHINGLE_SIZE] for i in range(max(len(text) - _SHINGLE_SIZE + 1, 1))}
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def signature_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def is_context_dependent(question, has_history):
+    """True when the answer likely depends on earlier turns rather than the video alone"""
+    if not has_history:
+        return False
+
+    text = re.sub(r"\b(this|the) (video|clip|talk)\b", " ", question.lower())
+    words = re.findall(r"[a-z]+", text)
+    return len(words) < 3 or any(w in REFERRING_WORDS for w in words)
+
+
+class AnswerCache:
+    """LRU cache of answers keyed by video and normalized question"""
+
+    def __init__(self, max_entries=2000, max_per_video=64, threshold=0.8):
+        self.max_entries = max_entries
+        self.max_per_video = max_per_video
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._videos = OrderedDict()  # video_id -> OrderedDict(normalized -> (signature, answer))
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _match(self, entries, normalized):
+        """Key of the entry matching a normalized question, or None (caller holds the lock)"""
+        # Exact match on the normalized form is a dict lookup
+        if normalized in entries:
+            return normalized
+
+        # MinHash is the cheap first pass; a candidate then has to agree on every content word
+        signature = minhash_signature(normalized)
+        best_key, best_score = None, self.threshold
+        for key, (sig, _) in entries.items():
+            if sig is None:
+                continue  # Exact-match only
+            score = signature_similarity(signature, sig)
+            if score >= best_score and content_words_agree(normalized, key):
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, video_id, question):
+        """Return a cached answer for the question or a near-duplicate of it, else None"""
+        normalized = normalize_question(question)
+        with self._lock:
+            entries = self._videos.get(video_id)
+            if entries is None:
+                self.misses += 1
+                return None
+            self._videos.move_to_end(video_id)
+
+            best_key = self._match(entries, normalized)
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(best_key)
+            self.hits += 1
+            return entries[best_key][1]
+
+    def has(self, video_id, question):
+        """Whether get() would find an answer, without counting a hit or miss or touching recency"""
+        normalized = normalize_question(question)
+        with self._lock:
+            entries = self._videos.get(video_id)
+            return bool(entries) and self._match(entries, normalized) is not None
+
+    def put(self, video_id, question, answer, exact=False):
+        """Cache an answer; an exact entry only answers the same normalized question, never a near-duplicate"""
+        normalized = normalize_question(question)
+        signature = None if exact else minhash_signature(normalized)
+        with self._lock:
+            entries = self._videos.setdefault(video_id, OrderedDict())
+            self._videos.move_to_end(video_id)
+            if normalized not in entries:
+                self._size += 1
+            entries[normalized] = (signature, answer)
+            entries.move_to_end(normalized)
+
+            # Evict least recently used questions, per video and then globally
+            while len(entries) > self.max_per_video:
+                entries.popitem(last=False)
+                self._size -= 1
+            while self._size > self.max_entries:
+                oldest_video, oldest_entries = next(iter(self._videos.items()))
+                oldest_entries.popitem(last=False)
+                self._size -= 1
+                if not oldest_entries:
+                    del self._videos[oldest_video]
+
+    def items(self):
+        """(video_id, normalized question, answer, exact) for every entry, least recently used first"""
+        with self._lock:
+            return [
+                (video_id, normalized, answer, signature is None)
+                for video_id, entries in self._videos.items()
+                for normalized, (signature, answer) in entries.items()
+            ]
+
+    def invalidate(self, video_id):
+        """Drop every cached answer for a video (e.g. after its transcript changed)"""
+        with self._lock:
+            entries = self._videos.pop(video_id, None)
+            if entries:
+                self._size -= len(entries)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Lightweight HTTP API for TubeMind: transcripts, summaries and Q&A
+Stateless apart from the shared caches, so several copies can run behind a load balancer
+
+Run with:  python api.py --port 8080
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+
+import caption_http
+from conversation_memory import ConversationMemory
+from deadline import Deadline, DeadlineExceeded, PROCESS_DEADLINE, ANSWER_DEADLINE, BULK_DEADLINE
+from library_index import video_url
+from library_qa import ask_library, ensure_indexed
+from llm import get_hedger, get_scheduler, stream_text
+import pipeline
+from config import DATA_DIR
+from profiling import profile_request
+from scheduler import BATCH, INTERACTIVE, SUMMARY, llm_job
+import snapshot
+
+logger = logging.getLogger("tubemind.api")
+
+MAX_BULK_VIDEOS = 100
+MAX_SEARCH_RESULTS = 100
+
+# Scheduling class of the LLM calls each endpoint makes (others make none)
+ROUTE_PRIORITY = {
+    '/summary': SUMMARY,
+    '/digest': SUMMARY,
+    '/digest/batch': BATCH,
+    '/ask': INTERACTIVE,
+    '/library/ask': INTERACTIVE,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.details = details
+
+
+def resolve_video_id(value):
+    """Accept either a YouTube URL or a bare video ID"""
+    if not value:
+        raise ApiError(400, "Missing 'video' (YouTube URL or video ID)")
+    if not isinstance(value, str):
+        raise ApiError(400, "Invalid YouTube URL or video ID")
+    video_id = pipeline.extract_video_id(value)
+    if video_id:
+        return video_id
+    if re.fullmatch(r'[\w-]{11}', value):
+        return value
+    raise ApiError(400, "Invalid YouTube URL or video ID")
+
+
+def memory_from_history(history):
+    """Rebuild conversation memory from the client's history (the API keeps no sessions)"""
+    if history is None:
+        history = []
+    if not isinstance(history, list) or not all(isinstance(message, dict) for message in history):
+        raise ApiError(400, "'history' must be a list of {\"role\", \"content\"} objects")
+    memory = ConversationMemory()
+    for message in history:
+        if message.get('role') in ('user', 'assistant') and message.get('content'):
+            memory.add(message['role'], str(message['content']))
+    return memory
+
+
+def require_question(body):
+    question = body.get('question')
+    if not isinstance(question, str) or not question.strip():
+        raise ApiError(400, "Missing 'question'")
+    return question.strip()
+
+
+def require_transcript(video_id, deadline=None):
+    transcript = pipeline.load_transcript(video_id, deadline=deadline)
+    if not transcript:
+        raise ApiError(404, f"No transcript available for video {video_id}")
+    return transcript
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "TubeMindAPI/1.0"
+
+    # Routing
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        routes = {
+            '/health': self.handle_health,
+            '/transcript': self.handle_transcript,
+            '/search': self.handle_search,
+            '/snapshot': self.handle_snapshot,
+        }
+        self._dispatch(routes, url.path, params)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        routes = {
+            '/summary': self.handle_summary,
+            '/digest': self.handle_digest,
+            '/digest/batch': self.handle_digest_batch,
+            '/ask': self.handle_ask,
+            '/library/ask': self.handle_library_ask,
+        }
+        self._dispatch(routes, url.path, None)
+
+    def _dispatch(self, routes, path, params):
+        path = path.rstrip('/') or '/'
+        handler = routes.get(path)
+        try:
+            if handler is None:
+                raise ApiError(404, f"Unknown endpoint: {path}")
+            # Callers identify their users for fair queuing; otherwise each client address is one user
+            user = self.headers.get('X-TubeMind-User') or self.client_address[0]
+            profiled = self.headers.get('X-TubeMind-Profile') == '1'
+            with llm_job(user, ROUTE_PRIORITY.get(path)), profile_request(f"{self.command} {path}", profiled, user=user):
+                handler(params if params is not None else self._read_json())
+        except ApiError as e:
+            self._send_json(e.status, {'error': e.message, **e.details})
+        except DeadlineExceeded as e:
+            self._send_json(504, {'error': str(e), 'stage': e.stage})
+        except Exception as e:
+            logger.exception("Request failed: %s", path)
+            self._send_json(500, {'error': str(e)[:200]})
+
+    # Endpoints
+
+    def handle_health(self, params):
+        hedger = get_hedger()
+        self._send_json(200, {
+            'status': 'ok',
+            'fetch_methods': pipeline.get_fetch_strategy().snapshot(),
+            'hedging': hedger.stats() if hedger else None,
+            'llm_queue': get_scheduler().stats(),
+            'captions': caption_http.stats(),
+        })
+
+    def handle_transcript(self, params):
+        video_id = resolve_video_id(params.get('video'))
+        transcript = require_transcript(video_id, Deadline(PROCESS_DEADLINE))
+        record = pipeline.get_library().get_video(video_id) or {}
+        payload = {
+            'video_id': video_id,
+            'title': record.get('title'),
+            'channel': record.get('channel'),
+            'language': record.get('language'),
+            'text': transcript,
+        }
+        if params.get('segments') in ('1', 'true'):
+            payload['segments'] = record.get('segments', [])
+        self._send_json(200, payload)
+
+    def handle_summary(self, body):
+        video_id = resolve_video_id(body.get('video'))
+        deadline = Deadline(PROCESS_DEADLINE)
+        transcript = require_transcript(video_id, deadline)
+
+        if body.get('stream'):
+            self._send_stream(stream_text(pipeline.build_summary_prompt(transcript), deadline=deadline))
+            return
+
+        try:
+            summary = pipeline.generate_summary(transcript, deadline)
+        except DeadlineExceeded as e:
+            # The transcript is fetched and stored, so a retry only has to redo the summary
+            raise ApiError(504, str(e), stage=e.stage, video_id=video_id, transcript_available=True)
+        if not summary:
+            raise ApiError(502, "Summary generation failed")
+        self._send_json(200, {'video_id': video_id, 'summary': summary})
+
+    def handle_digest(self, body):
+        video_id = resolve_video_id(body.get('video'))
+        deadline = Deadline(PROCESS_DEADLINE)
+        require_transcript(video_id, deadline)
+        try:
+            digest = pipeline.load_digest(video_id, deadline)
+        except DeadlineExceeded as e:
+            raise ApiError(504, str(e), stage=e.stage, video_id=video_id, transcript_available=True)
+        if not digest:
+            raise ApiError(502, "Digest generation failed")
+        self._send_json(200, {'video_id': video_id, **digest})
+
+    def handle_digest_batch(self, body):
+        videos = body.get('videos')
+        if not isinstance(videos, list) or not videos:
+            raise ApiError(400, "Need a non-empty 'videos' list")
+        if len(videos) > MAX_BULK_VIDEOS:
+            raise ApiError(400, f"At most {MAX_BULK_VIDEOS} videos per request")
+        video_ids = [resolve_video_id(v) for v in videos]
+        digests = pipeline.digest_videos(video_ids, Deadline(BULK_DEADLINE))
+        self._send_json(200, {
+            'digests': {video_id: digest for video_id, digest in digests.items() if digest},
+            'failed': [video_id for video_id, digest in digests.items() if not digest],
+        })
+
+    def handle_ask(self, body):
+        video_id = resolve_video_id(body.get('video'))
+        question = require_question(body)
+        memory = memory_from_history(body.get('history'))
+        deadline = Deadline(ANSWER_DEADLINE)
+        # A video without a transcript is a 404 whether or not the answer is streamed
+        transcript = require_transcript(video_id, deadline)
+
+        if not body.get('stream'):
+            answer, from_cache = pipeline.answer_question(video_id, question, memory, deadline=deadline)
+            if not answer:
+                raise ApiError(502, "Answer generation failed")
+            self._send_json(200, {'video_id': video_id, 'answer': answer, 'cached': from_cache})
+            return
+
+        answer, cacheable = pipeline.cached_answer(video_id, question, memory)
+        if answer is not None:
+            self._send_stream(iter([answer]), cached=True)
+            return
+
+        prompt = pipeline.build_question_prompt(transcript, question, memory)
+        answer = self._send_stream(stream_text(prompt, deadline=deadline))
+        if answer and cacheable:
+            pipeline.get_answer_cache().put(video_id, question, answer)
+
+    def handle_search(self, params):
+        query = (params.get('q') or '').strip()
+        if not query:
+            raise ApiError(400, "Missing 'q'")
+        try:
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            raise ApiError(400, "'limit' must be a whole number")
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+        if params.get('mode', 'keyword') == 'semantic':
+            embedder, store = pipeline.get_embedding_index()
+            results = store.search(embedder.embed_query(query), k=limit)
+            for hit in results:
+                hit['url'] = video_url(hit['video_id'], hit['start'])
+        else:
+            results = pipeline.get_library().search(query, limit=limit)
+        self._send_json(200, {'query': query, 'results': results})
+
+    def handle_snapshot(self, params):
+        """Everything this replica has built, as a snapshot file another replica can start from"""
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=DATA_DIR) as temp_dir:
+            path = os.path.join(temp_dir, "export.tmsnap")
+            snapshot.export_snapshot(path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Disposition', 'attachment; filename="tubemind.tmsnap"')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+
+    def handle_library_ask(self, body):
+        question = require_question(body)
+        video_ids = body.get('video_ids')
+        if not isinstance(video_ids, list) or not video_ids:
+            raise ApiError(400, "Need a non-empty 'video_ids' list")
+        video_ids = [resolve_video_id(v) for v in video_ids]
+
+        library = pipeline.get_library()
+        embedder, store = pipeline.get_embedding_index()
+        deadline = Deadline(ANSWER_DEADLINE)
+        ensure_indexed(video_ids, library, store, embedder, deadline)
+        answer, sources = ask_library(question, video_ids, library, store, embedder, deadline=deadline)
+        if not answer:
+            raise ApiError(404, "No relevant passages found in the selected videos")
+        self._send_json(200, {'answer': answer, 'sources': sources})
+
+    # Helpers
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise ApiError(400, "Invalid Content-Length")
+        if length <= 0:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks, cached=False):
+        """Stream text chunks as server-sent events; returns the full text"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                self._send_event('message', {'text': chunk})
+            self._send_event('done', {'cached': cached})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client disconnected during stream")
+            return None
+        except Exception as e:
+            logger.exception("Stream failed")
+            self._send_event('error', {'error': str(e)[:200]})
+            return None
+        return ''.join(parts)
+
+    def _send_event(self, event, payload):
+        data = json.dumps(payload, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TubeMind HTTP API")
+    parser.add_argument('--host', default=os.getenv("TUBEMIND_API_HOST", "0.0.0.0"))
+    parser.add_argument('--port', type=int, default=int(os.getenv("TUBEMIND_API_PORT", "8080")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise SystemExit("❌ GOOGLE_API_KEY not found in .env file!")
+    genai.configure(api_key=api_key)
+    snapshot.warm_start()
+
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    logger.info("TubeMind API listening on http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,23 @@ import google.generativeai as genai
 import yt_dlp
 from dotenv import load_dotenv
 import os
-import re
 import time
-import json
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
-import requests
-import random
-import urllib.parse
-from xml.etree import ElementTree
+import uuid
+from chat_store import ChatHistoryStore
+from conversation_memory import ConversationMemory
+from deadline import Deadline, DeadlineExceeded, PROCESS_DEADLINE, ANSWER_DEADLINE, FETCH_SHARE
+from digest import chapters_markdown, section_label
+from library_index import video_url, format_timestamp
+from library_qa import ask_library, ensure_indexed
+from llm import get_ledger, get_hedger, get_scheduler
+import pipeline
+from scheduler import INTERACTIVE, SUMMARY, PRIORITY_NAMES, llm_job
+from profiling import get_profile_store, profile_request
+from snapshot import warm_start
+from pipeline import (
+    extract_video_id, get_transcript, load_digest, answer_question, save_transcript, load_transcript,
+    get_transcript_cache, get_library, get_embedding_index, get_fetch_strategy, FETCH_METHOD_LABELS, Speculation,
+)
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +37,15 @@ except Exception as e:
     st.error(f"❌ Failed to configure Gemini API: {str(e)}")
     st.stop()
 
+# Fetch and LLM progress messages show up on the page
+pipeline.set_notifier(st)
+
+# A new replica starts from the configured snapshot (once per process) instead of an empty cache
+warm_start()
+
+# Only the most recent messages are rendered; older ones load on demand
+CHAT_PAGE_SIZE = 20
+
 # Page configuration
 st.set_page_config(
     page_title="TubeMind - AI YouTube Assistant",
@@ -217,521 +234,49 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def extract_video_id(url):
-    """Extract video ID from various YouTube URL formats"""
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)',
-        r'youtube\.com\/watch\?.*v=([^&\n?#]+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_playlist_video_ids(playlist_url):
+    """List the video IDs in a playlist (flat extraction, no per-video requests)"""
+    with yt_dlp.YoutubeDL({'extract_flat': True, 'quiet': True, 'skip_download': True}) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    return [entry['id'] for entry in (info or {}).get('entries') or [] if entry and entry.get('id')]
 
 
-def get_transcript_method1(video_id):
-    """Method 1: Use youtube-transcript-api with retry and delay"""
-    try:
-        st.info("📋 Method 1: Trying youtube-transcript-api...")
-        
-        # Add random delay to avoid detection
-        time.sleep(random.uniform(1, 3))
-        
-        # Try to get English transcript
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-        
-        # Combine all text
-        transcript_text = ' '.join([entry['text'] for entry in transcript_list])
-        
-        # Clean up
-        transcript_text = transcript_text.replace('\n', ' ')
-        transcript_text = ' '.join(transcript_text.split())
-        
-        if transcript_text and len(transcript_text) >= 50:
-            st.success("✅ Method 1 successful!")
-            return transcript_text
-        
-        return None
-        
-    except TranscriptsDisabled:
-        st.warning("⚠️ Method 1: Transcripts are disabled for this video")
-        return None
-    except NoTranscriptFound:
-        st.warning("⚠️ Method 1: No English transcript found")
-        return None
-    except VideoUnavailable:
-        st.warning("⚠️ Method 1: Video unavailable")
-        return None
-    except Exception as e:
-        error_str = str(e)
-        if "429" in error_str or "Too Many" in error_str:
-            st.warning("⚠️ Method 1: Rate limited")
-        else:
-            st.warning(f"⚠️ Method 1 failed: {error_str[:100]}")
-        return None
-
-
-def get_transcript_method3(video_id):
-    """Method 3: Direct YouTube Timedtext API access"""
-    try:
-        st.info("📋 Method 3: Trying direct timedtext API...")
-        
-        # First, get caption tracks
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        ]
-        
-        headers = {
-            'User-Agent': random.choice(user_agents),
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Referer': 'https://www.youtube.com/',
-            'DNT': '1',
-        }
-        
-        # Random delay
-        time.sleep(random.uniform(2, 4))
-        
-        # Get video page
-        response = requests.get(video_url, headers=headers, timeout=15)
-        
-        if response.status_code != 200:
-            st.warning(f"⚠️ Method 3: HTTP {response.status_code}")
-            return None
-        
-        # Look for caption tracks in the page
-        page_content = response.text
-        
-        # Find captionTracks in the ytInitialPlayerResponse
-        import re as regex
-        pattern = r'"captionTracks":\s*(\[.*?\])'
-        match = regex.search(pattern, page_content)
-        
-        if not match:
-            st.warning("⚠️ Method 3: No caption tracks found")
-            return None
-        
-        # Parse the caption tracks JSON
-        caption_tracks_str = match.group(1)
-        caption_tracks = json.loads(caption_tracks_str)
-        
-        # Find English caption
-        caption_url = None
-        for track in caption_tracks:
-            if track.get('languageCode', '').startswith('en'):
-                caption_url = track.get('baseUrl')
-                break
-        
-        if not caption_url:
-            st.warning("⚠️ Method 3: No English captions")
-            return None
-        
-        # Fetch the caption
-        time.sleep(random.uniform(1, 2))
-        caption_response = requests.get(caption_url, headers=headers, timeout=15)
-        
-        if caption_response.status_code != 200:
-            st.warning(f"⚠️ Method 3: Caption fetch failed ({caption_response.status_code})")
-            return None
-        
-        # Parse XML captions
-        root = ElementTree.fromstring(caption_response.content)
-        text_parts = []
-        
-        for text_elem in root.findall('.//text'):
-            text = text_elem.text
-            if text:
-                text_parts.append(text)
-        
-        result = ' '.join(text_parts).strip()
-        result = result.replace('\n', ' ')
-        result = ' '.join(result.split())
-        
-        if result and len(result) >= 50:
-            st.success("✅ Method 3 successful!")
-            return result
-        
-        return None
-        
-    except Exception as e:
-        st.warning(f"⚠️ Method 3 failed: {str(e)[:100]}")
-        return None
-
-
-def get_transcript_method2(video_id):
-    """Method 2: Use yt-dlp (most reliable and maintained)"""
-    try:
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        # Random user agents to avoid detection
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        ]
-        
-        import tempfile
-        import os as os_module
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ydl_opts = {
-                'skip_download': True,
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'subtitlesformat': 'json3',
-                'subtitleslangs': ['en', 'en-US', 'en-GB'],
-                'outtmpl': os_module.path.join(temp_dir, '%(id)s.%(ext)s'),
-                'quiet': False,  # Show output for debugging
-                'no_warnings': False,
-                'headers': {
-                    'User-Agent': random.choice(user_agents),
-                    'Accept-Language': 'en-US,en;q=0.9',
-                },
-            }
-            
-            # Add delay to avoid rate limiting
-            time.sleep(random.uniform(1, 2))
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=False)
-                
-                if not info:
-                    st.error("Failed to get video info")
-                    return None
-                
-                subtitles = info.get('subtitles', {})
-                automatic_captions = info.get('automatic_captions', {})
-                
-                subtitle_url = None
-                subtitle_type = None
-                
-                # Priority 1: Manual subtitles
-                for lang in ['en', 'en-US', 'en-GB']:
-                    if lang in subtitles:
-                        st.info(f"📝 Found manual subtitles ({lang})")
-                        for fmt in subtitles[lang]:
-                            if fmt.get('ext') == 'json3':
-                                subtitle_url = fmt['url']
-                                subtitle_type = "manual"
-                                break
-                    if subtitle_url:
-                        break
-                
-                # Priority 2: Auto-generated
-                if not subtitle_url:
-                    for lang in ['en', 'en-US', 'en-GB']:
-                        if lang in automatic_captions:
-                            st.info(f"📝 Found auto-generated subtitles ({lang})")
-                            for fmt in automatic_captions[lang]:
-                                if fmt.get('ext') == 'json3':
-                                    subtitle_url = fmt['url']
-                                    subtitle_type = "auto"
-                                    break
-                        if subtitle_url:
-                            break
-                
-                if not subtitle_url:
-                    st.warning("⚠️ No English subtitles found for this video")
-                    return None
-                
-                # Download and parse subtitle
-                st.info(f"⬇️ Downloading {subtitle_type} subtitles...")
-                headers = {
-                    'User-Agent': random.choice(user_agents),
-                    'Accept': 'application/json',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Referer': 'https://www.youtube.com/',
-                }
-                
-                time.sleep(random.uniform(1, 2))
-                
-                try:
-                    response = requests.get(subtitle_url, headers=headers, timeout=30)
-                    
-                    if response.status_code == 429:
-                        st.error("⚠️ Rate limited. Please wait 30 minutes and try again.")
-                        return None
-                    
-                    if response.status_code != 200:
-                        st.error(f"HTTP {response.status_code} error")
-                        return None
-                    
-                    subtitle_data = response.json()
-                    text_parts = []
-                    
-                    if 'events' in subtitle_data:
-                        for event in subtitle_data['events']:
-                            if 'segs' in event:
-                                for seg in event['segs']:
-                                    if 'utf8' in seg:
-                                        text_parts.append(seg['utf8'])
-                    
-                    result = ' '.join(text_parts).strip()
-                    result = result.replace('\n', ' ')
-                    result = ' '.join(result.split())
-                    
-                    if result and len(result) >= 50:
-                        st.success(f"✅ Successfully fetched transcript! ({subtitle_type}, {len(result)} chars)")
-                        return result
-                    else:
-                        st.warning(f"⚠️ Transcript too short: {len(result)} characters")
-                        return None
-                        
-                except requests.exceptions.RequestException as e:
-                    st.error(f"⚠️ Network error: {str(e)[:100]}")
-                    return None
-        
-        return None
-        
-    except Exception as e:
-        error_msg = str(e)
-        if "429" in error_msg:
-            st.error("⚠️ Rate limited by YouTube")
-        else:
-            st.error(f"⚠️ Error: {error_msg[:150]}")
-        return None
-
-
-def get_transcript(video_id):
-    """Fetch transcript using yt-dlp (most reliable method)"""
-    
-    st.info(f"🎬 Video ID: `{video_id}`")
-    st.info("🔄 Fetching transcript using yt-dlp...")
-    
-    # Try yt-dlp method (most reliable)
-    try:
-        transcript = get_transcript_method2(video_id)
-        if transcript:
-            return transcript
-    except Exception as e:
-        st.warning(f"⚠️ yt-dlp error: {str(e)[:100]}")
-    
-    # Fallback: Try direct timedtext API
-    try:
-        st.info("🔄 Trying alternative method...")
-        time.sleep(2)
-        transcript = get_transcript_method3(video_id)
-        if transcript:
-            return transcript
-    except Exception as e:
-        st.warning(f"⚠️ Alternative method error: {str(e)[:100]}")
-    
-    # If all methods failed
-    st.error("❌ **Failed to fetch transcript**")
-    st.info("""
-    💡 **Possible Issues:**
-    
-    1. **No Captions Available** 🚫
-       - Check if the video has captions (CC button on YouTube)
-       - Not all videos have subtitles enabled
-    
-    2. **Rate Limited** ⏰
-       - If you tried multiple videos quickly, wait 15-30 minutes
-       - Use mobile hotspot to test with different IP
-    
-    3. **Video Restrictions** 🔒
-       - Video might be private, age-restricted, or deleted
-       - Regional restrictions may apply
-    
-    4. **Try These Solutions:**
-       - Wait 30 minutes and try again
-       - Try a different popular video with confirmed captions
-       - Check the video on YouTube directly
-    """)
-    
-    return None
-
-
-def download_and_parse_subtitle(subtitle_url, max_retries=3):
-    """Download and parse subtitle from URL with retry logic"""
-    import urllib.request
-    import urllib.error
-    
-    for attempt in range(max_retries):
-        try:
-            # Add a small delay before each attempt (except the first)
-            if attempt > 0:
-                wait_time = (2 ** attempt) * 2  # Exponential backoff: 4s, 8s, 16s
-                st.info(f"⏳ Waiting {wait_time} seconds before retry... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
-            
-            # Download subtitle data with timeout and proper headers
-            request = urllib.request.Request(
-                subtitle_url,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'application/json',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                }
-            )
-            
-            with urllib.request.urlopen(request, timeout=20) as response:
-                data = response.read().decode('utf-8')
-                subtitle_data = json.loads(data)
-            
-            # Extract text from JSON3 format
-            text_parts = []
-            
-            # Parse events structure
-            if 'events' in subtitle_data:
-                for event in subtitle_data['events']:
-                    if 'segs' in event:
-                        # Segments contain the actual text
-                        for seg in event['segs']:
-                            if 'utf8' in seg:
-                                text_parts.append(seg['utf8'])
-            
-            # Join all text parts
-            result = ' '.join(text_parts).strip()
-            
-            # Clean up common subtitle artifacts
-            result = result.replace('\n', ' ')
-            result = ' '.join(result.split())  # Remove extra whitespace
-            
-            # Only return if we got meaningful text (at least 50 characters)
-            if result and len(result) >= 50:
-                return result
-            else:
-                st.warning(f"⚠️ Subtitle text too short: {len(result) if result else 0} characters")
-                return None
-                
-        except json.JSONDecodeError as e:
-            st.error(f"❌ Failed to parse subtitle JSON: {str(e)[:100]}")
-            return None
-            
-        except urllib.error.HTTPError as e:
-            if e.code == 429:  # Too Many Requests
-                if attempt < max_retries - 1:
-                    st.warning(f"⚠️ Rate limited by YouTube (HTTP 429). Retrying with exponential backoff...")
-                    continue
-                else:
-                    st.error("❌ **YouTube Rate Limit Exceeded**")
-                    st.info("💡 **Please wait 5-10 minutes before trying again.**\n\n"
-                           "YouTube limits how many subtitle requests can be made in a short time. "
-                           "This is temporary and will reset automatically.")
-                    return None
-            else:
-                st.error(f"❌ HTTP Error {e.code}: {str(e)[:100]}")
-                return None
-                
-        except urllib.error.URLError as e:
-            st.error(f"❌ Failed to download subtitle: {str(e)[:100]}")
-            return None
-            
-        except Exception as e:
-            st.error(f"❌ Subtitle extraction error: {str(e)[:100]}")
-            return None
-    
-    return None
-
-
-def generate_summary(transcript):
-    """Generate an executive summary using Gemini"""
-    prompt = f"""You are a professional content analyst. Please provide a concise executive summary of the following video transcript.
-
-Focus on:
-- Main topic and key points
-- Important insights or arguments
-- Any actionable takeaways
-
-Transcript:
-{transcript[:15000]}  # Limit to avoid token limits
-
-Please provide a summary in 3-5 paragraphs."""
-    
-    try:
-        model = genai.GenerativeModel('gemini-flash-latest')
-        response = model.generate_content(prompt)
-        
-        # Handle new response structure
-        if hasattr(response, 'text'):
-            return response.text
-        elif response.candidates:
-            return response.candidates[0].content.parts[0].text
-        else:
-            st.error("❌ Unexpected response format from Gemini API")
-            return None
-            
-    except Exception as e:
-        error_msg = str(e)
-        st.error(f"❌ Error generating summary: {error_msg}")
-        
-        if "credentials" in error_msg.lower() or "authentication" in error_msg.lower():
-            st.warning("⚠️ **API Authentication Issue**")
-            st.info("""
-            Please check:
-            1. Your GOOGLE_API_KEY is correctly set in the .env file
-            2. The API key is valid and active
-            3. Get your API key from: https://makersuite.google.com/app/apikey
-            """)
-        
-        return None
-
-
-def ask_question(transcript, question, chat_history):
-    """Answer questions based on the video transcript"""
-    # Build context with chat history
-    context = "Previous conversation:\n"
-    for msg in chat_history[-5:]:  # Last 5 messages for context
-        context += f"{msg['role']}: {msg['content']}\n"
-    
-    prompt = f"""You are TubeMind, an AI assistant that helps users understand YouTube video content.
-
-Video Transcript:
-{transcript[:20000]}  # Limit to avoid token limits
-
-{context}
-
-User Question: {question}
-
-Instructions:
-- Answer based ONLY on the information present in the transcript
-- Be concise and specific
-- If the information is not in the transcript, say so
-- Use bullet points for lists when appropriate
-
-Answer:"""
-    
-    try:
-        model = genai.GenerativeModel('gemini-flash-latest')
-        response = model.generate_content(prompt)
-        
-        # Handle new response structure
-        if hasattr(response, 'text'):
-            return response.text
-        elif response.candidates:
-            return response.candidates[0].content.parts[0].text
-        else:
-            st.error("❌ Unexpected response format from Gemini API")
-            return None
-            
-    except Exception as e:
-        error_msg = str(e)
-        st.error(f"❌ Error generating response: {error_msg[:200]}")
-        
-        if "credentials" in error_msg.lower() or "authentication" in error_msg.lower():
-            st.info("⚠️ API authentication issue. Check your GOOGLE_API_KEY in .env file.")
-        
-        return None
+def format_bytes(num_bytes):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
 
 
 # Initialize session state
-if 'transcript' not in st.session_state:
-    st.session_state.transcript = None
-if 'summary' not in st.session_state:
-    st.session_state.summary = None
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'digest' not in st.session_state:
+    st.session_state.digest = None  # Summary, chapters, key points and takeaways
+if 'chat_store' not in st.session_state:
+    st.session_state.chat_store = ChatHistoryStore(st.session_state.session_id)  # Chat history lives on disk
+if 'chat_window' not in st.session_state:
+    st.session_state.chat_window = CHAT_PAGE_SIZE
+if 'memory' not in st.session_state:
+    st.session_state.memory = ConversationMemory()  # Bounded prompt context for follow-ups
 if 'video_id' not in st.session_state:
     st.session_state.video_id = None
-if 'transcript_cache' not in st.session_state:
-    st.session_state.transcript_cache = {}  # Cache transcripts by video_id
+if 'profiling' not in st.session_state:
+    st.session_state.profiling = False  # Capture a profile of this session's requests
+if 'speculation' not in st.session_state:
+    st.session_state.speculation = None  # Background work started once the summary is shown
+
+
+def stop_speculation(question=None):
+    """The user is doing something: stop precomputing so their request has the LLM to itself
+
+    A speculative answer to the question the user just asked is left to finish, since that's what they'll get
+    """
+    if st.session_state.speculation:
+        st.session_state.speculation.cancel(keep=question)
 
 
 # Header - clean professional styling
@@ -765,23 +310,80 @@ with st.sidebar:
     """)
     
     # Session stats
-    if st.session_state.transcript:
+    if st.session_state.video_id:
         st.markdown("---")
         st.markdown("**Session Stats**")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Videos", len(st.session_state.transcript_cache))
+            st.metric("Videos", len(get_transcript_cache().session_keys(st.session_state.session_id)))
         with col2:
-            st.metric("Messages", len(st.session_state.chat_history))
+            st.metric("Messages", len(st.session_state.chat_store))
+    
+    # Transcript cache memory accounting
+    cache_stats = get_transcript_cache().stats(st.session_state.session_id)
+    st.markdown("---")
+    st.markdown("**Memory**")
+    st.progress(
+        min(cache_stats['bytes'] / cache_stats['max_bytes'], 1.0),
+        text=f"Transcript cache: {format_bytes(cache_stats['bytes'])} / {format_bytes(cache_stats['max_bytes'])}"
+    )
+    st.caption(
+        f"{cache_stats['hot']} hot, {cache_stats['cold']} compressed "
+        f"({format_bytes(cache_stats['raw_bytes'])} uncompressed) · "
+        f"this session: {format_bytes(cache_stats['session_bytes'])} / {format_bytes(cache_stats['session_max_bytes'])}"
+    )
+    
+    # Shared Gemini quota across all replicas on this host
+    quota = get_ledger().usage()
+    st.caption(
+        f"Gemini quota (all replicas): {quota['requests']}/{quota['rpm']} requests · "
+        f"{quota['tokens']:,}/{quota['tpm']:,} tokens this minute"
+    )
+    
+    # LLM call queue across all sessions in this process
+    scheduling = get_scheduler().stats()
+    waiting = ' / '.join(f"{scheduling['classes'][name]['queued']} {name}" for name in PRIORITY_NAMES)
+    st.caption(
+        f"LLM calls: {scheduling['active']}/{scheduling['concurrency']} running · waiting: {waiting} · "
+        f"chat wait {scheduling['classes']['interactive']['mean_wait']:.1f}s avg"
+    )
+    
+    # Hedged Gemini requests (only when enabled)
+    if get_hedger():
+        hedging = get_hedger().stats()
+        st.caption(
+            f"Hedged {hedging['hedge_rate']:.1%} of {hedging['requests']} Gemini calls · "
+            f"{hedging['hedge_wins']} answered by the hedge · {hedging['seconds_saved']:.1f}s saved"
+        )
+    
+    # Transcript fetch methods, cheapest first, with their circuit breaker state
+    breaker_icons = {'closed': "🟢", 'half-open': "🟡", 'open': "🔴"}
+    for method in sorted(get_fetch_strategy().snapshot(), key=lambda m: m['expected_cost']):
+        status = f"retry in {method['retry_in']:.0f}s" if method['state'] == 'open' else method['state']
+        samples = (
+            f"{method['success_rate']:.0%} ok · {method['mean_latency']:.1f}s avg"
+            if method['samples'] else "no data yet"
+        )
+        st.caption(f"{breaker_icons[method['state']]} {FETCH_METHOD_LABELS[method['method']]}: {status} · {samples}")
+    
+    # Per-request profiling, for tracking down why one video is slow
+    st.toggle("🔬 Profile my requests", key="profiling",
+              help="Captures a cProfile and sampled stacks (flamegraph-ready) of each video, chat and library request")
+    if st.session_state.profiling:
+        for entry in get_profile_store().slowest(5):
+            st.caption(f"{entry['seconds']:.1f}s · {entry['name']} · `{entry['id']}`")
+        st.caption(f"Saved in `{get_profile_store().directory}`")
     
     st.markdown("---")
     
     if st.button("Clear Session", use_container_width=True):
-        st.session_state.transcript = None
-        st.session_state.summary = None
-        st.session_state.chat_history = []
+        stop_speculation()
+        st.session_state.digest = None
+        st.session_state.chat_store.clear()
+        st.session_state.chat_window = CHAT_PAGE_SIZE
+        st.session_state.memory.clear()
         st.session_state.video_id = None
-        st.session_state.transcript_cache = {}
+        get_transcript_cache().release_session(st.session_state.session_id)
         st.rerun()
 
 # Main content with better layout
@@ -805,8 +407,123 @@ with col2:
     st.write("")  # Spacing for alignment
     process_button = st.button("Process Video", use_container_width=True, type="primary")
 
+# Library search lives in its own fragment so typing a query doesn't rerun the page
+@st.fragment
+def library_search_panel():
+    """Full-text search across every stored transcript"""
+    library = get_library()
+    with st.expander(f"🔎 Search your library ({library.count()} videos)"):
+        query = st.text_input(
+            "Search transcripts",
+            placeholder='Keywords or "an exact phrase"',
+            key="library_query"
+        )
+        mode = st.radio(
+            "Search mode",
+            ["Keyword", "Semantic"],
+            horizontal=True,
+            key="library_search_mode",
+            help="Semantic search also finds paraphrases, using transcript embeddings"
+        )
+        
+        if query:
+            started = time.perf_counter()
+            if mode == "Keyword":
+                results = library.search(query, limit=20)
+            else:
+                embedder, store = get_embedding_index()
+                results = store.search(embedder.embed_query(query), k=20)
+                titles = {v['video_id']: v['title'] for v in library.list_videos()}
+                for hit in results:
+                    hit['title'] = titles.get(hit['video_id']) or hit['video_id']
+                    hit['snippet'] = hit['text'][:300] + ('…' if len(hit['text']) > 300 else '')
+                    hit['url'] = video_url(hit['video_id'], hit['start'])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            st.caption(f"{len(results)} results in {elapsed_ms:.1f} ms")
+            
+            for hit in results:
+                st.markdown(
+                    f"**[{hit['title']}]({hit['url']})** · `{format_timestamp(hit['start'])}`  \n"
+                    f"{hit['snippet']}"
+                )
+
+
+@st.fragment
+def library_qa_panel():
+    """Ask one question across a set of videos from the library"""
+    library = get_library()
+    with st.expander("📚 Ask across your library"):
+        scope = st.radio(
+            "Which videos?",
+            ["Pick videos", "Channel", "Fetched this week", "Playlist"],
+            horizontal=True,
+            key="library_qa_scope"
+        )
+        
+        if scope == "Pick videos":
+            titles = {v['video_id']: v['title'] or v['video_id'] for v in library.list_videos()}
+            video_ids = st.multiselect("Videos", list(titles), format_func=titles.get, key="library_qa_videos")
+        elif scope == "Channel":
+            channel = st.selectbox("Channel", library.channels(), key="library_qa_channel")
+            video_ids = [v['video_id'] for v in library.list_videos(channel=channel)] if channel else []
+        elif scope == "Fetched this week":
+            video_ids = [v['video_id'] for v in library.list_videos(since=time.time() - 7 * 24 * 3600)]
+        else:
+            playlist_url = st.text_input("Playlist URL", key="library_qa_playlist")
+            video_ids = []
+            if playlist_url:
+                try:
+                    playlist_ids = get_playlist_video_ids(playlist_url)
+                except Exception as e:
+                    st.warning(f"⚠️ Couldn't read playlist: {str(e)[:100]}")
+                    playlist_ids = []
+                stored = {v['video_id'] for v in library.list_videos()}
+                video_ids = [v for v in playlist_ids if v in stored]
+                if len(video_ids) < len(playlist_ids):
+                    st.caption(f"{len(playlist_ids) - len(video_ids)} playlist videos aren't in your library yet")
+        
+        st.caption(f"{len(video_ids)} videos selected")
+        question = st.text_input("Question", placeholder="What do these videos say about...?", key="library_qa_question")
+        
+        if st.button("Ask across videos", disabled=not (video_ids and question), use_container_width=True):
+            stop_speculation()
+            embedder, store = get_embedding_index()
+            deadline = Deadline(ANSWER_DEADLINE)
+            try:
+                with st.spinner("🔎 Finding relevant passages..."), llm_job(st.session_state.session_id, INTERACTIVE):
+                    with profile_request("library question", st.session_state.profiling, videos=len(video_ids)):
+                        ensure_indexed(video_ids, library, store, embedder, deadline)
+                        answer, sources = ask_library(question, video_ids, library, store, embedder, deadline=deadline)
+            except DeadlineExceeded as e:
+                st.warning(f"⏱️ {e} (limit {ANSWER_DEADLINE:.0f}s). Try fewer videos or ask again.")
+                return
+            except Exception as e:
+                st.error(f"❌ Error answering across videos: {str(e)[:200]}")
+                return
+            
+            if not answer:
+                st.warning("⚠️ No relevant passages found in the selected videos")
+                return
+            
+            st.markdown(answer)
+            st.markdown("**Sources**")
+            for source in sources:
+                jumps = ' '.join(
+                    f"[{format_timestamp(start)}]({video_url(source['video_id'], start)})"
+                    for start in source['starts']
+                )
+                st.markdown(f"`{source['label']}` {source['title']} · {jumps}")
+
+
+if get_library().count():
+    library_search_panel()
+    library_qa_panel()
+
+# Processing happens further down in this same run, so don't flash the welcome cards
+processing = bool(process_button and youtube_url)
+
 # Welcome message when no video is loaded
-if not st.session_state.video_id:
+if not st.session_state.video_id and not processing:
     st.markdown("---")
     
     col1, col2, col3 = st.columns(3)
@@ -838,51 +555,95 @@ if not st.session_state.video_id:
         </div>
         """, unsafe_allow_html=True)
 
+def show_section_notes(section, notes):
+    """Interim notes for one section of a long video, shown while the rest are summarized"""
+    st.markdown(f"**📝 {section_label(section)}**\n\n{notes}")
+
+
+def digest_within(video_id, deadline):
+    """Digest within the deadline; on timeout warn and return None (the transcript stays usable)"""
+    try:
+        with llm_job(st.session_state.session_id, SUMMARY):
+            digest = load_digest(video_id, deadline, on_section=show_section_notes)
+    except DeadlineExceeded:
+        st.warning(
+            f"⏱️ The summary didn't finish within {PROCESS_DEADLINE:.0f}s. "
+            "The transcript is ready, so you can start chatting - process the video again to retry the summary."
+        )
+        return None
+    if digest and digest.get('partial'):
+        st.info("⏳ This summary only covers the sections finished in time. Process the video again to complete it - finished sections are kept.")
+    return digest
+
+
 # Process video when button is clicked
 if process_button and youtube_url:
+    stop_speculation()
     video_id = extract_video_id(youtube_url)
     
     if video_id:
-        # Create a container for processing status
-        status_container = st.container()
-        
-        with status_container:
-            # Check cache first
-            if video_id in st.session_state.transcript_cache:
-                st.info(f"🎬 Video ID: `{video_id}`")
-                st.success("⚡ Loading from cache - instant!")
-                transcript = st.session_state.transcript_cache[video_id]
-            else:
-                with st.status("🔄 Processing video...", expanded=True) as status:
-                    st.write("📥 Fetching transcript...")
-                    transcript = get_transcript(video_id)
+        # Profiled end to end when this session asked for it (sidebar) or TUBEMIND_PROFILE is on
+        with profile_request("process video", st.session_state.profiling, video_id=video_id):
+            # One time budget for the whole click: fetching may use part of it, the summary gets the rest
+            deadline = Deadline(PROCESS_DEADLINE)
+        
+            # Create a container for processing status
+            status_container = st.container()
+        
+            # A cached digest only belongs to the video this session already has loaded
+            summary_is_current = video_id == st.session_state.video_id and st.session_state.digest
+        
+            with status_container:
+                # Check the memory cache and the on-disk library first
+                transcript = load_transcript(video_id, st.session_state.session_id, fetch=False)
+                if transcript:
+                    st.info(f"🎬 Video ID: `{video_id}`")
+                    st.success("⚡ Loading from cache - instant!")
+                else:
+                    with st.status("🔄 Processing video...", expanded=True) as status:
+                        st.write("📥 Fetching transcript...")
+                        try:
+                            record = get_transcript(video_id, deadline.share(FETCH_SHARE))
+                        except DeadlineExceeded as e:
+                            record = None
+                            st.error(f"⏱️ {e} - gave up after {deadline.elapsed():.0f}s. YouTube may be slow; please try again.")
+                            status.update(label="⏱️ Timed out fetching the transcript", state="error")
                     
-                    # Cache the transcript if successful
-                    if transcript:
-                        st.session_state.transcript_cache[video_id] = transcript
-                        st.write("✅ Transcript retrieved!")
-                        
-                        st.write("🧠 Generating AI summary...")
-                        summary = generate_summary(transcript)
-                        st.session_state.summary = summary
-                        st.write("✅ Summary complete!")
+                        # Store the transcript if successful
+                        transcript = save_transcript(video_id, record, st.session_state.session_id) if record else None
+                        if transcript:
+                            st.write("✅ Transcript retrieved!")
                         
-                        status.update(label="✅ Processing complete!", state="complete", expanded=False)
-        
-        if transcript:
-            st.session_state.transcript = transcript
-            st.session_state.video_id = video_id
-            st.session_state.chat_history = []  # Reset chat on new video
+                            st.write("🧠 Generating AI summary...")
+                            digest = digest_within(video_id, deadline)
+                            st.session_state.digest = digest
+                            summary_is_current = bool(digest)
+                            if digest:
+                                st.write("✅ Summary complete!")
+                                status.update(label="✅ Processing complete!", state="complete", expanded=False)
+                            else:
+                                status.update(label="⚠️ Transcript ready, summary unavailable", state="complete", expanded=False)
+        
+            if transcript:
+                st.session_state.video_id = video_id
+                st.session_state.chat_store.clear()  # Reset chat on new video
+                st.session_state.chat_window = CHAT_PAGE_SIZE
+                st.session_state.memory.clear()
+            
+                # Only generate summary if we don't already have this video's one (and there's time left)
+                if not summary_is_current and not deadline.expired():
+                    with st.status("🧠 Generating AI summary...", expanded=True) as status:
+                        st.session_state.digest = digest_within(video_id, deadline)
+                        status.update(label="✅ Summary complete!" if st.session_state.digest else "⚠️ Summary unavailable",
+                                      state="complete", expanded=False)
             
-            # Only generate summary if not cached
-            if video_id not in st.session_state.transcript_cache or not st.session_state.summary:
-                with st.spinner("🧠 Generating AI summary..."):
-                    summary = generate_summary(transcript)
-                    st.session_state.summary = summary
+                # While the user reads the summary, index the video and answer the likeliest first questions
+                if st.session_state.digest:
+                    st.session_state.speculation = Speculation(video_id, st.session_state.session_id).start()
             
-            st.balloons()
-            st.success("Video ready! Scroll down to see the summary and start chatting.")
-            st.rerun()
+                # No st.rerun() here - the video and chat sections below render in this same run
+                st.balloons()
+                st.success("Video ready! Scroll down to see the summary and start chatting.")
     else:
         st.error("Invalid YouTube URL. Please check the format and try again.")
 
@@ -899,17 +660,21 @@ if st.session_state.video_id:
     with col2:
         st.video(f"https://www.youtube.com/watch?v={st.session_state.video_id}")
 
-# Chat interface - shows summary first, then Q&A in order
-if st.session_state.transcript:
-    st.markdown("---")
-    st.subheader("Chat")
+
+# Chat lives in a fragment so a new message doesn't re-render the header, video and summary
+@st.fragment
+def chat_panel():
+    """Render chat history and input; a new message only reruns this fragment"""
+    store = st.session_state.chat_store
     
-    # Display executive summary first if available
-    if st.session_state.summary:
-        st.markdown('<div class="summary-box"><strong>Summary</strong><br><br>{}</div>'.format(st.session_state.summary), unsafe_allow_html=True)
+    # Older messages stay on disk until the user asks for them
+    hidden = len(store) - st.session_state.chat_window
+    if hidden > 0 and st.button(f"Show earlier messages ({hidden} hidden)", use_container_width=True):
+        st.session_state.chat_window += CHAT_PAGE_SIZE
+        st.rerun(scope="fragment")
     
     # Display chat history using Streamlit's native chat message components
-    for message in st.session_state.chat_history:
+    for message in store.load(-st.session_state.chat_window):
         if message['role'] == 'user':
             with st.chat_message("user"):
                 st.markdown(message["content"])
@@ -917,36 +682,66 @@ if st.session_state.transcript:
             with st.chat_message("assistant"):
                 st.markdown(message["content"])
     
-    # Chat input at the bottom - uses native Streamlit chat input (NO RERUN NEEDED!)
+    # Chat input at the bottom - submitting only reruns this fragment
     user_question = st.chat_input("Ask anything about this video...")
     
     if user_question:
+        stop_speculation(user_question)
+        
         # Add user question to chat history
-        st.session_state.chat_history.append({
-            'role': 'user',
-            'content': user_question
-        })
+        store.append('user', user_question)
         
         # Display user message immediately
         with st.chat_message("user"):
             st.markdown(user_question)
         
-        # Get and display AI response
+        # Get and display AI response (cached answers come back instantly)
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                answer = ask_question(
-                    st.session_state.transcript,
-                    user_question,
-                    st.session_state.chat_history
-                )
+            try:
+                with st.spinner("Thinking..."), llm_job(st.session_state.session_id, INTERACTIVE):
+                    with profile_request("chat answer", st.session_state.profiling, video_id=st.session_state.video_id):
+                        answer, _ = answer_question(
+                            st.session_state.video_id,
+                            user_question,
+                            st.session_state.memory,
+                            st.session_state.session_id,
+                            Deadline(ANSWER_DEADLINE)
+                        )
+            except DeadlineExceeded as e:
+                answer = None
+                st.warning(f"⏱️ {e} (limit {ANSWER_DEADLINE:.0f}s). Please ask again.")
             
             if answer:
                 st.markdown(answer)
                 # Add AI response to chat history
-                st.session_state.chat_history.append({
-                    'role': 'assistant',
-                    'content': answer
-                })
+                store.append('assistant', answer)
+                st.session_state.memory.add('user', user_question)
+                st.session_state.memory.add('assistant', answer)
+
+
+# Chat interface - shows summary first, then Q&A in order
+if st.session_state.video_id:
+    st.markdown("---")
+    st.subheader("Chat")
+    
+    # Display executive summary first if available
+    digest = st.session_state.digest
+    if digest:
+        st.markdown('<div class="summary-box"><strong>Summary</strong><br><br>{}</div>'.format(digest['summary']), unsafe_allow_html=True)
+        
+        # Chapters, key points and takeaways come from the same call; asking for them in chat is answered from cache
+        sections = [
+            ("Chapters", chapters_markdown(digest, st.session_state.video_id)),
+            ("Key Points", '\n'.join(f"- {point}" for point in digest['key_points'])),
+            ("Takeaways", '\n'.join(f"- {item}" for item in digest['takeaways'])),
+        ]
+        sections = [(label, body) for label, body in sections if body]
+        if sections:
+            for tab, (_, body) in zip(st.tabs([label for label, _ in sections]), sections):
+                with tab:
+                    st.markdown(body)
+    
+    chat_panel()
     
     # Footer inside chat section - appears above chat input
     st.markdown("<br>", unsafe_allow_html=True)
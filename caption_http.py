@@ -0,0 +1,186 @@
+"""
+Bandwidth-efficient caption downloads
+Asks for compressed transfer and decodes it as it streams in, and keeps each track's ETag/Last-Modified
+so a refetch of unchanged captions is answered with a 304 and the stored copy
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+from config import DATA_DIR
+from deadline import ensure_deadline
+
+ACCEPT_ENCODING = 'gzip, deflate'
+CHUNK_BYTES = 16384
+
+# A caption track is a few hundred KB at most; anything far bigger is a broken or hostile response
+MAX_CAPTION_BYTES = 20 * 1024 * 1024
+
+# Stored tracks kept for revalidation, most recently fetched first
+MAX_STORED_TRACKS = 2000
+
+# Query parameters that identify a track; the rest (expire, signature, ...) change on every page load
+TRACK_PARAMS = ('v', 'lang', 'tlang', 'kind', 'name', 'fmt')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captions (
+    track TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captions_fetched ON captions(fetched_at);
+"""
+
+
+class CaptionResponse:
+    """Status and decoded body of a caption download; a 304 comes back as 200 with the stored body"""
+
+    def __init__(self, status_code, content=b'', wire_bytes=0, revalidated=False):
+        self.status_code = status_code
+        self.content = content
+        self.wire_bytes = wire_bytes
+        self.revalidated = revalidated
+
+
+def track_key(url):
+    """Stable key for a caption track, ignoring the URL's per-request parameters"""
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k in TRACK_PARAMS)
+    return f"{parts.netloc}{parts.path}?{urlencode(params)}"
+
+
+def with_format(url, fmt):
+    """The same caption URL asking for another format"""
+    parts = urlsplit(url)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'fmt']
+    params.append(('fmt', fmt))
+    return parts._replace(query=urlencode(params)).geturl()
+
+
+class CaptionStore:
+    """Last downloaded body and validators of each caption track, zlib-compressed in SQLite"""
+
+    def __init__(self, path=None):
+        path = path or os.path.join(DATA_DIR, "captions.db")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, track):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM captions WHERE track = ?", (track,)
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, body = row
+        return {'etag': etag, 'last_modified': last_modified, 'body': zlib.decompress(body)}
+
+    def put(self, track, etag, last_modified, body):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions (track, etag, last_modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (track, etag, last_modified, zlib.compress(body, 6), time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM captions WHERE track NOT IN "
+                "(SELECT track FROM captions ORDER BY fetched_at DESC LIMIT ?)", (MAX_STORED_TRACKS,)
+            )
+
+    def touch(self, track):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE captions SET fetched_at = ? WHERE track = ?", (time.time(), track))
+
+
+@functools.lru_cache(maxsize=None)
+def get_caption_store():
+    """Process-wide caption store"""
+    return CaptionStore()
+
+
+_stats_lock = threading.Lock()
+_stats = {'downloads': 0, 'not_modified': 0, 'wire_bytes': 0, 'decoded_bytes': 0}
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            _stats[name] += amount
+
+
+def stats():
+    """Caption downloads so far: full downloads, 304s and bytes on the wire vs decoded"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _decoder(encoding):
+    """Incremental decompressor for a Content-Encoding, or None for an uncompressed body"""
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return zlib.decompressobj(32 + zlib.MAX_WBITS)  # Detects the gzip or zlib header
+    raise ValueError(f"unsupported Content-Encoding: {encoding}")
+
+
+def read_body(response, deadline, max_bytes=MAX_CAPTION_BYTES):
+    """Stream a response body, decompressing each chunk as it arrives; returns (body, wire bytes)"""
+    decoder = _decoder(response.headers.get('Content-Encoding', '').strip().lower())
+    body = bytearray()
+    wire_bytes = 0
+    for chunk in response.raw.stream(CHUNK_BYTES, decode_content=False):
+        wire_bytes += len(chunk)
+        if decoder:
+            # Bounded output per chunk, so a tiny compressed body can't expand without limit
+            chunk = decoder.decompress(chunk, max_bytes - len(body) + 1)
+            if decoder.unconsumed_tail:
+                raise ValueError("caption body too large")
+        body += chunk
+        if len(body) > max_bytes:
+            raise ValueError("caption body too large")
+        deadline.check("the caption download")
+    if decoder:
+        body += decoder.flush()
+    return bytes(body), wire_bytes
+
+
+def fetch_caption(url, headers=None, timeout=None, deadline=None, store=None):
+    """GET a caption track with compressed transfer, revalidating any stored copy with its validators"""
+    deadline = ensure_deadline(deadline)
+    store = store or get_caption_store()
+    track = track_key(url)
+    stored = store.get(track)
+
+    headers = dict(headers or {}, **{'Accept-Encoding': ACCEPT_ENCODING})
+    if stored and stored['etag']:
+        headers['If-None-Match'] = stored['etag']
+    if stored and stored['last_modified']:
+        headers['If-Modified-Since'] = stored['last_modified']
+
+    with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and stored:
+            store.touch(track)
+            _count(not_modified=1)
+            return CaptionResponse(200, stored['body'], revalidated=True)
+        if response.status_code != 200:
+            return CaptionResponse(response.status_code)
+
+        body, wire_bytes = read_body(response, deadline)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+    if etag or last_modified:
+        store.put(track, etag, last_modified, body)
+    _count(downloads=1, wire_bytes=wire_bytes, decoded_bytes=len(body))
+    return CaptionResponse(200, body, wire_bytes)
@@ -0,0 +1,154 @@
+"""
+Caption track selection across languages
+Every track a video offers is ranked in one pass: the deployment's preferred languages first (manual captions
+before auto-generated ones), then YouTube's auto-translation into a preferred language if it's turned on,
+then the video's own language, so a video without captions in a preferred language still gets a transcript
+"""
+
+import os
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Language codes in order of preference; "en" also matches regional tracks like en-US
+PREFERRED_LANGUAGES = [code.strip() for code in os.getenv("TUBEMIND_LANGUAGES", "en").split(',') if code.strip()] or ['en']
+
+# Fall back to YouTube's machine translation into a preferred language before the video's own language
+AUTO_TRANSLATE = os.getenv("TUBEMIND_AUTO_TRANSLATE", "0") == "1"
+
+
+class CaptionTrack:
+    """One caption track: its language, 'manual' or 'auto', the URL (and format, if known) to fetch
+
+    Tracks listed by youtube-transcript-api have no URL; they carry the library's Transcript instead
+    """
+
+    def __init__(self, language, kind, url, ext=None, translated_from=None, transcript=None):
+        self.language = language
+        self.kind = kind
+        self.url = url
+        self.ext = ext
+        self.translated_from = translated_from
+        self.transcript = transcript
+
+    def describe(self):
+        kind = "manual subtitles" if self.kind == 'manual' else "auto-generated subtitles"
+        if self.translated_from:
+            return f"{kind} ({self.language}, auto-translated from {self.translated_from})"
+        return f"{kind} ({self.language})"
+
+
+def language_rank(language, preferred=PREFERRED_LANGUAGES):
+    """Position of a track language in the preference list, or None if it isn't preferred
+
+    An exact match ranks ahead of a regional variant of the same language (en-US for "en")
+    """
+    language = language.lower()
+    base = language.split('-')[0]
+    for i, code in enumerate(code.lower() for code in preferred):
+        if language == code:
+            return 2 * i
+        if base == code.split('-')[0]:
+            return 2 * i + 1
+    return None
+
+
+def original_language(tracks):
+    """Language spoken in the video: that of its untranslated auto-generated captions, or None"""
+    for track in tracks:
+        if track.kind == 'auto' and not track.translated_from:
+            return track.language
+    return None
+
+
+def pick_track(tracks, preferred=PREFERRED_LANGUAGES, translate=AUTO_TRANSLATE, original=None):
+    """The best of the offered tracks, or None if none is usable
+
+    original is the video's own language if the source says (yt-dlp's "language"), else it's taken
+    from the auto-generated captions; its tracks come before those in other non-preferred languages
+    """
+    tracks = list(tracks)
+    original = original or original_language(tracks)
+    best, best_key = None, None
+    for track in tracks:
+        rank = language_rank(track.language, preferred)
+        if track.translated_from:
+            if not translate or rank is None:
+                continue
+            tier = 1
+        elif rank is not None:
+            tier = 0
+        else:
+            rank = language_rank(track.language, [original]) if original else None
+            tier = 2 if rank is not None else 3
+        rank = rank or 0
+        # Language first, then manual over auto-generated, then the exact code over a regional variant
+        key = (tier, rank // 2, track.kind != 'manual', rank)
+        if best_key is None or key < best_key:
+            best, best_key = track, key
+    return best
+
+
+def _translation_source(url, language):
+    """Language a track URL is machine-translated from, or None if it's the original text"""
+    params = dict(parse_qsl(urlsplit(url).query))
+    if 'tlang' not in params:
+        return None
+    source = params.get('lang')
+    if source and source.split('-')[0] == params['tlang'].split('-')[0]:
+        return None
+    return source or "the original language"
+
+
+def yt_dlp_tracks(subtitles, automatic_captions, pick_format):
+    """Tracks from yt-dlp metadata; pick_format(formats) returns the (ext, url) to use or None
+
+    yt-dlp lists YouTube's translations of the auto captions among automatic_captions (their
+    URLs carry tlang), and the untranslated original as "<lang>-orig"
+    """
+    for kind, tracks in (('manual', subtitles or {}), ('auto', automatic_captions or {})):
+        for language, formats in tracks.items():
+            picked = pick_format(formats)
+            if not picked:
+                continue
+            ext, url = picked
+            language = language[:-len('-orig')] if language.endswith('-orig') else language
+            yield CaptionTrack(language, kind, url, ext, _translation_source(url, language))
+
+
+def page_tracks(caption_tracks, preferred=PREFERRED_LANGUAGES, translate=AUTO_TRANSLATE):
+    """Tracks from a watch page's captionTracks, plus auto-translations of translatable ones if enabled"""
+    for track in caption_tracks:
+        url, language = track.get('baseUrl'), track.get('languageCode')
+        if not url or not language:
+            continue
+        kind = 'auto' if track.get('kind') == 'asr' else 'manual'
+        yield CaptionTrack(language, kind, url)
+        if translate and track.get('isTranslatable'):
+            for target in preferred:
+                if language_rank(language, [target]) is None:
+                    yield CaptionTrack(target, kind, with_param(url, 'tlang', target), translated_from=language)
+
+
+def transcript_api_tracks(transcript_list, preferred=PREFERRED_LANGUAGES, translate=AUTO_TRANSLATE):
+    """Tracks from youtube-transcript-api's list_transcripts, plus auto-translations if enabled"""
+    for transcript in transcript_list:
+        kind = 'auto' if transcript.is_generated else 'manual'
+        yield CaptionTrack(transcript.language_code, kind, None, transcript=transcript)
+        if translate and transcript.is_translatable:
+            offered = {language['language_code'] for language in transcript.translation_languages}
+            for target in preferred:
+                if target in offered and language_rank(transcript.language_code, [target]) is None:
+                    yield CaptionTrack(target, kind, None, translated_from=transcript.language_code, transcript=transcript)
+
+
+def with_param(url, name, value):
+    parts = urlsplit(url)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != name]
+    params.append((name, value))
+    return parts._replace(query=urlencode(params)).geturl()
+
+
+def accept_language(preferred=PREFERRED_LANGUAGES):
+    """Accept-Language header for the preferred languages, so page titles come back in them too"""
+    return ','.join(
+        code if i == 0 else f"{code};q={max(0.9 - 0.1 * (i - 1), 0.1):.1f}" for i, code in enumerate(preferred)
+    )
@@ -0,0 +1,94 @@
+"""
+Disk-backed chat history for TubeMind sessions
+Messages are appended to a JSON-lines file so session state only keeps byte offsets; logs of sessions
+that have gone quiet are swept away when new sessions start
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from config import DATA_DIR
+
+# Chat logs untouched for this long belong to sessions that are gone (sessions don't say when they end)
+CHAT_MAX_AGE_HOURS = float(os.getenv("TUBEMIND_CHAT_MAX_AGE_HOURS", "24"))
+
+
+def sweep_chats(chat_dir, max_age_seconds, keep=None):
+    """Delete chat logs in chat_dir not written to for max_age_seconds (except keep); returns how many"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    with os.scandir(chat_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".jsonl") or entry.path == keep:
+                continue
+            with contextlib.suppress(OSError):
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+    return removed
+
+
+class ChatHistoryStore:
+    """Append-only chat log for one session, with random access by message index"""
+
+    def __init__(self, session_id, data_dir=None, max_age_hours=CHAT_MAX_AGE_HOURS):
+        chat_dir = os.path.join(data_dir or DATA_DIR, "chats")
+        os.makedirs(chat_dir, exist_ok=True)
+        self.path = os.path.join(chat_dir, f"{session_id}.jsonl")
+        self._lock = threading.Lock()
+        self._offsets = []  # Byte offset where each message starts
+        if max_age_hours > 0:
+            sweep_chats(chat_dir, max_age_hours * 3600, keep=self.path)
+
+        # Pick up an existing log (e.g. after a server-side session restore)
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    self._offsets.append(offset)
+                    offset += len(line)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def append(self, role, content):
+        """Append one message to the end of the log"""
+        line = (json.dumps({"role": role, "content": content}, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    self._offsets = []  # Log was swept: start over
+                self._offsets.append(f.tell())
+                f.write(line)
+
+    def load(self, start, stop=None):
+        """Read messages[start:stop] from disk without touching the rest of the log"""
+        start, stop, _ = slice(start, stop).indices(len(self._offsets))
+        if start >= stop:
+            return []
+
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            # Swept while the session sat idle past the age limit: the history is gone
+            with self._lock:
+                self._offsets = []
+            return []
+        with f:
+            f.seek(self._offsets[start])
+            return [json.loads(f.readline()) for _ in range(stop - start)]
+
+    def tail(self, n):
+        """Return the last n messages"""
+        return self.load(max(len(self._offsets) - n, 0))
+
+    def clear(self):
+        """Drop all messages (new video or cleared session)"""
+        with self._lock:
+            self._offsets = []
+            if os.path.exists(self.path):
+                os.remove(self.path)
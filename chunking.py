@@ -0,0 +1,109 @@
+"""
+Transcript chunking for retrieval and indexing
+Groups timed caption segments into token-budgeted chunks that keep their start/end times; cuts are
+placed at sentence ends and pauses in speech where possible, and consecutive chunks overlap a little
+"""
+
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+import numpy as np
+
+# Same estimate as conversation_memory.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+# A gap in speech at least this long (seconds between one caption ending and the next starting) is a pause
+PAUSE_SECONDS = 0.8
+
+# A chunk is cut at the best boundary once it has at least this share of its token budget
+MIN_FILL = 0.5
+
+SENTENCE_END = '.!?…。！？'
+CLOSING = '"\')]»”’'
+
+# Boundary strength after a segment: sentence ends matter more than pauses
+SENTENCE_SCORE = 2
+PAUSE_SCORE = 1
+
+
+def _code_points(chars):
+    return np.array([ord(c) for c in chars], dtype=np.uint32)
+
+
+_SENTENCE_CODES = _code_points(SENTENCE_END)
+_CLOSING_CODES = _code_points(CLOSING)
+
+
+class SegmentArrays:
+    """Timings, token estimates and sentence ends of a segment list as arrays, built in a few vectorized passes"""
+
+    def __init__(self, segments):
+        n = len(segments)
+        self.starts = np.fromiter(map(itemgetter('start'), segments), dtype=np.float64, count=n)
+        self.ends = self.starts + np.fromiter(map(itemgetter('duration'), segments), dtype=np.float64, count=n)
+
+        # All texts in one NUL-separated buffer, so lengths and last characters are array lookups
+        self.text = '\x00'.join(map(itemgetter('text'), segments)) + '\x00'
+        codes = np.frombuffer(self.text.encode('utf-32-le'), dtype=np.uint32)
+        self.separators = np.flatnonzero(codes == 0)
+        lengths = np.diff(self.separators, prepend=-1) - 1
+        last = self.separators - 1
+        last = np.where(np.isin(codes[last], _CLOSING_CODES) & (lengths > 1), last - 1, last)  # Skip a closing quote
+        self.sentence = np.isin(codes[last], _SENTENCE_CODES) & (lengths > 0)
+        self.tokens = (lengths + 1) / CHARS_PER_TOKEN
+
+    def text_between(self, i, j):
+        """Text of segments[i:j], space-separated"""
+        first = self.separators[i - 1] + 1 if i else 0
+        return self.text[first:self.separators[j - 1]].replace('\x00', ' ')
+
+
+def boundary_scores(starts, ends, sentence, pause_seconds=PAUSE_SECONDS):
+    """How good a place the end of each segment is to cut (0 = mid-sentence, no pause)"""
+    # Auto captions overlap in time, so only a real gap before the next segment counts as a pause
+    gaps = np.full(len(starts), np.inf)
+    gaps[:-1] = starts[1:] - ends[:-1]
+    return np.where(sentence, SENTENCE_SCORE, 0) + np.where(gaps >= pause_seconds, PAUSE_SCORE, 0)
+
+
+def chunk_segments(segments, max_tokens=300, overlap_tokens=40, min_fill=MIN_FILL):
+    """Group consecutive segments into chunks of at most max_tokens, overlapping by up to overlap_tokens
+
+    Each chunk ends at the strongest boundary in the last (1 - min_fill) of its budget, the latest one on
+    a tie; the next one starts at the first sentence inside the overlap. A single segment over the budget
+    is a chunk of its own.
+    """
+    if not segments:
+        return []
+    arrays = SegmentArrays(segments)
+    scores = boundary_scores(arrays.starts, arrays.ends, arrays.sentence)
+    # Per-chunk lookups are scalar, where bisect on lists beats numpy's call overhead
+    sentence_starts = (np.flatnonzero(scores >= SENTENCE_SCORE) + 1).tolist()  # Segments that begin a sentence
+    cumulative = np.concatenate(([0.0], np.cumsum(arrays.tokens))).tolist()  # Tokens before segment i
+    n = len(segments)
+
+    chunks = []
+    i = 0
+    while i < n:
+        # Chunk is segments[i:j]; j is bounded by the budget, and by the minimum fill from below
+        j = max(bisect_right(cumulative, cumulative[i] + max_tokens) - 1, i + 1)
+        if j < n:
+            low = max(bisect_left(cumulative, cumulative[i] + max_tokens * min_fill), i + 1)
+            if low < j:
+                j -= int(np.argmax(scores[low - 1:j][::-1]))  # Latest of the strongest boundaries
+
+        chunks.append({
+            'start': float(arrays.starts[i]),
+            'end': float(arrays.ends[j - 1]),
+            'text': arrays.text_between(i, j),
+        })
+        if j >= n:
+            break
+
+        # Overlap: step back at most overlap_tokens, then forward to the first sentence start, if any
+        k = bisect_left(cumulative, cumulative[j] - overlap_tokens)
+        first_sentence = bisect_left(sentence_starts, k)
+        if first_sentence < len(sentence_starts) and sentence_starts[first_sentence] < j:
+            k = sentence_starts[first_sentence]
+        i = max(k, i + 1)
+    return chunks
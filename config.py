@@ -0,0 +1,8 @@
+"""
+Shared settings for TubeMind modules
+"""
+
+import os
+
+# Where TubeMind keeps its local data (chat logs, transcript library, indexes)
+DATA_DIR = os.getenv("TUBEMIND_DATA_DIR", ".tubemind")
@@ -0,0 +1,105 @@
+"""
+Conversation memory for TubeMind chat prompts
+Keeps a token-budgeted window of recent turns plus a rolling digest of older ones
+"""
+
+import re
+from collections import deque
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def make_gist(text, max_chars):
+    """Condense a message to its opening sentence(s), capped at max_chars"""
+    text = re.sub(r'[*#>`_]+', '', text)  # Drop markdown decoration
+    text = ' '.join(text.split())
+    if len(text) <= max_chars:
+        return text
+
+    # Prefer cutting at a sentence end, otherwise at a word boundary
+    cut = text.rfind('. ', 0, max_chars)
+    if cut < max_chars // 3:
+        cut = text.rfind(' ', 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    return text[:cut].rstrip(' .,;:') + '…'
+
+
+class ConversationMemory:
+    """Rolling digest of older turns plus a token-budgeted window of recent ones"""
+
+    def __init__(self, window_tokens=1500, digest_tokens=600, gist_chars=240, min_gist_chars=60):
+        self.window_tokens = window_tokens
+        self.digest_tokens = digest_tokens
+        self.gist_chars = gist_chars
+        self.min_gist_chars = min_gist_chars
+
+        self.recent = deque()  # Messages still quoted verbatim
+        self.digest = []       # [role, gist] for turns that left the window
+        self.omitted = 0       # Middle turns dropped once the digest is fully compacted
+        self._recent_tokens = 0
+
+    def __len__(self):
+        return len(self.recent) + len(self.digest) + self.omitted
+
+    def add(self, role, content):
+        """Record a message, folding the oldest recent turns into the digest when over budget"""
+        self.recent.append({'role': role, 'content': content})
+        self._recent_tokens += estimate_tokens(content)
+
+        # Always keep the latest message verbatim, even if it alone exceeds the window
+        while self._recent_tokens > self.window_tokens and len(self.recent) > 1:
+            message = self.recent.popleft()
+            self._recent_tokens -= estimate_tokens(message['content'])
+            self._fold(message)
+
+    def clear(self):
+        self.recent.clear()
+        self.digest = []
+        self.omitted = 0
+        self._recent_tokens = 0
+
+    def _digest_size(self):
+        return sum(estimate_tokens(gist) + 2 for _, gist in self.digest)
+
+    def _fold(self, message):
+        """Move one message into the digest, then compact until the digest fits its budget"""
+        self.digest.append([message['role'], make_gist(message['content'], self.gist_chars)])
+
+        limit = self.gist_chars
+        while self._digest_size() > self.digest_tokens:
+            if limit > self.min_gist_chars:
+                # First shorten every gist, so early turns are kept rather than dropped
+                limit = max(limit // 2, self.min_gist_chars)
+                for entry in self.digest:
+                    entry[1] = make_gist(entry[1], limit)
+            elif len(self.digest) > 2:
+                # Fully compacted: keep the opening turn and drop the oldest one after it
+                del self.digest[1]
+                self.omitted += 1
+            else:
+                break
+
+    def render(self):
+        """Format the memory as a prompt block (empty string when there is no history)"""
+        lines = []
+        if self.digest:
+            lines.append("Earlier in the conversation (condensed):")
+            for i, (role, gist) in enumerate(self.digest):
+                lines.append(f"- {role}: {gist}")
+                if i == 0 and self.omitted:
+                    lines.append(f"- ({self.omitted} more earlier messages omitted)")
+
+        if self.recent:
+            lines.append("Previous conversation:")
+            max_chars = self.window_tokens * 4
+            for message in self.recent:
+                content = message['content']
+                if len(content) > max_chars:
+                    content = content[:max_chars] + '…'
+                lines.append(f"{message['role']}: {content}")
+
+        return '\n'.join(lines)
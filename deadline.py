@@ -0,0 +1,129 @@
+"""
+Request-scoped deadlines for the fetch and LLM pipeline
+One Deadline is created per user action and passed down through every stage, which takes its
+timeouts, retries and sleeps out of the time that is left instead of using fixed values
+"""
+
+import os
+import threading
+import time
+
+from profiling import in_context
+
+# End-to-end budgets in seconds
+PROCESS_DEADLINE = float(os.getenv("TUBEMIND_PROCESS_DEADLINE", "45"))  # Process Video: fetch + summary
+ANSWER_DEADLINE = float(os.getenv("TUBEMIND_ANSWER_DEADLINE", "30"))  # One chat or library answer
+BULK_DEADLINE = float(os.getenv("TUBEMIND_BULK_DEADLINE", "300"))  # One bulk digest request, all videos together
+
+# Share of the process budget the transcript fetch may use, so the summary still gets a turn
+FETCH_SHARE = 0.6
+
+# Below this there's no point starting a network call
+MIN_USEFUL_SECONDS = 0.5
+
+# How often a call abandoned in run() looks for a cancel()
+CANCEL_CHECK_SECONDS = 0.2
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out; stage says where"""
+
+    def __init__(self, stage):
+        super().__init__(f"Ran out of time during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Point in time by which a request must finish (None means no limit); cancel() ends it early"""
+
+    def __init__(self, seconds=None):
+        self.budget = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Run out now: later checks fail, and a call waiting in run() is abandoned"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        if self._cancelled.is_set():
+            return 0.0
+        if self.expires_at is None:
+            return float('inf')
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self):
+        return 0.0 if self.budget is None else self.budget - self.remaining()
+
+    def expired(self):
+        """True once too little time is left to start anything useful"""
+        return self.remaining() < MIN_USEFUL_SECONDS
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, cap, stage):
+        """Timeout for one call: the stage's own cap, shortened to the time left"""
+        self.check(stage)
+        remaining = self.remaining()
+        if cap is None:
+            return None if remaining == float('inf') else remaining
+        return min(cap, remaining)
+
+    def allows(self, seconds):
+        """Whether waiting this long still leaves time for a useful attempt afterwards"""
+        return self.remaining() > seconds + MIN_USEFUL_SECONDS
+
+    def sleep(self, seconds, max_share=0.1):
+        """Courtesy delay, shrunk so it never eats more than max_share of the time left"""
+        pause = min(seconds, self.remaining() * max_share)
+        if pause > 0:
+            time.sleep(pause)
+
+    def share(self, fraction):
+        """Sub-deadline for a stage that may only use part of the time left"""
+        if self.expires_at is None:
+            return Deadline()
+        return Deadline(self.remaining() * fraction)
+
+    def limit(self, seconds):
+        """Sub-deadline for one step of a longer job: at most seconds, and never past this deadline"""
+        return Deadline(min(seconds, self.remaining()))
+
+    def run(self, stage, func, *args, **kwargs):
+        """Call a blocking function that has no timeout of its own, giving up when time runs out
+
+        The call keeps running in a daemon thread if abandoned; its result is discarded
+        """
+        if self.expires_at is None:
+            return func(*args, **kwargs)
+        self.check(stage)
+
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=in_context(target), daemon=True)
+        worker.start()
+        # Short joins, so a cancel() doesn't wait for the rest of the budget
+        while worker.is_alive() and self.remaining() > 0:
+            worker.join(min(self.remaining(), CANCEL_CHECK_SECONDS))
+        if worker.is_alive():
+            raise DeadlineExceeded(stage)
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome.get('result')
+
+
+def ensure_deadline(deadline):
+    """Callers that don't pass a deadline keep the old, unlimited behaviour"""
+    return deadline if deadline is not None else Deadline()
@@ -0,0 +1,306 @@
+"""
+Structured video digest: summary, timestamped chapters, key points and takeaways
+Produced by one JSON-mode LLM call, validated against DIGEST_SCHEMA and cached as a single unit
+"""
+
+import hashlib
+import json
+import re
+
+from library_index import group_passages, format_timestamp, video_url
+
+# A type, a tuple of types, a {field: schema} object (every field required) or a [item schema] list
+DIGEST_SCHEMA = {
+    'summary': str,
+    'chapters': [{'start': (int, float), 'title': str}],
+    'key_points': [str],
+    'takeaways': [str],
+}
+
+# Transcript characters sent with the prompt (same order of size as the Q&A prompt);
+# longer transcripts are summarized section by section and then reduced
+DIGEST_TRANSCRIPT_CHARS = 20000
+MAX_ITEMS = 12
+
+# Short videos (clips, shorts) are digested several to a request: the combined transcripts stay within
+# the single-video prompt size, with at most BATCH_VIDEOS digests asked for at once
+BATCH_MAX_SECONDS = 180
+BATCH_VIDEOS = 8
+
+# Sections are fixed time windows, so edited captions leave the other sections' text (and hashes) unchanged
+SECTION_SECONDS = 600
+
+DIGEST_FORMAT = """Respond with ONLY a JSON object of this exact shape:
+{
+  "summary": "executive summary in 2-4 paragraphs",
+  "chapters": [{"start": <seconds from the start of the video, a number>, "title": "short chapter title"}],
+  "key_points": ["one sentence per key point"],
+  "takeaways": ["one actionable takeaway or conclusion per item"]
+}"""
+
+# Common follow-up questions answered straight from the digest, per section; cached for these exact
+# phrasings only, so a question that merely looks like one (e.g. adds a "not") still goes to the model
+FOLLOW_UPS = {
+    'summary': [
+        "Summarize the video", "Summarize this video", "What is this video about?", "Give me a summary",
+    ],
+    'chapters': [
+        "What are the chapters?", "What are the chapters of this video?", "What topics are covered?",
+        "What topics does this video cover?", "Give me a timeline of the video",
+    ],
+    'key_points': [
+        "What are the key points?", "What are the key points of this video?", "What are the main points?",
+        "What are the main points of this video?", "What are the main ideas?",
+    ],
+    'takeaways': [
+        "What are the key takeaways?", "What are the takeaways from this video?", "What are the action items?",
+        "What should I take away from this video?",
+    ],
+}
+
+
+class DigestError(ValueError):
+    """The model's output doesn't match DIGEST_SCHEMA"""
+
+
+def check_schema(value, schema, path='digest'):
+    """Raise DigestError at the first place value doesn't match the schema"""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise DigestError(f"{path} must be an object")
+        for field, field_schema in schema.items():
+            if field not in value:
+                raise DigestError(f"{path}.{field} is missing")
+            check_schema(value[field], field_schema, f"{path}.{field}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            raise DigestError(f"{path} must be a list")
+        for i, item in enumerate(value):
+            check_schema(item, schema[0], f"{path}[{i}]")
+    elif isinstance(value, bool) or not isinstance(value, schema):
+        # bool is an int subclass but never a valid timestamp
+        raise DigestError(f"{path} has the wrong type ({type(value).__name__})")
+
+
+def timestamped_transcript(segments, max_chars=DIGEST_TRANSCRIPT_CHARS):
+    """Transcript as '[M:SS] text' lines, so the model can place chapters in time"""
+    lines, size = [], 0
+    for start, text in group_passages(segments, max_chars=600, max_seconds=60):
+        line = f"[{format_timestamp(start)}] {text}"
+        if size + len(line) > max_chars:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)
+
+
+def build_digest_prompt(segments, title=None):
+    """Prompt asking for the whole digest as one JSON object"""
+    heading = f"Video title: {title}\n\n" if title else ""
+    return f"""You are a professional content analyst. Read the following video transcript and produce a structured digest.
+
+{heading}Transcript (each line starts with its [minutes:seconds] timestamp):
+{timestamped_transcript(segments)}
+
+{DIGEST_FORMAT}
+
+Rules:
+- Use only information from the transcript
+- Chapters follow the video in order and start at the timestamps shown in the transcript
+- 3-{MAX_ITEMS} chapters, 3-{MAX_ITEMS} key points and 2-{MAX_ITEMS} takeaways"""
+
+
+def build_batch_digest_prompt(videos):
+    """Prompt asking for one digest per video, as a JSON array; videos are (video_id, record) pairs"""
+    blocks = []
+    for video_id, record in videos:
+        heading = f"Video title: {record['title']}\n" if record.get('title') else ""
+        blocks.append(
+            f"=== VIDEO {video_id} ===\n{heading}{timestamped_transcript(record['segments'])}\n=== END VIDEO {video_id} ==="
+        )
+    ids = ', '.join(f'"{video_id}"' for video_id, _ in videos)
+    transcripts = '\n\n'.join(blocks)
+    return f"""You are a professional content analyst. Below are the transcripts of {len(videos)} separate short videos, each between "=== VIDEO <id> ===" and "=== END VIDEO <id> ===" lines. Produce a structured digest of each video on its own.
+
+Transcripts (each line starts with its [minutes:seconds] timestamp):
+{transcripts}
+
+Respond with ONLY a JSON array with one object per video, each of this exact shape:
+{{
+  "video_id": "the id from the VIDEO line",
+  "summary": "executive summary in 1-2 paragraphs",
+  "chapters": [{{"start": <seconds from the start of that video, a number>, "title": "short chapter title"}}],
+  "key_points": ["one sentence per key point"],
+  "takeaways": ["one actionable takeaway or conclusion per item"]
+}}
+
+Rules:
+- One object for each of these video ids: {ids}
+- Use only information from that video's own transcript; never mix videos
+- Chapters follow the video in order and start at the timestamps shown in its transcript
+- 1-5 chapters, 2-6 key points and 1-4 takeaways per video"""
+
+
+def batch_digest_videos(videos, max_chars=DIGEST_TRANSCRIPT_CHARS, max_videos=BATCH_VIDEOS):
+    """Group (video_id, record) pairs into batches whose transcripts fit one prompt together"""
+    batches, current, size = [], [], 0
+    for video_id, record in videos:
+        chars = len(timestamped_transcript(record['segments']))
+        if current and (size + chars > max_chars or len(current) >= max_videos):
+            batches.append(current)
+            current, size = [], 0
+        current.append((video_id, record))
+        size += chars
+    if current:
+        batches.append(current)
+    return batches
+
+
+def transcript_chars(segments):
+    return sum(len(seg['text']) + 1 for seg in segments)
+
+
+def split_sections(segments, section_seconds=SECTION_SECONDS):
+    """Split segments into consecutive fixed-length time windows: [{'start', 'end', 'segments'}]"""
+    sections = {}
+    for seg in segments:
+        sections.setdefault(int(seg['start'] // section_seconds), []).append(seg)
+    return [
+        {'start': index * section_seconds, 'end': (index + 1) * section_seconds, 'segments': segs}
+        for index, segs in sorted(sections.items())
+    ]
+
+
+def section_key(section):
+    """Content hash of a section's timed text; its summary is stored under this key"""
+    text = '\n'.join(f"{seg['start']:.1f} {seg['text']}" for seg in section['segments'])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def section_label(section):
+    return f"{format_timestamp(section['start'])}–{format_timestamp(section['segments'][-1]['start'])}"
+
+
+def build_section_prompt(section, title=None):
+    """Prompt for the notes on one section of a long video (the map step)"""
+    heading = f"Video title: {title}\n\n" if title else ""
+    return f"""You are a professional content analyst. Below is one section ({section_label(section)}) of a longer video transcript.
+
+{heading}Transcript section (each line starts with its [minutes:seconds] timestamp):
+{timestamped_transcript(section['segments'])}
+
+Write 3-6 concise bullet points covering the main points of this section.
+Start each bullet with the [minutes:seconds] timestamp where the point is made, e.g. "- [12:34] ...".
+Use only information from the transcript section."""
+
+
+def build_reduce_prompt(section_notes, title=None):
+    """Prompt that folds the per-section notes into the final digest (the reduce step)"""
+    heading = f"Video title: {title}\n\n" if title else ""
+    notes = '\n\n'.join(f"[{label}]\n{note}" for label, note in section_notes)
+    return f"""You are a professional content analyst. Below are notes on consecutive sections of one long video, each labelled with its time range.
+
+{heading}{notes}
+
+{DIGEST_FORMAT}
+
+Rules:
+- Cover the whole video, using only information from the notes
+- Chapters follow the video in order; take their start times from the timestamps in the notes
+- 3-{MAX_ITEMS} chapters, 3-{MAX_ITEMS} key points and 2-{MAX_ITEMS} takeaways"""
+
+
+def load_json(text):
+    """The model's JSON output; raises DigestError"""
+    if not text:
+        raise DigestError("empty response")
+    # JSON mode shouldn't add code fences, but older models sometimes do
+    text = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise DigestError(f"not valid JSON: {e}")
+
+
+def parse_digest(text, duration=None):
+    """Parse, validate and tidy the model's JSON; raises DigestError"""
+    return tidy_digest(load_json(text), duration)
+
+
+def parse_batch_digests(text, durations):
+    """Valid digests from a batch response as {video_id: digest}; durations maps the ids asked for
+    
+    Raises DigestError only if the response as a whole is unusable; videos missing from it,
+    repeated or with an invalid digest are left out, to be retried on their own
+    """
+    data = load_json(text)
+    if not isinstance(data, list):
+        raise DigestError("batch response must be a list")
+    digests, seen = {}, set()
+    for i, item in enumerate(data):
+        video_id = item.get('video_id') if isinstance(item, dict) else None
+        if video_id not in durations or video_id in seen:
+            continue
+        seen.add(video_id)
+        try:
+            digests[video_id] = tidy_digest(item, durations[video_id], path=f"digest[{i}]")
+        except DigestError:
+            continue
+    return digests
+
+
+def tidy_digest(data, duration=None, path='digest'):
+    """Validate a decoded digest and normalize it; raises DigestError"""
+    check_schema(data, DIGEST_SCHEMA, path)
+
+    summary = data['summary'].strip()
+    if not summary:
+        raise DigestError(f"{path}.summary is empty")
+
+    chapters, seen = [], set()
+    for chapter in sorted(data['chapters'], key=lambda c: c['start']):
+        start = max(float(chapter['start']), 0.0)
+        if duration and start > duration:
+            continue  # Made-up timestamp past the end of the video
+        title = chapter['title'].strip()
+        if title and int(start) not in seen:
+            seen.add(int(start))
+            chapters.append({'start': start, 'title': title})
+
+    def items(field):
+        return [item.strip() for item in data[field] if item.strip()][:MAX_ITEMS]
+
+    return {
+        'summary': summary,
+        'chapters': chapters[:MAX_ITEMS],
+        'key_points': items('key_points'),
+        'takeaways': items('takeaways'),
+    }
+
+
+def fallback_digest(summary):
+    """Digest with just a free-form summary, used when structured generation fails"""
+    return {'summary': summary, 'chapters': [], 'key_points': [], 'takeaways': []}
+
+
+def chapters_markdown(digest, video_id):
+    return '\n'.join(
+        f"- [{format_timestamp(c['start'])}]({video_url(video_id, c['start'])}) {c['title']}"
+        for c in digest['chapters']
+    )
+
+
+def follow_up_answers(digest, video_id):
+    """(question, answer) pairs for the common follow-ups this digest already answers"""
+    sections = {
+        'summary': digest['summary'],
+        'chapters': chapters_markdown(digest, video_id),
+        'key_points': '\n'.join(f"- {p}" for p in digest['key_points']),
+        'takeaways': '\n'.join(f"- {t}" for t in digest['takeaways']),
+    }
+    return [
+        (question, sections[section])
+        for section, questions in FOLLOW_UPS.items()
+        if sections[section]
+        for question in questions
+    ]
@@ -0,0 +1,292 @@
+"""
+Embedding pipeline and memory-mapped vector store for semantic search across videos
+Vectors live in an append-only float32 file that is memory-mapped for search,
+with a small SQLite side index mapping rows to video, time range and text;
+processes sharing a data directory take turns appending under the index's write lock
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+import google.generativeai as genai
+
+from chunking import chunk_segments
+from config import DATA_DIR
+
+# Which embedder to use: "gemini" (default) or "hashing" (deterministic, offline)
+EMBEDDER = os.getenv("TUBEMIND_EMBEDDER", "gemini")
+
+# Rows scored per block during search, so only one block of vectors is paged in at a time
+SEARCH_BLOCK_ROWS = 65536
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class HashingEmbedder:
+    """Deterministic local embedder using signed feature hashing of words and word pairs"""
+
+    batch_size = 512
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_documents(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        return normalize_rows(vectors)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class GeminiEmbedder:
+    """Gemini text embeddings, requested in batches"""
+
+    batch_size = 100
+
+    def __init__(self, model='models/text-embedding-004', dim=768):
+        self.model = model
+        self.dim = dim
+        self.name = model.split('/')[-1]
+
+    def embed_documents(self, texts):
+        result = genai.embed_content(model=self.model, content=list(texts), task_type='retrieval_document')
+        return normalize_rows(result['embedding'])
+
+    def embed_query(self, text):
+        result = genai.embed_content(model=self.model, content=text, task_type='retrieval_query')
+        return normalize_rows([result['embedding']])[0]
+
+
+def get_embedder(name=None):
+    """Embedder selected by name or the TUBEMIND_EMBEDDER setting"""
+    name = name or EMBEDDER
+    if name == 'hashing':
+        return HashingEmbedder()
+    if name == 'gemini':
+        return GeminiEmbedder()
+    raise ValueError(f"Unknown embedder: {name}")
+
+
+class EmbeddingStore:
+    """Append-only, memory-mapped float32 matrix of chunk embeddings with a SQLite side index"""
+
+    def __init__(self, dim, directory=None):
+        self.dim = dim
+        self.directory = directory or os.path.join(DATA_DIR, "embeddings")
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                text TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS chunks_video ON chunks(video_id, deleted);
+        """)
+
+        self._version = None
+        self._rows = 0
+        self._deleted = set()
+        self._matrix = None
+        with self._lock:
+            self._refresh()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self._rows - len(self._deleted)
+
+    def _refresh(self):
+        """Pick up rows other processes added or replaced since we last looked (caller holds the lock)
+
+        The side index is committed after the vectors are written, so its rows always have vectors on disk
+        """
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]  # Changes when another connection commits
+        if version == self._version:
+            return
+        self._version = version
+        self._rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self._deleted = {r for (r,) in self._conn.execute("SELECT row FROM chunks WHERE deleted = 1")}
+
+    def has_video(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE video_id = ? AND deleted = 0 LIMIT 1", (video_id,)
+            ).fetchone()
+        return row is not None
+
+    def add(self, video_id, chunks, vectors):
+        """Append vectors for a video's chunks, replacing any earlier ones for that video"""
+        vectors = normalize_rows(vectors)
+        if vectors.shape != (len(chunks), self.dim):
+            raise ValueError(f"Expected {len(chunks)} vectors of size {self.dim}, got {vectors.shape}")
+
+        with self._lock:
+            # The index's write lock serializes appends between every process sharing the store
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                first = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+                old_rows = [r for (r,) in self._conn.execute(
+                    "SELECT row FROM chunks WHERE video_id = ? AND deleted = 0", (video_id,)
+                )]
+
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(first * self.dim * 4)  # Drop vectors left behind by an interrupted append
+                    f.write(vectors.tobytes())
+
+                self._conn.execute("UPDATE chunks SET deleted = 1 WHERE video_id = ? AND deleted = 0", (video_id,))
+                self._conn.executemany(
+                    "INSERT INTO chunks (row, video_id, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                    [(first + i, video_id, c['start'], c['end'], c['text']) for i, c in enumerate(chunks)]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._refresh()
+            self._rows = max(self._rows, first + len(chunks))
+            self._deleted.update(old_rows)
+
+    def export(self):
+        """Live chunks grouped by video, with their vectors: ([(video_id, start, end, text)], float32 matrix)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row, video_id, start, end, text FROM chunks WHERE deleted = 0 ORDER BY video_id, row"
+            ).fetchall()
+            self._refresh()
+            matrix = self._map()
+        if not rows:
+            return [], np.empty((0, self.dim), dtype=np.float32)
+        vectors = matrix[np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))]
+        return [r[1:] for r in rows], vectors
+
+    def _map(self):
+        """Memory map of all rows written so far (remapped only when the file has grown)"""
+        if self._rows == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != self._rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self._rows, self.dim))
+        return self._matrix
+
+    def _video_rows(self, video_ids):
+        placeholders = ','.join('?' * len(video_ids))
+        rows = self._conn.execute(
+            f"SELECT row FROM chunks WHERE deleted = 0 AND video_id IN ({placeholders}) ORDER BY row",
+            list(video_ids)
+        ).fetchall()
+        return np.fromiter((r for (r,) in rows), dtype=np.int64, count=len(rows))
+
+    def search(self, query_vector, k=10, video_ids=None):
+        """Top-k chunks by cosine similarity, optionally restricted to some videos"""
+        query = normalize_rows([query_vector])[0]
+        with self._lock:
+            self._refresh()
+            matrix = self._map()
+            if matrix is None:
+                return []
+            deleted = np.fromiter(self._deleted, dtype=np.int64, count=len(self._deleted))
+            candidates = self._video_rows(video_ids) if video_ids else None
+            if candidates is not None:
+                candidates = candidates[candidates < matrix.shape[0]]  # Committed by another process just now
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        if candidates is not None:
+            blocks = (candidates[i:i + SEARCH_BLOCK_ROWS] for i in range(0, len(candidates), SEARCH_BLOCK_ROWS))
+        else:
+            blocks = (np.arange(i, min(i + SEARCH_BLOCK_ROWS, matrix.shape[0]))
+                      for i in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS))
+
+        for rows in blocks:
+            if candidates is None:
+                scores = matrix[rows[0]:rows[-1] + 1] @ query
+                if len(deleted):
+                    stale = deleted[(deleted >= rows[0]) & (deleted <= rows[-1])] - rows[0]
+                    scores[stale] = -np.inf
+            else:
+                scores = matrix[rows] @ query
+
+            # Keep a running top-k across blocks
+            rows = np.concatenate([best_rows, rows])
+            scores = np.concatenate([best_scores, scores])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            best_rows, best_scores = rows, scores
+
+        order = np.argsort(-best_scores)
+        best_rows, best_scores = best_rows[order], best_scores[order]
+        keep = np.isfinite(best_scores)
+        best_rows, best_scores = best_rows[keep], best_scores[keep]
+        if not len(best_rows):
+            return []
+
+        with self._lock:
+            placeholders = ','.join('?' * len(best_rows))
+            meta = {
+                row: (video_id, start, end, text)
+                for row, video_id, start, end, text in self._conn.execute(
+                    f"SELECT row, video_id, start, end, text FROM chunks WHERE row IN ({placeholders})",
+                    [int(r) for r in best_rows]
+                )
+            }
+
+        return [
+            {
+                'video_id': meta[int(row)][0],
+                'start': meta[int(row)][1],
+                'end': meta[int(row)][2],
+                'text': meta[int(row)][3],
+                'score': float(score),
+            }
+            for row, score in zip(best_rows, best_scores)
+        ]
+
+
+def index_video(store, embedder, video_id, segments):
+    """Chunk a transcript, embed the chunks in batches and store the vectors"""
+    chunks = chunk_segments(segments)
+    if not chunks:
+        return 0
+
+    vectors = []
+    for i in range(0, len(chunks), embedder.batch_size):
+        batch = chunks[i:i + embedder.batch_size]
+        vectors.append(embedder.embed_documents([c['text'] for c in batch]))
+
+    store.add(video_id, chunks, np.vstack(vectors))
+    return len(chunks)
+
+
+def open_store(embedder):
+    """Vector store for an embedder (each embedder gets its own directory, since dimensions differ)"""
+    return EmbeddingStore(embedder.dim, os.path.join(DATA_DIR, "embeddings", embedder.name))
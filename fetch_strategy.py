@@ -0,0 +1,219 @@
+"""
+Adaptive ordering of transcript fetch methods
+Keeps rolling success/latency stats per method, orders methods by expected time to a
+successful fetch and puts a circuit breaker in front of each one
+"""
+
+import threading
+import time
+from collections import deque
+
+from deadline import DeadlineExceeded, ensure_deadline
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Stops calling a failing method, letting a single probe through after a cooldown"""
+
+    def __init__(self, failure_threshold=3, cooldown=120, max_cooldown=1800):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self, now):
+        """Whether a call may go through now (moves an expired open breaker to half-open)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.opened_at + self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # Failed probe: stay open, and wait longer before the next one
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open(now)
+        elif self.failures >= self.failure_threshold:
+            self._open(now)
+
+    def release(self):
+        """A probe ended without a verdict; let the next call probe again"""
+        self.probing = False
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.probing = False
+
+    def retry_in(self, now):
+        return max(self.opened_at + self.cooldown - now, 0) if self.state == OPEN else 0
+
+
+class MethodStats:
+    """Rolling success rate and latency of one fetch method"""
+
+    def __init__(self, prior_latency, window=20):
+        self.prior_latency = prior_latency
+        self.outcomes = deque(maxlen=window)  # (succeeded, seconds)
+        self.last_attempt = 0.0
+
+    def record(self, succeeded, seconds):
+        self.outcomes.append((succeeded, seconds))
+
+    def success_rate(self):
+        # Smoothed towards 50% so a couple of outcomes don't dominate
+        successes = sum(1 for ok, _ in self.outcomes if ok)
+        return (successes + 1) / (len(self.outcomes) + 2)
+
+    def mean_latency(self):
+        if not self.outcomes:
+            return self.prior_latency
+        return sum(seconds for _, seconds in self.outcomes) / len(self.outcomes)
+
+    def expected_cost(self):
+        """Expected seconds spent per successful fetch when trying this method"""
+        return self.mean_latency() / self.success_rate()
+
+
+class FetchStrategy:
+    """Runs fetch methods cheapest-first, skipping methods whose breaker is open"""
+
+    def __init__(self, methods, priors=None, failure_threshold=3, cooldown=120, probe_interval=600):
+        self.methods = dict(methods)  # name -> callable(video_id, deadline) returning a record or None
+        priors = priors or {}
+        self.stats = {name: MethodStats(priors.get(name, 10.0)) for name in self.methods}
+        self.breakers = {name: CircuitBreaker(failure_threshold, cooldown) for name in self.methods}
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Method names by expected cost (ties keep the configured order)
+
+        A demoted method that hasn't run for probe_interval goes first once, so its stats
+        can recover when it starts working again
+        """
+        position = {name: i for i, name in enumerate(self.methods)}
+        now = time.time()
+        with self._lock:
+            names = sorted(self.methods, key=lambda name: (self.stats[name].expected_cost(), position[name]))
+            for name in names[1:]:
+                stats = self.stats[name]
+                if stats.outcomes and now - stats.last_attempt > self.probe_interval:
+                    stats.last_attempt = now  # Claim the probe so concurrent fetches don't all take it
+                    names.remove(name)
+                    names.insert(0, name)
+                    break
+            return names
+
+    def fetch(self, video_id, deadline=None, on_attempt=None, on_error=None):
+        """Try methods in adaptive order; returns (record, method name) or (None, None)
+
+        on_attempt(name, first) is called before each method runs, on_error(name, error) when one raises.
+        Raises DeadlineExceeded when the deadline runs out before a method succeeds.
+        """
+        deadline = ensure_deadline(deadline)
+        failed = []  # (name, seconds) of methods that returned nothing for this video
+        skipped = []
+
+        for name in self.order():
+            with self._lock:
+                allowed = self.breakers[name].allow(time.time())
+            if not allowed:
+                skipped.append(name)
+                continue
+            record = self._attempt(name, video_id, deadline, failed, on_attempt, on_error)
+            if record:
+                return record, name
+
+        if not failed and skipped:
+            # Every breaker is open; rather than fail without trying, probe the one closest to reopening
+            now = time.time()
+            with self._lock:
+                name = min(skipped, key=lambda n: self.breakers[n].retry_in(now))
+                self.breakers[name].probing = True
+            record = self._attempt(name, video_id, deadline, failed, on_attempt, on_error)
+            if record:
+                return record, name
+
+        # Nothing worked: most likely the video itself (no captions, private), so the methods
+        # aren't blamed; half-open probes are released for the next request
+        self._release(failed)
+        return None, None
+
+    def _release(self, attempts):
+        with self._lock:
+            for name, _ in attempts:
+                self.breakers[name].release()
+
+    def _attempt(self, name, video_id, deadline, failed, on_attempt, on_error):
+        try:
+            deadline.check("the transcript fetch")
+            if on_attempt:
+                on_attempt(name, not failed)
+        except DeadlineExceeded:
+            self._release(failed + [(name, 0)])
+            raise
+
+        started = time.time()
+        with self._lock:
+            self.stats[name].last_attempt = started
+        try:
+            record = self.methods[name](video_id, deadline)
+        except DeadlineExceeded:
+            # Running out of time says nothing about the method, so it isn't recorded
+            self._release(failed + [(name, 0)])
+            raise
+        except Exception as e:
+            record = None
+            if on_error:
+                on_error(name, e)
+        elapsed = time.time() - started
+
+        if not record:
+            failed.append((name, elapsed))
+            return None
+
+        now = time.time()
+        with self._lock:
+            self.stats[name].record(True, elapsed)
+            self.breakers[name].record_success()
+            # Another path worked for this video, so the earlier misses were the methods' fault
+            for failed_name, seconds in failed:
+                self.stats[failed_name].record(False, seconds)
+                self.breakers[failed_name].record_failure(now)
+        return record
+
+    def snapshot(self):
+        """Current breaker states and stats for display"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'method': name,
+                    'state': self.breakers[name].state,
+                    'success_rate': self.stats[name].success_rate(),
+                    'mean_latency': self.stats[name].mean_latency(),
+                    'expected_cost': self.stats[name].expected_cost(),
+                    'samples': len(self.stats[name].outcomes),
+                    'retry_in': self.breakers[name].retry_in(now),
+                }
+                for name in self.methods
+            ]
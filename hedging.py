@@ -0,0 +1,132 @@
+"""
+Hedged requests for slow LLM calls
+If a call hasn't answered by a percentile of recently observed latency, a duplicate is sent and
+the first response wins; a rate cap keeps the extra cost bounded
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from profiling import in_context
+
+
+class _Call:
+    __slots__ = ('hedged',)
+
+    def __init__(self):
+        self.hedged = False
+
+
+class Hedger:
+    """Latency tracking, hedge budget and the primary-vs-hedge race"""
+
+    def __init__(self, percentile=95, max_rate=0.05, min_samples=20, window=500, workers=32):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self._latencies = {}  # kind -> deque of unhedged latencies
+        self._window = window
+        self._calls = deque(maxlen=window)  # Recent calls, each marked once it's hedged
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.seconds_saved = 0.0
+
+    def delay(self, kind):
+        """Seconds to wait before hedging this kind of call, or None until there's enough history"""
+        with self._lock:
+            samples = sorted(self._latencies.get(kind, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(int(len(samples) * self.percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+
+    def _take_hedge(self, call, prepare):
+        """Hedge this call if that stays within max_rate of recent calls and prepare() allows it
+
+        Returns the argument for the hedged attempt, or None for no hedge
+        """
+        with self._lock:
+            if sum(c.hedged for c in self._calls) + 1 > self.max_rate * max(len(self._calls), 1):
+                return None
+            call.hedged = True  # Holds the budget while prepare() runs
+        hedge = prepare() if prepare else True
+        with self._lock:
+            if hedge is None:
+                call.hedged = False
+            else:
+                self.hedges += 1
+        return hedge
+
+    def call(self, kind, attempt, deadline, discard=None, prepare=None):
+        """Run attempt(False), racing a hedged attempt against it if it's slow; first result wins
+
+        The hedge gets prepare()'s result (True without prepare); if prepare() returns None, say because
+        there's no quota for a second request right now, the call isn't hedged. discard(result) is called
+        for the losing result if it arrives anyway
+        """
+        delay = self.delay(kind)
+        call = _Call()
+        with self._lock:
+            self.requests += 1
+            self._calls.append(call)
+
+        started = time.monotonic()
+        if delay is None:
+            try:
+                return attempt(False)
+            finally:
+                self.record(kind, time.monotonic() - started)
+
+        primary = self._pool.submit(in_context(attempt), False)
+        primary.add_done_callback(lambda f: self.record(kind, time.monotonic() - started))
+
+        done, _ = wait([primary], timeout=min(delay, deadline.remaining()))
+        if done:
+            return primary.result()
+        hedge_arg = self._take_hedge(call, prepare)
+        if hedge_arg is None:
+            return primary.result()
+
+        hedge = self._pool.submit(in_context(attempt), hedge_arg)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is not None:
+                break
+        else:
+            # Both failed: report the primary's error
+            return primary.result()
+
+        loser = hedge if winner is primary else primary
+        if discard:
+            loser.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+        if winner is hedge:
+            answered = time.monotonic() - started
+            with self._lock:
+                self.hedge_wins += 1
+
+            def count_saving(f):
+                with self._lock:
+                    self.seconds_saved += max(time.monotonic() - started - answered, 0)
+            primary.add_done_callback(count_saving)
+        return winner.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_rate': self.hedges / self.requests if self.requests else 0.0,
+                'hedge_wins': self.hedge_wins,
+                'seconds_saved': self.seconds_saved,
+            }
@@ -0,0 +1,363 @@
+"""
+Transcript library: every fetched transcript, stored on disk with segment timing
+Passages are indexed with SQLite FTS5 for ranked keyword and phrase search
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config import DATA_DIR
+
+# Consecutive caption segments are grouped into passages of roughly this size for indexing
+PASSAGE_CHARS = 320
+PASSAGE_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    channel TEXT,
+    language TEXT,
+    source TEXT,
+    fetched_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    segments TEXT NOT NULL,
+    content_hash TEXT,
+    checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passages_video ON passages(video_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    text, content='passages', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS passages_ai AFTER INSERT ON passages BEGIN
+    INSERT INTO passages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_ad AFTER DELETE ON passages BEGIN
+    INSERT INTO passages_fts(passages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TABLE IF NOT EXISTS digests (
+    video_id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS section_summaries (
+    section_key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def group_passages(segments, max_chars=PASSAGE_CHARS, max_seconds=PASSAGE_SECONDS):
+    """Group consecutive segments into (start, text) passages"""
+    passages = []
+    start, parts, size = None, [], 0
+    for seg in segments:
+        if parts and (size >= max_chars or seg['start'] - start >= max_seconds):
+            passages.append((start, ' '.join(parts)))
+            start, parts, size = None, [], 0
+        if start is None:
+            start = seg['start']
+        parts.append(seg['text'])
+        size += len(seg['text']) + 1
+    if parts:
+        passages.append((start, ' '.join(parts)))
+    return passages
+
+
+def pack_segments(segments):
+    return json.dumps([[seg['start'], seg['duration'], seg['text']] for seg in segments], ensure_ascii=False)
+
+
+def content_hash(segments):
+    """Hash of a transcript's text, to tell whether a refetched caption track changed
+
+    Only the words count: fetch methods and caption formats split and time the same captions differently
+    """
+    text = ' '.join(' '.join(seg['text'] for seg in segments).split())
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def build_match_query(query):
+    """Turn user input into an FTS5 query: "quoted phrases" stay phrases, other words must all match"""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+        tokens = re.findall(r'\w+', phrase or word)
+        if phrase and tokens:
+            terms.append('"' + ' '.join(tokens) + '"')
+        else:
+            # Quote single words too, so FTS5 operators in user input are taken literally
+            terms.extend(f'"{token}"' for token in tokens)
+    return ' '.join(terms)
+
+
+def format_timestamp(seconds):
+    """Format seconds as M:SS or H:MM:SS"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def video_url(video_id, seconds=0):
+    """YouTube link that starts playback at the given time"""
+    return f"https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s"
+
+
+class TranscriptLibrary:
+    """SQLite store of every fetched transcript with a full-text index over its passages"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "library.db")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        # Libraries created before channels and revalidation were recorded
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(videos)")}
+        for column, kind in (('channel', 'TEXT'), ('content_hash', 'TEXT'), ('checked_at', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE videos ADD COLUMN {column} {kind}")
+
+        # Version 1: content hashes cover the text only (they used to include segment timing)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            with self._conn:
+                rows = self._conn.execute("SELECT video_id, segments FROM videos").fetchall()
+                self._conn.executemany("UPDATE videos SET content_hash = ? WHERE video_id = ?", [
+                    (content_hash([{'text': text} for _, _, text in json.loads(row['segments'])]), row['video_id'])
+                    for row in rows
+                ])
+                self._conn.execute("PRAGMA user_version = 1")
+
+    def add_video(self, video_id, segments, title=None, language=None, source=None, channel=None):
+        """Store a transcript and (re)index just this video's passages"""
+        duration = segments[-1]['start'] + segments[-1]['duration'] if segments else 0
+        packed = pack_segments(segments)
+        passages = group_passages(segments)
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM passages WHERE video_id = ?", (video_id,))
+            self._conn.execute("DELETE FROM digests WHERE video_id = ?", (video_id,))  # Built from the old transcript
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos "
+                "(video_id, title, channel, language, source, fetched_at, duration, segments, content_hash, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_id, title, channel, language, source, now, duration, packed, content_hash(segments), now)
+            )
+            self._conn.executemany(
+                "INSERT INTO passages (video_id, start, text) VALUES (?, ?, ?)",
+                [(video_id, start, text) for start, text in passages]
+            )
+
+    def get_video(self, video_id):
+        """Stored transcript record (same shape get_transcript returns), or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None:
+            return None
+
+        segments = [{'start': s, 'duration': d, 'text': t} for s, d, t in json.loads(row['segments'])]
+        return {
+            'segments': segments,
+            'title': row['title'],
+            'channel': row['channel'],
+            'language': row['language'],
+            'source': row['source'],
+            'fetched_at': row['fetched_at'],
+            'content_hash': row['content_hash'] or content_hash(segments),
+            'checked_at': row['checked_at'] or row['fetched_at'],
+        }
+
+    def checked_at(self, video_id):
+        """When the stored transcript was last fetched or confirmed current, or None if not stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(checked_at, fetched_at) FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_checked(self, video_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE videos SET checked_at = ? WHERE video_id = ?", (time.time(), video_id))
+
+    def save_digest(self, video_id, digest):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests (video_id, digest, created_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps(digest, ensure_ascii=False), time.time())
+            )
+
+    def get_digest(self, video_id):
+        """Cached structured digest of a video, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM digests WHERE video_id = ?", (video_id,)).fetchone()
+        return json.loads(row['digest']) if row else None
+
+    def save_section_summary(self, section_key, summary):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO section_summaries (section_key, summary, created_at) VALUES (?, ?, ?)",
+                (section_key, summary, time.time())
+            )
+
+    def get_section_summaries(self, section_keys):
+        """Stored section summaries by content hash (missing keys are left out)"""
+        if not section_keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT section_key, summary FROM section_summaries WHERE section_key IN ({','.join('?' * len(section_keys))})",
+                list(section_keys)
+            ).fetchall()
+        return {row['section_key']: row['summary'] for row in rows}
+
+    def content_hashes(self):
+        """video_id -> content hash of every stored transcript"""
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, content_hash FROM videos").fetchall()
+        return {row['video_id']: row['content_hash'] for row in rows}
+
+    def iter_videos(self):
+        """Every stored transcript record, with its video_id and duration, for export"""
+        with self._lock:
+            video_ids = [row[0] for row in self._conn.execute("SELECT video_id FROM videos ORDER BY fetched_at")]
+        for video_id in video_ids:
+            record = self.get_video(video_id)
+            if record:
+                duration = record['segments'][-1]['start'] + record['segments'][-1]['duration'] if record['segments'] else 0
+                yield dict(record, video_id=video_id, duration=duration)
+
+    def all_digests(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, digest FROM digests").fetchall()
+        return {row['video_id']: json.loads(row['digest']) for row in rows}
+
+    def all_section_summaries(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT section_key, summary FROM section_summaries").fetchall()
+        return {row['section_key']: row['summary'] for row in rows}
+
+    def import_videos(self, records):
+        """Store records exported from another library in one transaction, keeping their fetch times
+
+        Videos already in this library are left as they are; returns how many were added
+        """
+        with self._lock, self._conn:
+            stored = {row[0] for row in self._conn.execute("SELECT video_id FROM videos")}
+            added = 0
+            for record in records:
+                if record['video_id'] in stored:
+                    continue
+                segments = record['segments']
+                packed = pack_segments(segments)
+                self._conn.execute(
+                    "INSERT INTO videos "
+                    "(video_id, title, channel, language, source, fetched_at, duration, segments, content_hash, checked_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record['video_id'], record.get('title'), record.get('channel'), record.get('language'),
+                     record.get('source'), record['fetched_at'], record['duration'], packed,
+                     content_hash(segments),
+                     record.get('checked_at') or record['fetched_at'])
+                )
+                self._conn.executemany(
+                    "INSERT INTO passages (video_id, start, text) VALUES (?, ?, ?)",
+                    [(record['video_id'], start, text) for start, text in group_passages(segments)]
+                )
+                stored.add(record['video_id'])
+                added += 1
+        return added
+
+    def import_digests(self, digests):
+        """Add digests that aren't stored yet; returns how many were added"""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.executemany(
+                "INSERT OR IGNORE INTO digests (video_id, digest, created_at) VALUES (?, ?, ?)",
+                [(video_id, json.dumps(digest, ensure_ascii=False), now) for video_id, digest in digests.items()]
+            ).rowcount
+
+    def import_section_summaries(self, summaries):
+        """Add section summaries that aren't stored yet"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO section_summaries (section_key, summary, created_at) VALUES (?, ?, ?)",
+                [(key, summary, now) for key, summary in summaries.items()]
+            )
+
+    def list_videos(self, since=None, channel=None):
+        """Id, title, channel and fetch time of stored transcripts, newest first"""
+        query = "SELECT video_id, title, channel, language, fetched_at, duration FROM videos WHERE 1 = 1"
+        params = []
+        if since is not None:
+            query += " AND fetched_at >= ?"
+            params.append(since)
+        if channel is not None:
+            query += " AND channel = ?"
+            params.append(channel)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY fetched_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def channels(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT channel FROM videos WHERE channel IS NOT NULL ORDER BY channel"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def search(self, query, limit=20, video_ids=None):
+        """Ranked keyword/phrase search; each hit has the video, a snippet and a jump-to time"""
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT p.video_id, v.title, p.start, "
+            "snippet(passages_fts, 0, '**', '**', '…', 24) AS snippet, bm25(passages_fts) AS score "
+            "FROM passages_fts "
+            "JOIN passages p ON p.id = passages_fts.rowid "
+            "JOIN videos v ON v.video_id = p.video_id "
+            "WHERE passages_fts MATCH ?"
+        )
+        params = [match]
+        if video_ids:
+            sql += f" AND p.video_id IN ({','.join('?' * len(video_ids))})"
+            params.extend(video_ids)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                'video_id': row['video_id'],
+                'title': row['title'] or row['video_id'],
+                'start': row['start'],
+                'snippet': row['snippet'],
+                'score': -row['score'],  # bm25() is lower-is-better
+                'url': video_url(row['video_id'], row['start']),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,106 @@
+"""
+Question answering across several videos in the transcript library
+Retrieves the most relevant chunks from the shared embedding index, packs them into a
+token budget with per-video attribution and answers in a single LLM call
+"""
+
+from conversation_memory import estimate_tokens
+from deadline import ensure_deadline
+from embeddings import index_video
+from library_index import format_timestamp
+from llm import generate_text
+
+
+def ensure_indexed(video_ids, library, store, embedder, deadline=None):
+    """Embed any selected videos that are in the library but not yet in the vector store"""
+    deadline = ensure_deadline(deadline)
+    indexed = 0
+    for video_id in video_ids:
+        if store.has_video(video_id):
+            continue
+        deadline.check("indexing the selected videos")
+        record = library.get_video(video_id)
+        if record:
+            index_video(store, embedder, video_id, record['segments'])
+            indexed += 1
+    return indexed
+
+
+def pack_context(hits, token_budget=6000, max_video_share=0.5):
+    """Greedily pick the best chunks that fit the budget, skipping overlaps and capping any one video's share"""
+    videos_hit = {hit['video_id'] for hit in hits}
+    video_cap = token_budget if len(videos_hit) == 1 else int(token_budget * max_video_share)
+
+    picked = []
+    used = 0
+    used_per_video = {}
+    for hit in sorted(hits, key=lambda h: -h['score']):
+        cost = estimate_tokens(hit['text']) + 12  # Plus the attribution header
+        if used + cost > token_budget or used_per_video.get(hit['video_id'], 0) + cost > video_cap:
+            continue
+
+        # Neighbouring chunks overlap a little; keep only one of them
+        if any(p['video_id'] == hit['video_id'] and p['start'] < hit['end'] and hit['start'] < p['end'] for p in picked):
+            continue
+
+        picked.append(hit)
+        used += cost
+        used_per_video[hit['video_id']] = used_per_video.get(hit['video_id'], 0) + cost
+    return picked
+
+
+def build_prompt(question, picked, titles):
+    """Prompt with excerpts grouped per video (labelled V1, V2, ...) in timeline order"""
+    labels = {}
+    for hit in sorted(picked, key=lambda h: -h['score']):
+        labels.setdefault(hit['video_id'], f"V{len(labels) + 1}")
+
+    blocks = []
+    for video_id, label in labels.items():
+        excerpts = sorted((h for h in picked if h['video_id'] == video_id), key=lambda h: h['start'])
+        lines = [f"[{label}] {titles.get(video_id) or video_id} (video {video_id})"]
+        for hit in excerpts:
+            lines.append(f"({label} {format_timestamp(hit['start'])}) {hit['text']}")
+        blocks.append('\n'.join(lines))
+
+    excerpts = '\n\n'.join(blocks)
+    prompt = f"""You are TubeMind, an AI assistant that helps users understand YouTube video content.
+
+Below are excerpts from several videos. Each excerpt is labelled with its video and timestamp.
+
+{excerpts}
+
+User Question: {question}
+
+Instructions:
+- Answer based ONLY on the excerpts above
+- Cite the source of each point as [V1 12:34] using the labels and timestamps shown
+- If the videos disagree, say so and cite each side
+- If the excerpts don't contain the answer, say so
+- Be concise and use bullet points when appropriate
+
+Answer:"""
+    return prompt, labels
+
+
+def ask_library(question, video_ids, library, store, embedder, k=40, token_budget=6000, deadline=None):
+    """Answer a question across the selected videos; returns (answer, sources)"""
+    hits = store.search(embedder.embed_query(question), k=k, video_ids=list(video_ids))
+    if not hits:
+        return None, []
+
+    picked = pack_context(hits, token_budget=token_budget)
+    titles = {v['video_id']: v['title'] for v in library.list_videos()}
+    prompt, labels = build_prompt(question, picked, titles)
+    answer = generate_text(prompt, deadline=deadline)
+
+    sources = [
+        {
+            'label': labels[video_id],
+            'video_id': video_id,
+            'title': titles.get(video_id) or video_id,
+            'starts': sorted(h['start'] for h in picked if h['video_id'] == video_id),
+        }
+        for video_id in labels
+    ]
+    return answer, sources
@@ -0,0 +1,191 @@
+"""
+Thin wrapper around the Gemini client shared by every LLM call in TubeMind
+Each call waits for a scheduler slot, then reserves its estimated tokens on the shared quota ledger before it is sent
+"""
+
+import functools
+import itertools
+import os
+
+import google.generativeai as genai
+
+from conversation_memory import estimate_tokens
+from deadline import DeadlineExceeded, ensure_deadline
+from hedging import Hedger
+from quota import QuotaExceeded, QuotaLedger
+from scheduler import LLMScheduler
+
+MODEL_NAME = os.getenv("TUBEMIND_MODEL", "gemini-flash-latest")
+
+# Output allowance added to the prompt estimate when reserving quota
+EXPECTED_OUTPUT_TOKENS = 1024
+
+# Hedging is off unless a percentile is set: calls slower than that percentile of recent latency
+# get a duplicate request, for at most HEDGE_MAX_RATE of calls
+HEDGE_PERCENTILE = float(os.getenv("TUBEMIND_HEDGE_PERCENTILE", "0"))
+HEDGE_MAX_RATE = float(os.getenv("TUBEMIND_HEDGE_MAX_RATE", "0.05"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_ledger():
+    """Quota ledger shared with every other replica on this host"""
+    return QuotaLedger()
+
+
+@functools.lru_cache(maxsize=None)
+def get_scheduler():
+    """Process-wide admission control for LLM calls"""
+    return LLMScheduler()
+
+
+@functools.lru_cache(maxsize=None)
+def get_hedger():
+    """Process-wide hedger, or None when hedging is off"""
+    return Hedger(HEDGE_PERCENTILE, HEDGE_MAX_RATE) if HEDGE_PERCENTILE > 0 else None
+
+
+def response_text(response):
+    """Extract the text from a Gemini response (handles both response shapes), or None"""
+    if hasattr(response, 'text'):
+        return response.text
+    elif response.candidates:
+        return response.candidates[0].content.parts[0].text
+    return None
+
+
+def response_tokens(response):
+    """Total tokens billed for a response, or None if the response doesn't say"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) or None
+
+
+def is_rate_limited(error):
+    message = str(error)
+    return "429" in message or "Resource has been exhausted" in message or "ResourceExhausted" in type(error).__name__
+
+
+def quota_has_room(share):
+    """Whether the shared quota window is less than share full, in both requests and tokens"""
+    usage = get_ledger().usage()
+    return usage['requests'] < usage['rpm'] * share and usage['tokens'] < usage['tpm'] * share
+
+
+def reserve_within(ledger, estimate, deadline):
+    """Reserve quota, waiting no longer than the deadline allows
+
+    Raises DeadlineExceeded if it was the deadline that cut the wait short, QuotaExceeded otherwise
+    """
+    allowed = max(deadline.remaining() - 1, 0)
+    try:
+        return ledger.reserve(estimate, max_wait=min(ledger.max_wait, allowed))
+    except QuotaExceeded as e:
+        if allowed < ledger.max_wait:
+            raise DeadlineExceeded("the wait for Gemini quota") from e
+        raise
+
+
+def reserve_now(ledger, estimate):
+    """Reserve quota only if there's room right now (for a hedge), else None"""
+    try:
+        return ledger.reserve(estimate, max_wait=0)
+    except QuotaExceeded:
+        return None
+
+
+def request_options(deadline, stage):
+    """Per-call options with the Gemini timeout taken from the time left"""
+    timeout = deadline.timeout(None, stage)
+    return {} if timeout is None else {'request_options': {'timeout': timeout}}
+
+
+def call_hedged(kind, attempt, deadline, discard=None, prepare=None):
+    """attempt(hedge) through the hedger when hedging is on, else just attempt(False)"""
+    hedger = get_hedger()
+    if hedger is None:
+        return attempt(False)
+    return hedger.call(kind, attempt, deadline, discard, prepare)
+
+
+def generate_text(prompt, deadline=None, **kwargs):
+    """Run one generate_content call and return the response text (None if the format is unexpected)"""
+    deadline = ensure_deadline(deadline)
+    # Wait for a slot first, so higher-priority calls also get to the quota first
+    with get_scheduler().slot(deadline):
+        deadline.check("the Gemini call")  # Cancelled while queued: don't spend quota
+        ledger = get_ledger()
+        estimate = estimate_tokens(str(prompt)) + EXPECTED_OUTPUT_TOKENS
+        reservation = reserve_within(ledger, estimate, deadline)
+
+        def attempt(hedge):
+            # A hedge comes with its own reservation, made by reserve_now before it was sent
+            held = hedge or reservation
+            try:
+                model = genai.GenerativeModel(MODEL_NAME)
+                # Through deadline.run, so a cancelled deadline frees the slot without waiting for the response
+                response = deadline.run(
+                    "the Gemini call", model.generate_content, prompt,
+                    **request_options(deadline, "the Gemini call"), **kwargs
+                )
+            except Exception as e:
+                if is_rate_limited(e):
+                    ledger.report_rate_limited()
+                ledger.reconcile(held, estimate_tokens(str(prompt)))
+                raise
+            ledger.reconcile(held, response_tokens(response) or estimate)
+            return response
+
+        try:
+            response = call_hedged('generate', attempt, deadline, prepare=lambda: reserve_now(ledger, estimate))
+        except Exception as e:
+            if deadline.expired() and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded("the Gemini call") from e
+            raise
+        return response_text(response)
+
+
+def stream_text(prompt, deadline=None, **kwargs):
+    """Yield response text chunks as Gemini streams them"""
+    deadline = ensure_deadline(deadline)
+    # The slot is held until the stream is finished (or abandoned)
+    with get_scheduler().slot(deadline):
+        ledger = get_ledger()
+        estimate = estimate_tokens(str(prompt)) + EXPECTED_OUTPUT_TOKENS
+        reservation = reserve_within(ledger, estimate, deadline)
+
+        def attempt(hedge):
+            """Start a stream and wait for its first chunk; returns (reservation, first chunk, remaining chunks)"""
+            held = hedge or reservation
+            try:
+                model = genai.GenerativeModel(MODEL_NAME)
+                chunks = iter(model.generate_content(prompt, stream=True, **request_options(deadline, "the Gemini call"), **kwargs))
+                first = next(chunks, None)
+            except Exception as e:
+                if is_rate_limited(e):
+                    ledger.report_rate_limited()
+                ledger.reconcile(held, estimate_tokens(str(prompt)))
+                raise
+            return held, first, chunks
+
+        def discard(result):
+            # The abandoned stream was still billed for its prompt and some output
+            ledger.reconcile(result[0], estimate)
+
+        held = None
+        used = None
+        try:
+            held, first, chunks = call_hedged('stream', attempt, deadline, discard, lambda: reserve_now(ledger, estimate))
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                used = response_tokens(chunk) or used  # The final chunk carries the totals
+                text = response_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            # Failures before the stream started were already accounted for by the attempt
+            if held is not None and is_rate_limited(e):
+                ledger.report_rate_limited()
+            if deadline.expired() and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded("the Gemini call") from e
+            raise
+        finally:
+            if held is not None:
+                ledger.reconcile(held, used or estimate)
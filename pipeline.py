@@ -0,0 +1,1235 @@
+"""
+TubeMind core pipeline: transcript fetching, summaries and Q&A
+Shared by the Streamlit app and the HTTP API, so nothing here depends on a UI session
+"""
+
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+import logging
+import random
+import re
+import threading
+import time
+from xml.etree import ElementTree
+import html
+
+import requests
+import yt_dlp
+from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
+
+from answer_cache import AnswerCache, is_context_dependent, normalize_question
+from caption_http import fetch_caption, with_format
+from caption_tracks import (
+    PREFERRED_LANGUAGES, accept_language, pick_track, page_tracks, transcript_api_tracks, yt_dlp_tracks,
+)
+from conversation_memory import ConversationMemory
+from deadline import Deadline, DeadlineExceeded, ensure_deadline, ANSWER_DEADLINE, PROCESS_DEADLINE
+from digest import (
+    DigestError, DIGEST_TRANSCRIPT_CHARS, build_digest_prompt, parse_digest, fallback_digest, follow_up_answers,
+    transcript_chars, split_sections, section_key, section_label, build_section_prompt, build_reduce_prompt,
+    BATCH_MAX_SECONDS, BATCH_VIDEOS, build_batch_digest_prompt, batch_digest_videos, parse_batch_digests,
+)
+from embeddings import get_embedder, open_store, index_video
+from fetch_strategy import FetchStrategy
+from library_index import TranscriptLibrary, content_hash
+from llm import generate_text, quota_has_room
+from profiling import in_context
+from scheduler import BATCH, llm_job
+from transcript_cache import TranscriptCache
+
+logger = logging.getLogger(__name__)
+
+
+class LogNotifier:
+    """Sends progress messages to the log when there is no Streamlit page to show them on"""
+
+    def info(self, message):
+        logger.info(message)
+
+    def write(self, message):
+        logger.info(message)
+
+    def success(self, message):
+        logger.info(message)
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        logger.error(message)
+
+
+class RoutedNotifier:
+    """Forwards messages to the notifier set with set_notifier, or to the log on background threads"""
+
+    def __init__(self, target):
+        self.target = target
+        self._log = LogNotifier()
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        target = self._log if getattr(self._local, 'background', False) else self.target
+        return getattr(target, name)
+
+    def run_in_background(self, func, *args):
+        """Start func on a daemon thread whose messages go to the log"""
+        def run():
+            self._local.background = True
+            func(*args)
+        threading.Thread(target=run, daemon=True).start()
+
+
+# Where progress and error messages go; the Streamlit app points this at `st`
+ui = RoutedNotifier(LogNotifier())
+
+
+def set_notifier(notifier):
+    """Route progress messages to another object with info/write/success/warning/error"""
+    ui.target = notifier
+
+
+def extract_video_id(url):
+    """Extract video ID from various YouTube URL formats"""
+    patterns = [
+        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)',
+        r'youtube\.com\/watch\?.*v=([^&\n?#]+)'
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def clean_caption_text(text):
+    """Collapse newlines and repeated whitespace in caption text"""
+    return ' '.join(text.replace('\n', ' ').split())
+
+
+def parse_json3_segments(subtitle_data):
+    """Parse YouTube json3 subtitles into timed segments"""
+    segments = []
+    for event in subtitle_data.get('events', []):
+        if 'segs' not in event:
+            continue
+        text = clean_caption_text(''.join(seg.get('utf8', '') for seg in event['segs']))
+        if text:
+            segments.append({
+                'start': event.get('tStartMs', 0) / 1000,
+                'duration': event.get('dDurationMs', 0) / 1000,
+                'text': text,
+            })
+    return segments
+
+
+def parse_timedtext_segments(xml_content):
+    """Parse timedtext XML (<text start="" dur="">) into timed segments"""
+    root = ElementTree.fromstring(xml_content)
+    segments = []
+    for text_elem in root.findall('.//text'):
+        text = clean_caption_text(html.unescape(text_elem.text or ''))
+        if text:
+            segments.append({
+                'start': float(text_elem.get('start', 0)),
+                'duration': float(text_elem.get('dur', 0)),
+                'text': text,
+            })
+    return segments
+
+
+# Caption formats we can parse, most compact first: srv1 is plain <text start dur> XML, while json3
+# repeats its keys for every event (and every word of auto captions), so it's several times larger
+CAPTION_PARSERS = {
+    'srv1': parse_timedtext_segments,
+    'json3': lambda body: parse_json3_segments(json.loads(body)),
+}
+
+
+def pick_caption_format(formats):
+    """(ext, url) of the most compact format a subtitle track offers that we can parse, or None"""
+    offered = {fmt.get('ext'): fmt.get('url') for fmt in formats if fmt.get('url')}
+    for ext in CAPTION_PARSERS:
+        if ext in offered:
+            return ext, offered[ext]
+    return None
+
+
+def join_segments(segments):
+    """Flatten timed segments into a single transcript string"""
+    return ' '.join(seg['text'] for seg in segments)
+
+
+def get_transcript_method1(video_id, deadline=None):
+    """Method 1: Use youtube-transcript-api with retry and delay"""
+    deadline = ensure_deadline(deadline)
+    try:
+        ui.info("📋 Method 1: Trying youtube-transcript-api...")
+        
+        # Add random delay to avoid detection
+        deadline.sleep(random.uniform(1, 3))
+        
+        # Preferred languages first, else the video's own, as in the other methods
+        # (the library has no timeout of its own)
+        available = deadline.run("youtube-transcript-api", YouTubeTranscriptApi.list_transcripts, video_id)
+        track = pick_track(transcript_api_tracks(available))
+        if not track:
+            ui.warning("⚠️ Method 1: No usable transcript found")
+            return None
+        transcript = track.transcript.translate(track.language) if track.translated_from else track.transcript
+        transcript_list = deadline.run("youtube-transcript-api", transcript.fetch)
+        
+        # Keep timing for each entry
+        segments = [
+            {'start': entry['start'], 'duration': entry.get('duration', 0), 'text': clean_caption_text(entry['text'])}
+            for entry in transcript_list
+            if entry['text'].strip()
+        ]
+        transcript_text = join_segments(segments)
+        
+        if transcript_text and len(transcript_text) >= 50:
+            ui.success("✅ Method 1 successful!")
+            return {'segments': segments, 'title': None, 'channel': None, 'language': track.language, 'source': 'transcript-api'}
+        
+        return None
+        
+    except TranscriptsDisabled:
+        ui.warning("⚠️ Method 1: Transcripts are disabled for this video")
+        return None
+    except NoTranscriptFound:
+        ui.warning("⚠️ Method 1: No usable transcript found")
+        return None
+    except VideoUnavailable:
+        ui.warning("⚠️ Method 1: Video unavailable")
+        return None
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        error_str = str(e)
+        if "429" in error_str or "Too Many" in error_str:
+            ui.warning("⚠️ Method 1: Rate limited")
+        else:
+            ui.warning(f"⚠️ Method 1 failed: {error_str[:100]}")
+        return None
+
+
+def get_transcript_method3(video_id, deadline=None):
+    """Method 3: Direct YouTube Timedtext API access"""
+    deadline = ensure_deadline(deadline)
+    try:
+        ui.info("📋 Method 3: Trying direct timedtext API...")
+        
+        # First, get caption tracks
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        
+        user_agents = [
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        ]
+        
+        headers = {
+            'User-Agent': random.choice(user_agents),
+            'Accept-Language': accept_language(),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Referer': 'https://www.youtube.com/',
+            'DNT': '1',
+        }
+        
+        # Random delay
+        deadline.sleep(random.uniform(2, 4))
+        
+        # Get video page
+        response = requests.get(video_url, headers=headers, timeout=deadline.timeout(15, "the watch page request"))
+        
+        if response.status_code != 200:
+            ui.warning(f"⚠️ Method 3: HTTP {response.status_code}")
+            return None
+        
+        # Look for caption tracks in the page
+        page_content = response.text
+        
+        # Find captionTracks in the ytInitialPlayerResponse
+        import re as regex
+        pattern = r'"captionTracks":\s*(\[.*?\])'
+        match = regex.search(pattern, page_content)
+        
+        if not match:
+            ui.warning("⚠️ Method 3: No caption tracks found")
+            return None
+        
+        # Parse the caption tracks JSON
+        caption_tracks_str = match.group(1)
+        caption_tracks = json.loads(caption_tracks_str)
+        
+        # Best track for the preferred languages, else the video's own
+        track = pick_track(page_tracks(caption_tracks))
+        if not track:
+            ui.warning("⚠️ Method 3: No usable caption tracks")
+            return None
+        ui.info(f"📝 Method 3: Using {track.describe()}")
+        
+        # Fetch the caption (srv1, the most compact format; revalidated if we have it already)
+        deadline.sleep(random.uniform(1, 2))
+        caption_response = fetch_caption(
+            with_format(track.url, 'srv1'), headers, timeout=deadline.timeout(15, "the caption download"), deadline=deadline
+        )
+        
+        if caption_response.status_code != 200:
+            ui.warning(f"⚠️ Method 3: Caption fetch failed ({caption_response.status_code})")
+            return None
+        
+        # Parse XML captions
+        segments = parse_timedtext_segments(caption_response.content)
+        result = join_segments(segments)
+        
+        if result and len(result) >= 50:
+            ui.success("✅ Method 3 successful!")
+            title_match = regex.search(r'<title>(.*?)(?: - YouTube)?</title>', page_content)
+            title = html.unescape(title_match.group(1)) if title_match else None
+            channel_match = regex.search(r'"ownerChannelName":"(.*?)"', page_content)
+            channel = channel_match.group(1) if channel_match else None
+            return {'segments': segments, 'title': title, 'channel': channel, 'language': track.language, 'source': 'timedtext'}
+        
+        return None
+        
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        if deadline.expired():
+            raise DeadlineExceeded("the timedtext fetch") from e
+        ui.warning(f"⚠️ Method 3 failed: {str(e)[:100]}")
+        return None
+
+
+def get_transcript_method2(video_id, deadline=None):
+    """Method 2: Use yt-dlp (most reliable and maintained)"""
+    deadline = ensure_deadline(deadline)
+    try:
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        
+        # Random user agents to avoid detection
+        user_agents = [
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+        ]
+        
+        import tempfile
+        import os as os_module
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ydl_opts = {
+                'skip_download': True,
+                'writesubtitles': True,
+                'writeautomaticsub': True,
+                'subtitlesformat': 'json3',
+                'subtitleslangs': PREFERRED_LANGUAGES,
+                'outtmpl': os_module.path.join(temp_dir, '%(id)s.%(ext)s'),
+                'quiet': False,  # Show output for debugging
+                'no_warnings': False,
+                'socket_timeout': deadline.timeout(20, "the yt-dlp lookup"),
+                'headers': {
+                    'User-Agent': random.choice(user_agents),
+                    'Accept-Language': accept_language(),
+                },
+            }
+            
+            # Add delay to avoid rate limiting
+            deadline.sleep(random.uniform(1, 2))
+            
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # yt-dlp makes several requests per lookup, so bound the whole call
+                info = deadline.run("the yt-dlp lookup", ydl.extract_info, video_url, download=False)
+                
+                if not info:
+                    ui.error("Failed to get video info")
+                    return None
+                
+                # Preferred languages first (manual before auto-generated), else the video's own language
+                track = pick_track(
+                    yt_dlp_tracks(info.get('subtitles'), info.get('automatic_captions'), pick_caption_format),
+                    original=info.get('language'),
+                )
+                if not track:
+                    ui.warning("⚠️ No subtitles found for this video")
+                    return None
+                ui.info(f"📝 Found {track.describe()}")
+                subtitle_url, subtitle_ext, subtitle_type = track.url, track.ext, track.kind
+                
+                # Download and parse subtitle
+                ui.info(f"⬇️ Downloading {subtitle_type} subtitles...")
+                headers = {
+                    'User-Agent': random.choice(user_agents),
+                    'Accept-Language': accept_language(),
+                    'Referer': 'https://www.youtube.com/',
+                }
+                
+                deadline.sleep(random.uniform(1, 2))
+                
+                try:
+                    response = fetch_caption(
+                        subtitle_url, headers, timeout=deadline.timeout(30, "the subtitle download"), deadline=deadline
+                    )
+                    
+                    if response.status_code == 429:
+                        ui.error("⚠️ Rate limited. Please wait 30 minutes and try again.")
+                        return None
+                    
+                    if response.status_code != 200:
+                        ui.error(f"HTTP {response.status_code} error")
+                        return None
+                    
+                    segments = CAPTION_PARSERS[subtitle_ext](response.content)
+                    result = join_segments(segments)
+                    
+                    if result and len(result) >= 50:
+                        if response.revalidated:
+                            ui.success(f"✅ Subtitles unchanged since last fetch ({subtitle_type}, {len(result)} chars)")
+                        else:
+                            ui.success(f"✅ Successfully fetched transcript! ({subtitle_type}, {subtitle_ext}, "
+                                       f"{response.wire_bytes / 1024:.0f} KB downloaded, {len(result)} chars)")
+                        return {
+                            'segments': segments,
+                            'title': info.get('title'),
+                            'channel': info.get('channel') or info.get('uploader'),
+                            'language': track.language,
+                            'source': 'yt-dlp',
+                        }
+                    else:
+                        ui.warning(f"⚠️ Transcript too short: {len(result)} characters")
+                        return None
+                        
+                except requests.exceptions.RequestException as e:
+                    if deadline.expired():
+                        raise DeadlineExceeded("the subtitle download") from e
+                    ui.error(f"⚠️ Network error: {str(e)[:100]}")
+                    return None
+        
+        return None
+        
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        if deadline.expired():
+            raise DeadlineExceeded("the yt-dlp lookup") from e
+        error_msg = str(e)
+        if "429" in error_msg:
+            ui.error("⚠️ Rate limited by YouTube")
+        else:
+            ui.error(f"⚠️ Error: {error_msg[:150]}")
+        return None
+
+
+FETCH_METHOD_LABELS = {
+    'yt-dlp': "yt-dlp",
+    'transcript-api': "youtube-transcript-api",
+    'timedtext': "direct timedtext API",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_fetch_strategy():
+    """Per-process fetch method ordering and circuit breakers"""
+    return FetchStrategy(
+        {'yt-dlp': get_transcript_method2, 'transcript-api': get_transcript_method1, 'timedtext': get_transcript_method3},
+        # Starting latency guesses: yt-dlp first until stats say otherwise
+        priors={'yt-dlp': 4.0, 'transcript-api': 6.0, 'timedtext': 8.0},
+    )
+
+
+def get_transcript(video_id, deadline=None):
+    """Fetch transcript, trying the currently cheapest working method first
+    
+    Returns a dict with timed 'segments' plus 'title', 'channel', 'language' and 'source', or None.
+    Raises DeadlineExceeded if the deadline runs out first.
+    """
+    deadline = ensure_deadline(deadline)
+    
+    ui.info(f"🎬 Video ID: `{video_id}`")
+    
+    def on_attempt(name, first):
+        if first:
+            ui.info(f"🔄 Fetching transcript using {FETCH_METHOD_LABELS[name]}...")
+        else:
+            ui.info(f"🔄 Trying alternative method ({FETCH_METHOD_LABELS[name]})...")
+            deadline.sleep(2)
+    
+    def on_error(name, error):
+        ui.warning(f"⚠️ {FETCH_METHOD_LABELS[name]} error: {str(error)[:100]}")
+    
+    transcript, _ = get_fetch_strategy().fetch(video_id, deadline, on_attempt=on_attempt, on_error=on_error)
+    if transcript:
+        return transcript
+    
+    # If all methods failed
+    ui.error("❌ **Failed to fetch transcript**")
+    ui.info("""
+    💡 **Possible Issues:**
+    
+    1. **No Captions Available** 🚫
+       - Check if the video has captions (CC button on YouTube)
+       - Not all videos have subtitles enabled
+    
+    2. **Rate Limited** ⏰
+       - If you tried multiple videos quickly, wait 15-30 minutes
+       - Use mobile hotspot to test with different IP
+    
+    3. **Video Restrictions** 🔒
+       - Video might be private, age-restricted, or deleted
+       - Regional restrictions may apply
+    
+    4. **Try These Solutions:**
+       - Wait 30 minutes and try again
+       - Try a different popular video with confirmed captions
+       - Check the video on YouTube directly
+    """)
+    
+    return None
+
+
+def download_and_parse_subtitle(subtitle_url, max_retries=3, deadline=None):
+    """Download and parse subtitle from URL with retry logic, returning timed segments"""
+    deadline = ensure_deadline(deadline)
+    for attempt in range(max_retries):
+        try:
+            # Add a small delay before each attempt (except the first)
+            if attempt > 0:
+                wait_time = (2 ** attempt) * 2  # Exponential backoff: 4s, 8s, 16s
+                if not deadline.allows(wait_time):
+                    raise DeadlineExceeded("the subtitle download retries")
+                ui.info(f"⏳ Waiting {wait_time} seconds before retry... (Attempt {attempt + 1}/{max_retries})")
+                time.sleep(wait_time)
+            
+            # Download subtitle data (compressed, or revalidated if we have it) with timeout and proper headers
+            response = fetch_caption(
+                subtitle_url,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                    'Accept': 'application/json',
+                    'Accept-Language': 'en-US,en;q=0.9',
+                },
+                timeout=deadline.timeout(20, "the subtitle download"),
+                deadline=deadline,
+            )
+            
+            if response.status_code == 429:  # Too Many Requests
+                if attempt < max_retries - 1:
+                    ui.warning(f"⚠️ Rate limited by YouTube (HTTP 429). Retrying with exponential backoff...")
+                    continue
+                else:
+                    ui.error("❌ **YouTube Rate Limit Exceeded**")
+                    ui.info("💡 **Please wait 5-10 minutes before trying again.**\n\n"
+                           "YouTube limits how many subtitle requests can be made in a short time. "
+                           "This is temporary and will reset automatically.")
+                    return None
+            if response.status_code != 200:
+                ui.error(f"❌ HTTP Error {response.status_code}")
+                return None
+            
+            # Extract timed segments from JSON3 format
+            segments = parse_json3_segments(json.loads(response.content))
+            result = join_segments(segments)
+            
+            # Only return if we got meaningful text (at least 50 characters)
+            if result and len(result) >= 50:
+                return segments
+            else:
+                ui.warning(f"⚠️ Subtitle text too short: {len(result) if result else 0} characters")
+                return None
+                
+        except json.JSONDecodeError as e:
+            ui.error(f"❌ Failed to parse subtitle JSON: {str(e)[:100]}")
+            return None
+            
+        except requests.exceptions.RequestException as e:
+            if deadline.expired():
+                raise DeadlineExceeded("the subtitle download") from e
+            ui.error(f"❌ Failed to download subtitle: {str(e)[:100]}")
+            return None
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            ui.error(f"❌ Subtitle extraction error: {str(e)[:100]}")
+            return None
+    
+    return None
+
+
+def build_summary_prompt(transcript):
+    """Prompt for the executive summary of a transcript"""
+    return f"""You are a professional content analyst. Please provide a concise executive summary of the following video transcript.
+
+Focus on:
+- Main topic and key points
+- Important insights or arguments
+- Any actionable takeaways
+
+Transcript:
+{transcript[:15000]}  # Limit to avoid token limits
+
+Please provide a summary in 3-5 paragraphs."""
+
+
+def generate_summary(transcript, deadline=None):
+    """Generate an executive summary using Gemini (DeadlineExceeded is left to the caller)"""
+    prompt = build_summary_prompt(transcript)
+    
+    try:
+        text = generate_text(prompt, deadline=deadline)
+        if text is None:
+            ui.error("❌ Unexpected response format from Gemini API")
+        return text
+            
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        error_msg = str(e)
+        ui.error(f"❌ Error generating summary: {error_msg}")
+        
+        if "credentials" in error_msg.lower() or "authentication" in error_msg.lower():
+            ui.warning("⚠️ **API Authentication Issue**")
+            ui.info("""
+            Please check:
+            1. Your GOOGLE_API_KEY is correctly set in the .env file
+            2. The API key is valid and active
+            3. Get your API key from: https://makersuite.google.com/app/apikey
+            """)
+        
+        return None
+
+
+# Long videos: sections summarized concurrently (the quota ledger still paces them), and the
+# share of the time budget they may use before the reduce step has to start
+SECTION_WORKERS = 4
+MAP_SHARE = 0.75
+
+JSON_OUTPUT = {'response_mime_type': 'application/json'}
+
+
+def generate_digest(record, deadline=None, on_section=None):
+    """Structured digest for a stored transcript; None if the output doesn't match the schema
+    
+    Transcripts that fit one prompt take a single JSON-mode call; longer ones are summarized
+    section by section (see summarize_sections) and the notes reduced into the digest.
+    A digest built from only some sections, or from unreduced notes, has 'partial' set.
+    """
+    segments = record['segments']
+    duration = segments[-1]['start'] + segments[-1]['duration'] if segments else None
+    
+    if transcript_chars(segments) <= DIGEST_TRANSCRIPT_CHARS:
+        text = generate_text(build_digest_prompt(segments, record.get('title')), deadline=deadline, generation_config=JSON_OUTPUT)
+        try:
+            return parse_digest(text, duration)
+        except DigestError as e:
+            logger.warning("Digest didn't validate: %s", e)
+            return None
+    
+    deadline = ensure_deadline(deadline)
+    sections = split_sections(segments)
+    keys = [section_key(section) for section in sections]
+    notes = summarize_sections(sections, record.get('title'), deadline.share(MAP_SHARE), on_section)
+    done = [(section_label(section), notes[key]) for section, key in zip(sections, keys) if key in notes]
+    if not done:
+        deadline.check("summarizing the video sections")
+        return None
+    
+    text = generate_text(build_reduce_prompt(done, record.get('title')), deadline=deadline, generation_config=JSON_OUTPUT)
+    try:
+        digest = parse_digest(text, duration)
+    except DigestError as e:
+        # The section notes are still a useful summary on their own
+        logger.warning("Reduced digest didn't validate: %s", e)
+        digest = fallback_digest('\n\n'.join(f"**{label}**\n{note}" for label, note in done))
+        digest['partial'] = True
+    if len(done) < len(sections):
+        digest['partial'] = True
+    return digest
+
+
+def summarize_sections(sections, title=None, deadline=None, on_section=None):
+    """Map step for long videos: notes per section, reusing stored ones, as {section_key: notes}
+    
+    on_section(section, notes) is called from the calling thread as each section becomes ready.
+    Sections still running when the deadline hits are dropped from the result but stored when they finish.
+    """
+    deadline = ensure_deadline(deadline)
+    library = get_library()
+    keys = [section_key(section) for section in sections]
+    notes = library.get_section_summaries(keys)
+    for section, key in zip(sections, keys):
+        if key in notes and on_section:
+            on_section(section, notes[key])
+    
+    missing = [(section, key) for section, key in zip(sections, keys) if key not in notes]
+    if not missing:
+        return notes
+    
+    def summarize(section, key):
+        text = generate_text(build_section_prompt(section, title), deadline=deadline)
+        if text and text.strip():
+            library.save_section_summary(key, text.strip())
+            return text.strip()
+        return None
+    
+    pool = ThreadPoolExecutor(max_workers=SECTION_WORKERS)
+    # Each worker runs in a copy of this context, so its calls keep the caller's user and priority
+    futures = {
+        pool.submit(in_context(summarize), section, key): (section, key)
+        for section, key in missing
+    }
+    timeout = None if deadline.budget is None else deadline.remaining()
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            section, key = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.warning("Summarizing section %s failed: %s", section_label(section), str(e)[:200])
+                continue
+            if text:
+                notes[key] = text
+                if on_section:
+                    on_section(section, text)
+    except FuturesTimeout:
+        pass
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return notes
+
+
+def build_question_prompt(transcript, question, memory):
+    """Prompt for answering a question about one transcript"""
+    # Condensed older turns plus a token-budgeted window of recent ones
+    context = memory.render()
+    
+    return f"""You are TubeMind, an AI assistant that helps users understand YouTube video content.
+
+Video Transcript:
+{transcript[:20000]}  # Limit to avoid token limits
+
+{context}
+
+User Question: {question}
+
+Instructions:
+- Answer based ONLY on the information present in the transcript
+- Be concise and specific
+- If the information is not in the transcript, say so
+- Use bullet points for lists when appropriate
+
+Answer:"""
+
+
+def ask_question(transcript, question, memory, deadline=None):
+    """Answer questions based on the video transcript"""
+    prompt = build_question_prompt(transcript, question, memory)
+    
+    try:
+        text = generate_text(prompt, deadline=deadline)
+        if text is None:
+            ui.error("❌ Unexpected response format from Gemini API")
+        return text
+            
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        error_msg = str(e)
+        ui.error(f"❌ Error generating response: {error_msg[:200]}")
+        
+        if "credentials" in error_msg.lower() or "authentication" in error_msg.lower():
+            ui.info("⚠️ API authentication issue. Check your GOOGLE_API_KEY in .env file.")
+        
+        return None
+
+
+# Shared caches - one instance per process, used by both the UI and the API
+
+@functools.lru_cache(maxsize=None)
+def get_answer_cache():
+    """Process-wide answer cache shared by all sessions"""
+    return AnswerCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_transcript_cache():
+    """Process-wide, byte-bounded transcript cache shared by all sessions"""
+    return TranscriptCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_library():
+    """On-disk library of every fetched transcript, with full-text search"""
+    return TranscriptLibrary()
+
+
+@functools.lru_cache(maxsize=None)
+def _open_embedding_index():
+    embedder = get_embedder()
+    return embedder, open_store(embedder)
+
+
+_embedding_index_lock = threading.Lock()
+
+
+def get_embedding_index():
+    """Shared embedder and memory-mapped vector store for semantic search"""
+    # Background threads may ask for it first; the store must only be opened once
+    with _embedding_index_lock:
+        return _open_embedding_index()
+
+
+_indexing_lock = threading.Lock()
+_indexing = set()
+
+
+def index_once(video_id, segments):
+    """Embed a transcript unless another thread is already at it; returns True if this call did the work"""
+    with _indexing_lock:
+        if video_id in _indexing:
+            return False
+        _indexing.add(video_id)
+    try:
+        embedder, store = get_embedding_index()
+        index_video(store, embedder, video_id, segments)
+        return True
+    finally:
+        with _indexing_lock:
+            _indexing.discard(video_id)
+
+
+def index_in_background(video_id, segments):
+    """Embed a transcript for semantic search without blocking the caller"""
+    def run():
+        try:
+            index_once(video_id, segments)
+        except Exception as e:
+            logger.warning("Embedding %s failed: %s", video_id, str(e)[:200])
+    
+    threading.Thread(target=run, daemon=True).start()
+
+
+def save_transcript(video_id, record, session_id=None):
+    """Add a freshly fetched transcript to the library and the memory cache, returning its text"""
+    get_library().add_video(
+        video_id, record['segments'],
+        title=record.get('title'), language=record.get('language'),
+        source=record.get('source'), channel=record.get('channel')
+    )
+    transcript = join_segments(record['segments'])
+    get_transcript_cache().put(video_id, transcript, session_id)
+    index_in_background(video_id, record['segments'])
+    return transcript
+
+
+# Stored transcripts older than this are refetched in the background when used (0 turns it off)
+REVALIDATE_AFTER = float(os.getenv("TUBEMIND_REVALIDATE_HOURS", "24")) * 3600
+REVALIDATE_DEADLINE = 120
+
+_revalidation_lock = threading.Lock()
+_revalidating = set()
+_last_checked = {}  # video_id -> checked_at, so cache hits don't query the library every time
+
+
+def revalidate_transcript(video_id):
+    """Refetch a stored transcript and, if its text changed, refresh everything derived from it
+    
+    Only the summary sections whose text changed are re-summarized before the digest is re-reduced;
+    the others keep their stored notes, even if the new track splits or times them differently.
+    Returns True if the transcript changed.
+    """
+    library = get_library()
+    old = library.get_video(video_id)
+    if not old:
+        return False
+    
+    try:
+        record = get_transcript(video_id, Deadline(REVALIDATE_DEADLINE))
+    except DeadlineExceeded:
+        record = None
+    if not record or content_hash(record['segments']) == old['content_hash']:
+        # Unchanged, or not fetchable right now: keep serving what we have
+        library.mark_checked(video_id)
+        _last_checked[video_id] = time.time()
+        return False
+    
+    # Notes are stored by section_key, which includes timing; carry them over to sections whose text is the same
+    old_keys = {content_hash(section['segments']): section_key(section) for section in split_sections(old['segments'])}
+    old_notes = library.get_section_summaries(list(old_keys.values()))
+    sections = split_sections(record['segments'])
+    changed = []
+    for section in sections:
+        old_key = old_keys.get(content_hash(section['segments']))
+        if old_key is None:
+            changed.append(section)
+        elif old_key in old_notes and old_key != section_key(section):
+            library.save_section_summary(section_key(section), old_notes[old_key])
+    logger.info("Captions of %s changed: %d of %d sections differ", video_id, len(changed), len(sections))
+    
+    had_digest = library.get_digest(video_id) is not None
+    save_transcript(video_id, record)  # Library, memory cache and embeddings
+    _last_checked[video_id] = time.time()
+    get_answer_cache().invalidate(video_id)
+    if had_digest:
+        load_digest(video_id)
+    return True
+
+
+def maybe_revalidate(video_id):
+    """Start a background revalidation if the stored transcript is due for one"""
+    if REVALIDATE_AFTER <= 0:
+        return
+    checked_at = _last_checked.get(video_id)
+    if checked_at is None:
+        checked_at = get_library().checked_at(video_id)
+        if checked_at is None:
+            return
+        _last_checked[video_id] = checked_at
+    if time.time() - checked_at < REVALIDATE_AFTER:
+        return
+    
+    with _revalidation_lock:
+        if video_id in _revalidating:
+            return
+        _revalidating.add(video_id)
+    
+    def run():
+        try:
+            with llm_job(user='revalidation', priority=BATCH):
+                revalidate_transcript(video_id)
+        except Exception as e:
+            logger.warning("Revalidating %s failed: %s", video_id, str(e)[:200])
+        finally:
+            with _revalidation_lock:
+                _revalidating.discard(video_id)
+    
+    ui.run_in_background(run)
+
+
+def load_transcript(video_id, session_id=None, fetch=True, deadline=None):
+    """Transcript text from the memory cache, then the library, then YouTube"""
+    cache = get_transcript_cache()
+    transcript = cache.get(video_id, session_id)
+    if transcript is not None:
+        maybe_revalidate(video_id)
+        return transcript
+    
+    record = get_library().get_video(video_id)
+    if record:
+        maybe_revalidate(video_id)
+        transcript = join_segments(record['segments'])
+        cache.put(video_id, transcript, session_id)
+        if not get_embedding_index()[1].has_video(video_id):
+            index_in_background(video_id, record['segments'])
+        return transcript
+    
+    if fetch:
+        record = get_transcript(video_id, deadline)
+        if record:
+            return save_transcript(video_id, record, session_id)
+    return None
+
+
+def load_digest(video_id, deadline=None, on_section=None):
+    """Digest from the library, else generated and stored; also answers the common follow-ups in advance
+    
+    Falls back to a plain summary if the structured output is invalid; that and partial digests
+    aren't stored, so the next load tries again (reusing any section notes already made)
+    """
+    library = get_library()
+    digest = library.get_digest(video_id)
+    if digest is None:
+        record = library.get_video(video_id)
+        if not record:
+            return None
+        
+        try:
+            digest = generate_digest(record, deadline, on_section)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            ui.error(f"❌ Error generating summary: {str(e)[:200]}")
+            return None
+        
+        if digest and not digest.get('partial'):
+            library.save_digest(video_id, digest)
+        elif not digest:
+            summary = generate_summary(join_segments(record['segments']), deadline)
+            if not summary:
+                return None
+            digest = fallback_digest(summary)
+    
+    if not digest.get('partial'):
+        remember_follow_ups(video_id, digest)
+    return digest
+
+
+def remember_follow_ups(video_id, digest):
+    """Cache the answers to the common follow-up questions the digest already covers"""
+    answers = get_answer_cache()
+    # Exact phrasings only: "What topics are not covered?" must not get the "What topics are covered?" answer
+    for question, answer in follow_up_answers(digest, video_id):
+        answers.put(video_id, question, answer, exact=True)
+
+
+# Bulk jobs: batch requests and single digests run this many at a time (the scheduler still caps LLM calls)
+BULK_WORKERS = 4
+# Transcript fetches of a bulk job run this many at a time, to stay polite to YouTube
+BULK_FETCH_WORKERS = 2
+BATCH_DIGEST_VIDEOS = int(os.getenv("TUBEMIND_BATCH_VIDEOS", str(BATCH_VIDEOS)))
+
+
+def record_duration(record):
+    segments = record['segments']
+    return segments[-1]['start'] + segments[-1]['duration'] if segments else 0.0
+
+
+def _completed(futures, deadline):
+    """as_completed for a bulk job, stopping with a warning when the job's deadline runs out"""
+    if not futures:
+        return
+    try:
+        yield from as_completed(futures, timeout=deadline.timeout(None, "the bulk job"))
+    except (FuturesTimeout, DeadlineExceeded):
+        unfinished = sum(not future.done() for future in futures)
+        logger.warning("Bulk job ran out of time with %d of %d tasks unfinished", unfinished, len(futures))
+
+
+def digest_videos(video_ids, deadline=None):
+    """Digests for many videos (bulk jobs) as {video_id: digest, or None if there is none}
+    
+    Missing transcripts are fetched BULK_FETCH_WORKERS at a time. Short videos are then digested several
+    to a request; a video a batch doesn't return a valid digest for, like every longer video, goes through
+    load_digest on its own. Each fetch, batch request and single digest gets up to PROCESS_DEADLINE, within
+    the job's deadline; videos that aren't done when it runs out come back as None.
+    """
+    started = time.monotonic()
+    deadline = ensure_deadline(deadline)
+    library = get_library()
+    video_ids = list(dict.fromkeys(video_ids))
+    digests, records = {}, {}
+    missing = []
+    for video_id in video_ids:
+        digest = library.get_digest(video_id)
+        if digest is not None:
+            digests[video_id] = digest
+        else:
+            missing.append(video_id)
+    
+    def fetch(video_id):
+        if load_transcript(video_id, deadline=deadline.limit(PROCESS_DEADLINE)) is None:
+            return None
+        return library.get_video(video_id)
+    
+    def digest_batch(batch):
+        durations = {video_id: record_duration(record) for video_id, record in batch}
+        text = generate_text(
+            build_batch_digest_prompt(batch), deadline=deadline.limit(PROCESS_DEADLINE), generation_config=JSON_OUTPUT
+        )
+        return parse_batch_digests(text, durations)
+    
+    def digest_one(video_id):
+        return load_digest(video_id, deadline.limit(PROCESS_DEADLINE))
+    
+    batched, batches, single = 0, [], []
+    fetcher = ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS)
+    pool = ThreadPoolExecutor(max_workers=BULK_WORKERS)
+    try:
+        # Workers run in copies of this context, so their calls keep the caller's user and priority
+        futures = {fetcher.submit(in_context(fetch), video_id): video_id for video_id in missing}
+        for future in _completed(futures, deadline):
+            video_id = futures[future]
+            try:
+                record = future.result()
+            except DeadlineExceeded:
+                logger.warning("Fetching the transcript of %s ran out of time", video_id)
+                continue
+            if record is not None:
+                records[video_id] = record
+        
+        short = [
+            (video_id, record) for video_id, record in records.items()
+            if record_duration(record) <= BATCH_MAX_SECONDS and transcript_chars(record['segments']) <= DIGEST_TRANSCRIPT_CHARS
+        ]
+        batches = [batch for batch in batch_digest_videos(short, max_videos=BATCH_DIGEST_VIDEOS) if len(batch) > 1]
+        
+        futures = {pool.submit(in_context(digest_batch), batch): batch for batch in batches}
+        for future in _completed(futures, deadline):
+            batch = futures[future]
+            try:
+                done = future.result()
+            except Exception as e:
+                logger.warning("Batch digest of %d videos failed: %s", len(batch), str(e)[:200])
+                continue
+            if len(done) < len(batch):
+                logger.info("Batch digest returned %d of %d videos; the rest are retried one by one", len(done), len(batch))
+            for video_id, digest in done.items():
+                library.save_digest(video_id, digest)
+                remember_follow_ups(video_id, digest)
+                digests[video_id] = digest
+            batched += len(done)
+        
+        single = [video_id for video_id in records if video_id not in digests]
+        futures = {pool.submit(in_context(digest_one), video_id): video_id for video_id in single}
+        for future in _completed(futures, deadline):
+            video_id = futures[future]
+            try:
+                digests[video_id] = future.result()
+            except Exception as e:
+                logger.warning("Digest of %s failed: %s", video_id, str(e)[:200])
+    finally:
+        fetcher.shutdown(wait=False, cancel_futures=True)
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    logger.info("Digested %d videos in %.1fs: %d in %d batch requests, %d one by one",
+                len(video_ids), time.monotonic() - started, batched, len(batches), len(single))
+    return {video_id: digests.get(video_id) for video_id in video_ids}
+
+
+# Common first questions answered while the user reads the summary (the summary, chapters,
+# key points and takeaways are already answered by the digest); 0 turns speculation off
+SPECULATIVE_QUESTIONS = [
+    "What is the main argument of this video?",
+    "What examples are given?",
+    "What conclusions does the video reach?",
+    "What tools, resources or references are mentioned?",
+    "Who is this video for?",
+]
+SPECULATIVE_ANSWERS = int(os.getenv("TUBEMIND_SPECULATIVE_ANSWERS", "3"))
+
+# Speculation only spends the shared Gemini quota while this share of the minute's window is unused
+SPECULATION_QUOTA_SHARE = 0.5
+
+_speculation_lock = threading.Lock()
+_speculating = {}  # (video_id, normalized question) -> Event set once its answer is in the cache
+
+
+class Speculation:
+    """Idle-time work for a video whose summary is on screen: warm its caches and pre-answer common questions
+    
+    Runs at batch priority, so anything the user asks is served first, and stops once the shared quota
+    is busy; cancel() stops it and abandons the answer in progress, unless that's the question the user
+    just asked (answer_question then waits for it instead of asking again)
+    """
+    
+    def __init__(self, video_id, session_id=None, questions=None):
+        self.video_id = video_id
+        self.session_id = session_id
+        self.questions = SPECULATIVE_QUESTIONS[:SPECULATIVE_ANSWERS] if questions is None else questions
+        self.answered = 0
+        self.finished = False
+        self._cancelled = threading.Event()
+        self._deadline = None
+        self._current = None  # Normalized question being answered
+        self._keep = None  # Normalized question cancel() said to finish
+    
+    def start(self):
+        ui.run_in_background(self._run)
+        return self
+    
+    def cancel(self, keep=None):
+        """Stop after the current step; the answer in progress is abandoned unless it's for the question keep"""
+        self._keep = None if keep is None else normalize_question(keep)
+        self._cancelled.set()
+        deadline = self._deadline
+        if deadline is not None and self._keep != self._current:
+            deadline.cancel()
+    
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+    
+    def _run(self):
+        try:
+            with llm_job(self.session_id, BATCH):
+                self._warm()
+        except Exception as e:
+            logger.warning("Speculation for %s failed: %s", self.video_id, str(e)[:200])
+        finally:
+            self.finished = True
+            logger.info("Speculation for %s: %d answers precomputed%s",
+                        self.video_id, self.answered, " (cancelled)" if self.cancelled else "")
+    
+    def _warm(self):
+        record = get_library().get_video(self.video_id)
+        if not record or self.cancelled:
+            return
+        
+        # Transcript in the memory cache, vectors in the retrieval index
+        transcript = load_transcript(self.video_id, self.session_id, fetch=False)
+        if not get_embedding_index()[1].has_video(self.video_id):
+            index_once(self.video_id, record['segments'])
+        
+        answers = get_answer_cache()
+        for question in self.questions:
+            if self.cancelled:
+                return
+            if answers.has(self.video_id, question):
+                continue
+            if not quota_has_room(SPECULATION_QUOTA_SHARE):
+                logger.info("Speculation for %s stopped: Gemini quota is busy", self.video_id)
+                return
+            
+            key = (self.video_id, normalize_question(question))
+            with _speculation_lock:
+                if key in _speculating:
+                    continue
+                ready = _speculating[key] = threading.Event()
+            # cancel() sees this deadline, or the check after it sees the cancel
+            self._current = key[1]
+            self._deadline = deadline = Deadline(ANSWER_DEADLINE)
+            if self.cancelled and self._keep != key[1]:
+                deadline.cancel()
+            try:
+                answer = ask_question(transcript, question, ConversationMemory(), deadline)
+                if answer:
+                    answers.put(self.video_id, question, answer)
+                    self.answered += 1
+            except DeadlineExceeded:
+                if self.cancelled:
+                    return
+                raise
+            finally:
+                with _speculation_lock:
+                    del _speculating[key]
+                ready.set()
+
+
+def wait_for_speculation(video_id, question, deadline):
+    """If this exact question is being answered speculatively, wait (within the deadline) for it to land"""
+    with _speculation_lock:
+        ready = _speculating.get((video_id, normalize_question(question)))
+    if ready is None:
+        return False
+    return ready.wait(deadline.timeout(None, "waiting for a precomputed answer"))
+
+
+def cached_answer(video_id, question, memory):
+    """Look up a cached answer; returns (answer or None, whether the question may be cached)"""
+    # Questions that lean on earlier turns skip the cache
+    cacheable = not is_context_dependent(question, len(memory) > 0)
+    answer = get_answer_cache().get(video_id, question) if cacheable else None
+    return answer, cacheable
+
+
+def answer_question(video_id, question, memory, session_id=None, deadline=None):
+    """Answer a question about a video, using the shared answer cache; returns (answer, from_cache)"""
+    answer, cacheable = cached_answer(video_id, question, memory)
+    if answer is None and cacheable and wait_for_speculation(video_id, question, ensure_deadline(deadline)):
+        answer, _ = cached_answer(video_id, question, memory)
+    if answer is not None:
+        return answer, True
+    
+    # The transcript is only needed (and reloaded if evicted) on a cache miss
+    transcript = load_transcript(video_id, session_id, deadline=deadline)
+    if not transcript:
+        return None, False
+    
+    answer = ask_question(transcript, question, memory, deadline)
+    if answer and cacheable:
+        get_answer_cache().put(video_id, question, answer)
+    return answer, False
@@ -0,0 +1,222 @@
+"""
+Opt-in profiling of individual requests
+A profiled request gets a deterministic cProfile of its own thread (.pstats) and wall-clock stack samples
+of its thread and the workers it hands work to (.collapsed, ready for flamegraph.pl or speedscope); the
+slowest captures are kept
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Profile every request (otherwise only the ones asked for, via the sidebar or X-TubeMind-Profile)
+PROFILE_ALL = os.getenv("TUBEMIND_PROFILE", "0") == "1"
+PROFILE_KEEP = int(os.getenv("TUBEMIND_PROFILE_KEEP", "20"))
+SAMPLE_INTERVAL = 0.005
+
+# Leaf frames in these stdlib modules mean a worker is parked, not working (the profiled thread is always kept)
+_IDLE_MODULES = ('threading.py', 'selectors.py', 'queue.py', 'socketserver.py', 'thread.py')
+
+# Sampler of the request being profiled in this context, if any
+_sampler = contextvars.ContextVar('profile_sampler', default=None)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """Root-to-leaf labels of a frame's stack"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class StackSampler:
+    """Background thread that samples the stacks of a request's thread and its busy workers into collapsed-stack counts"""
+
+    def __init__(self, target_ident, interval=SAMPLE_INTERVAL):
+        self.target_ident = target_ident
+        self.interval = interval
+        self.samples = Counter()
+        self._workers = Counter()  # Thread ident -> tasks of the request it's running
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @contextlib.contextmanager
+    def worker(self):
+        """Sample the current thread along with the request while the block runs"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._workers[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._workers[ident] -= 1
+                if not self._workers[ident]:
+                    del self._workers[ident]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                workers = set(self._workers)
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()} if workers else {}
+            for ident in [self.target_ident, *workers]:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                if ident != self.target_ident and os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                    continue
+                root = "request" if ident == self.target_ident else f"thread {names.get(ident, ident)}"
+                self.samples[';'.join([root] + _stack(frame))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common()) + '\n'
+
+    def hottest(self, limit=10):
+        """Frames where samples of the profiled request ended, most frequent first"""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            if stack.startswith("request;"):
+                leaves[stack.rsplit(';', 1)[-1]] += count
+        return [(label, count * self.interval) for label, count in leaves.most_common(limit)]
+
+
+class ProfileStore:
+    """The slowest captured requests on disk, with an index; faster ones are dropped past `keep`"""
+
+    def __init__(self, directory=None, keep=PROFILE_KEEP):
+        self.directory = directory or os.path.join(DATA_DIR, "profiles")
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.directory, "index.json")
+        try:
+            with open(self._index_path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = []
+
+    def slowest(self, limit=None):
+        with self._lock:
+            return sorted(self._entries, key=lambda e: -e['seconds'])[:limit]
+
+    def add(self, entry, profiler, sampler):
+        """Keep a capture if it's among the slowest; returns whether it was kept"""
+        with self._lock:
+            if self.keep <= 0:
+                return False
+            if len(self._entries) >= self.keep and entry['seconds'] <= min(e['seconds'] for e in self._entries):
+                return False
+
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, entry['id'])
+            entry['files'] = []
+            if profiler is not None:
+                profiler.dump_stats(base + ".pstats")
+                entry['files'].append(base + ".pstats")
+            with open(base + ".collapsed", 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+            entry['files'].append(base + ".collapsed")
+            self._entries.append(entry)
+
+            self._entries.sort(key=lambda e: -e['seconds'])
+            for dropped in self._entries[self.keep:]:
+                for path in dropped['files']:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+            del self._entries[self.keep:]
+
+            with open(self._index_path + ".part", 'w') as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(self._index_path + ".part", self._index_path)
+            return True
+
+
+@functools.lru_cache(maxsize=None)
+def get_profile_store():
+    """Process-wide store of captured profiles"""
+    return ProfileStore()
+
+
+@contextlib.contextmanager
+def _capture(name, tags):
+    request_id = uuid.uuid4().hex[:12]
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        profiler = None  # Another profiler (e.g. a concurrent capture on 3.12+) owns the hook; samples still work
+    sampler.start()
+    token = _sampler.set(sampler)
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield request_id
+    finally:
+        seconds = time.perf_counter() - started
+        _sampler.reset(token)
+        if profiler is not None:
+            profiler.disable()
+        sampler.stop()
+        entry = {
+            'id': request_id, 'name': name, 'seconds': seconds, 'started_at': started_at,
+            'tags': {key: str(value) for key, value in tags.items()},
+            'hottest': sampler.hottest(),
+        }
+        try:
+            kept = get_profile_store().add(entry, profiler, sampler)
+        except OSError as e:
+            logger.warning("Couldn't save profile %s: %s", request_id, e)
+        else:
+            logger.info("Profiled %s %s in %.2fs%s", name, request_id, seconds, "" if kept else " (not among the slowest)")
+
+
+def in_context(func):
+    """func bound to a copy of the caller's context, for handing to a worker thread
+
+    The worker's calls keep the caller's user and priority, and if the caller is being profiled,
+    the worker is sampled along with it while it runs func
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        sampler = context.get(_sampler)
+        if sampler is None:
+            return context.run(func, *args, **kwargs)
+        with sampler.worker():
+            return context.run(func, *args, **kwargs)
+    return run
+
+
+def profile_request(name, requested=False, **tags):
+    """Profile the block if asked to or TUBEMIND_PROFILE is on; otherwise a no-op context"""
+    if not (requested or PROFILE_ALL):
+        return contextlib.nullcontext()
+    return _capture(name, tags)
@@ -0,0 +1,177 @@
+"""
+Shared Gemini quota ledger (requests and tokens per minute)
+Every replica reserves estimated tokens before a call and reconciles the real usage afterwards,
+so replicas sharing one API key pace themselves instead of colliding into 429 errors
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from config import DATA_DIR
+
+# Limits of the API key shared by all replicas (defaults match the free tier for Flash models)
+GEMINI_RPM = int(os.getenv("TUBEMIND_GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("TUBEMIND_GEMINI_TPM", "1000000"))
+QUOTA_DB = os.getenv("TUBEMIND_QUOTA_DB", os.path.join(DATA_DIR, "quota.db"))
+
+WINDOW_SECONDS = 60
+
+
+class QuotaExceeded(Exception):
+    """Raised when a reservation can't be made within the caller's wait limit"""
+
+
+class QuotaBackend:
+    """Storage for the ledger; implementations must make try_reserve atomic across replicas"""
+
+    def try_reserve(self, tokens, rpm, tpm, now):
+        """Record a reservation if it fits the window; returns (reservation_id, 0) or (None, seconds_to_wait)"""
+        raise NotImplementedError
+
+    def reconcile(self, reservation_id, tokens):
+        """Replace a reservation's estimated tokens with the actual count"""
+        raise NotImplementedError
+
+    def block(self, until):
+        """Stop all replicas from reserving until the given time (after an upstream 429)"""
+        raise NotImplementedError
+
+    def usage(self, now):
+        """(requests, tokens) in the current window"""
+        raise NotImplementedError
+
+
+class SQLiteQuotaBackend(QuotaBackend):
+    """Ledger in a SQLite file; BEGIN IMMEDIATE serializes reservations between processes on one host"""
+
+    def __init__(self, path=QUOTA_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS reservations (
+                    id INTEGER PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    tokens INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS reservations_ts ON reservations(ts);
+                CREATE TABLE IF NOT EXISTS ledger_state (
+                    key TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        # One connection per thread; sqlite handles locking between threads and processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def try_reserve(self, tokens, rpm, tpm, now):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            window_start = now - WINDOW_SECONDS
+            conn.execute("DELETE FROM reservations WHERE ts < ?", (window_start,))
+
+            row = conn.execute("SELECT value FROM ledger_state WHERE key = 'blocked_until'").fetchone()
+            if row and row[0] > now:
+                conn.execute("COMMIT")
+                return None, row[0] - now
+
+            rows = conn.execute("SELECT ts, tokens FROM reservations ORDER BY ts").fetchall()
+            used_tokens = sum(t for _, t in rows)
+            wait = 0.0
+
+            if len(rows) + 1 > rpm:
+                # Wait until enough of the oldest requests leave the window
+                wait = rows[len(rows) - rpm][0] + WINDOW_SECONDS - now
+            if used_tokens + tokens > tpm:
+                freed, needed = 0, used_tokens + tokens - tpm
+                for ts, t in rows:
+                    freed += t
+                    if freed >= needed:
+                        wait = max(wait, ts + WINDOW_SECONDS - now)
+                        break
+                else:
+                    wait = max(wait, WINDOW_SECONDS)
+
+            # Pace requests once the window is half used, instead of letting replicas burst
+            if not wait and rows and len(rows) >= rpm / 2:
+                wait = max(rows[-1][0] + WINDOW_SECONDS / rpm - now, 0)
+
+            if wait > 0:
+                conn.execute("COMMIT")
+                return None, wait
+
+            cursor = conn.execute("INSERT INTO reservations (ts, tokens) VALUES (?, ?)", (now, tokens))
+            conn.execute("COMMIT")
+            return cursor.lastrowid, 0
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def reconcile(self, reservation_id, tokens):
+        self._connect().execute("UPDATE reservations SET tokens = ? WHERE id = ?", (tokens, reservation_id))
+
+    def block(self, until):
+        self._connect().execute(
+            "INSERT INTO ledger_state (key, value) VALUES ('blocked_until', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (until,)
+        )
+
+    def usage(self, now):
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM reservations WHERE ts >= ?",
+            (now - WINDOW_SECONDS,)
+        ).fetchone()
+        return row[0], row[1]
+
+
+class QuotaLedger:
+    """Reserve-before-dispatch, reconcile-after ledger for requests and tokens per minute"""
+
+    def __init__(self, backend=None, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_wait=120):
+        self.backend = backend or SQLiteQuotaBackend()
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.total_wait = 0.0
+
+    def reserve(self, estimated_tokens, max_wait=None):
+        """Block until the call fits the shared quota; returns a reservation id"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        tokens = min(estimated_tokens, self.tpm)
+        waited = 0.0
+        while True:
+            reservation_id, wait = self.backend.try_reserve(tokens, self.rpm, self.tpm, time.time())
+            if reservation_id is not None:
+                self.total_wait += waited
+                return reservation_id
+            if waited + wait > max_wait:
+                raise QuotaExceeded(f"Gemini quota busy; next slot in {wait:.0f}s")
+
+            # Jitter keeps replicas from waking up in lockstep
+            pause = wait + random.uniform(0, min(1.0, wait / 4 + 0.05))
+            time.sleep(pause)
+            waited += pause
+
+    def reconcile(self, reservation_id, actual_tokens):
+        if reservation_id is not None:
+            self.backend.reconcile(reservation_id, int(actual_tokens))
+
+    def report_rate_limited(self, cooldown=10):
+        """Upstream returned 429 anyway: hold every replica back for a moment"""
+        self.backend.block(time.time() + cooldown)
+
+    def usage(self):
+        requests, tokens = self.backend.usage(time.time())
+        return {'requests': requests, 'tokens': tokens, 'rpm': self.rpm, 'tpm': self.tpm}
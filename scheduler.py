@@ -0,0 +1,134 @@
+"""
+Admission control for LLM calls: priority classes, per-user fair queuing and a concurrency limit
+Interactive chat goes ahead of summaries, which go ahead of batch work; within a class, users
+take turns, so one user's bulk processing can't starve everyone else
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from deadline import DeadlineExceeded, ensure_deadline
+
+# Priority classes, highest first
+INTERACTIVE = 0
+SUMMARY = 1
+BATCH = 2
+PRIORITY_NAMES = ('interactive', 'summary', 'batch')
+
+# LLM calls allowed in flight at once in this process
+LLM_CONCURRENCY = int(os.getenv("TUBEMIND_LLM_CONCURRENCY", "4"))
+
+# Who a call is made for and in which class; set by the UI and API around each piece of work
+_current_user = contextvars.ContextVar('tubemind_llm_user', default='anonymous')
+_current_priority = contextvars.ContextVar('tubemind_llm_priority', default=SUMMARY)
+
+
+@contextlib.contextmanager
+def llm_job(user=None, priority=None):
+    """Attribute LLM calls made inside the block to a user and a priority class"""
+    tokens = []
+    if user is not None:
+        tokens.append((_current_user, _current_user.set(str(user))))
+    if priority is not None:
+        tokens.append((_current_priority, _current_priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _Ticket:
+    __slots__ = ('user', 'priority', 'enqueued', 'granted')
+
+    def __init__(self, user, priority):
+        self.user = user
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class LLMScheduler:
+    """Hands out a limited number of call slots, highest priority first and round-robin across users"""
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, window=200):
+        self.concurrency = concurrency
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]  # per class: user -> deque of tickets
+        self._waits = [deque(maxlen=window) for _ in PRIORITY_NAMES]
+
+    @contextlib.contextmanager
+    def slot(self, deadline=None):
+        """Hold one call slot for the block, queuing for it under the current user and priority"""
+        deadline = ensure_deadline(deadline)
+        ticket = _Ticket(_current_user.get(), _current_priority.get())
+
+        with self._cond:
+            self._queues[ticket.priority].setdefault(ticket.user, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                if deadline.expired():
+                    self._withdraw(ticket)
+                    raise DeadlineExceeded("the wait for a free LLM slot")
+                remaining = deadline.remaining()
+                self._cond.wait(None if remaining == float('inf') else remaining)
+            self._waits[ticket.priority].append(time.monotonic() - ticket.enqueued)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets (caller holds the lock)"""
+        granted = False
+        while self._active < self.concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._active += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _next_ticket(self):
+        for users in self._queues:
+            if users:
+                # The user at the front goes next, then moves to the back of the line
+                user, tickets = next(iter(users.items()))
+                ticket = tickets.popleft()
+                del users[user]
+                if tickets:
+                    users[user] = tickets
+                return ticket
+        return None
+
+    def _withdraw(self, ticket):
+        users = self._queues[ticket.priority]
+        tickets = users.get(ticket.user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del users[ticket.user]
+
+    def stats(self):
+        """Slots in use, queue depth and recent wait times per priority class"""
+        with self._cond:
+            classes = {}
+            for name, users, waits in zip(PRIORITY_NAMES, self._queues, self._waits):
+                ordered = sorted(waits)
+                classes[name] = {
+                    'queued': sum(len(tickets) for tickets in users.values()),
+                    'users_waiting': len(users),
+                    'mean_wait': sum(ordered) / len(ordered) if ordered else 0.0,
+                    'p95_wait': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] if ordered else 0.0,
+                }
+            return {'active': self._active, 'concurrency': self.concurrency, 'classes': classes}
@@ -0,0 +1,362 @@
+"""
+Warm-start snapshots: transcripts, digests, section notes, cached answers and embeddings in one file
+Text and metadata sections are zlib-compressed; segment timings and vectors are stored raw and aligned,
+so an import memory-maps them instead of reading and parsing them
+"""
+
+import argparse
+import functools
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import requests
+
+import pipeline
+from config import DATA_DIR
+from library_index import content_hash
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TMSNAP\x00\x00'
+FORMAT_VERSION = 1
+ALIGN = 64  # Section alignment, so raw arrays can be viewed straight out of the memory map
+_PREAMBLE = struct.Struct('<8sII')  # magic, format version, header length
+
+# Path or http(s) URL of a snapshot to import on startup (e.g. another replica's /snapshot)
+SNAPSHOT_SOURCE = os.getenv("TUBEMIND_SNAPSHOT", "")
+
+
+class SnapshotError(ValueError):
+    """The file isn't a snapshot this version can read"""
+
+
+class SnapshotWriter:
+    """Appends sections to a snapshot file; the header with their offsets is written on close"""
+
+    def __init__(self, path):
+        self.path = path
+        self._sections = {}
+        self._data = tempfile.TemporaryFile()
+        self._size = 0
+
+    def _append(self, name, data, **meta):
+        padding = -self._size % ALIGN
+        self._data.write(b'\x00' * padding)
+        self._size += padding
+        self._sections[name] = dict(meta, offset=self._size, length=len(data))
+        self._data.write(data)
+        self._size += len(data)
+
+    def add_json(self, name, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._append(name, zlib.compress(raw, 6), codec='zlib-json')
+
+    def add_texts(self, name, texts):
+        """A list of strings, NUL-separated and compressed"""
+        self._append(name, zlib.compress('\x00'.join(texts).encode('utf-8'), 6), codec='zlib-text')
+
+    def add_array(self, name, array):
+        array = np.ascontiguousarray(array)
+        self._append(name, array.tobytes(), codec='raw', dtype=array.dtype.str, shape=list(array.shape))
+
+    def close(self, **info):
+        """Write header and sections to a temporary file, then move it into place"""
+        header = json.dumps(
+            dict(info, created_at=time.time(), sections=self._sections), separators=(',', ':')
+        ).encode('utf-8')
+        start = _PREAMBLE.size + len(header)
+        start += -start % ALIGN  # Section offsets are relative to this aligned start
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+                f.write(header)
+                f.write(b'\x00' * (start - _PREAMBLE.size - len(header)))
+                self._data.seek(0)
+                while True:
+                    chunk = self._data.read(1 << 20)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        finally:
+            self._data.close()
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError("empty file")
+
+        if len(self._map) < _PREAMBLE.size:
+            self.close()
+            raise SnapshotError("file too short")
+        magic, version, header_length = _PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError("not a TubeMind snapshot")
+        if version > FORMAT_VERSION:
+            self.close()
+            raise SnapshotError(f"snapshot format {version} is newer than this build ({FORMAT_VERSION})")
+
+        start = _PREAMBLE.size + header_length
+        self._start = start + -start % ALIGN
+        try:
+            if start > len(self._map):
+                raise SnapshotError("header runs past the end of the file")
+            self.header = json.loads(self._map[_PREAMBLE.size:start])
+            # A truncated or corrupt file is caught here, not halfway through an import
+            for name, section in self.header['sections'].items():
+                end = self._start + section['offset'] + section['length']
+                if section['offset'] < 0 or section['length'] < 0 or end > len(self._map):
+                    raise SnapshotError(f"section {name} runs past the end of the file (truncated?)")
+                if section['codec'] == 'raw':
+                    expected = int(np.prod(section['shape'])) * np.dtype(section['dtype']).itemsize
+                    if expected != section['length']:
+                        raise SnapshotError(f"section {name} is {section['length']} bytes, expected {expected}")
+        except SnapshotError:
+            self.close()
+            raise
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.close()
+            raise SnapshotError(f"unreadable header: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Arrays handed out still use it; it's unmapped once they're gone
+        self._file.close()
+
+    def _bytes(self, section):
+        offset = self._start + section['offset']
+        return self._map[offset:offset + section['length']]
+
+    def json(self, name, default=None):
+        section = self.header['sections'].get(name)
+        if section is None:
+            return default
+        try:
+            return json.loads(zlib.decompress(self._bytes(section)))
+        except (zlib.error, ValueError) as e:
+            raise SnapshotError(f"section {name} is corrupt: {e}") from e
+
+    def texts(self, name):
+        section = self.header['sections'].get(name)
+        if section is None:
+            return []
+        try:
+            data = zlib.decompress(self._bytes(section)).decode('utf-8')
+        except (zlib.error, ValueError) as e:
+            raise SnapshotError(f"section {name} is corrupt: {e}") from e
+        return data.split('\x00') if data else []
+
+    def array(self, name):
+        """Zero-copy view of a raw array section (valid until close)"""
+        section = self.header['sections'].get(name)
+        if section is None:
+            raise SnapshotError(f"section {name} is missing")
+        dtype = np.dtype(section['dtype'])
+        count = int(np.prod(section['shape'])) if section['shape'] else 1
+        array = np.frombuffer(self._map, dtype=dtype, count=count, offset=self._start + section['offset'])
+        return array.reshape(section['shape'])
+
+
+def export_snapshot(path):
+    """Write this instance's library, answer cache and embeddings to a snapshot file; returns the counts"""
+    library = pipeline.get_library()
+    writer = SnapshotWriter(path)
+
+    videos, starts, durations, texts = [], [], [], []
+    for record in library.iter_videos():
+        videos.append([
+            record['video_id'], record['title'], record['channel'], record['language'], record['source'],
+            record['fetched_at'], record['duration'], record['content_hash'], record['checked_at'],
+            len(starts), len(record['segments']),
+        ])
+        for seg in record['segments']:
+            starts.append(seg['start'])
+            durations.append(seg['duration'])
+            texts.append(seg['text'])
+    writer.add_json('videos', videos)
+    writer.add_array('segment_starts', np.asarray(starts, dtype=np.float64))
+    writer.add_array('segment_durations', np.asarray(durations, dtype=np.float64))
+    writer.add_texts('segment_texts', texts)
+
+    digests = library.all_digests()
+    section_summaries = library.all_section_summaries()
+    answers = pipeline.get_answer_cache().items()
+    writer.add_json('digests', digests)
+    writer.add_json('section_summaries', section_summaries)
+    writer.add_json('answers', answers)
+
+    embedder, store = pipeline.get_embedding_index()
+    chunks, vectors = store.export()
+    writer.add_json('chunks', chunks)
+    writer.add_array('vectors', vectors.astype(np.float32, copy=False))
+
+    counts = {
+        'videos': len(videos), 'segments': len(starts), 'digests': len(digests),
+        'section_summaries': len(section_summaries), 'answers': len(answers), 'chunks': len(chunks),
+    }
+    writer.close(embedder=embedder.name, dim=embedder.dim, counts=counts)
+    return counts
+
+
+def import_snapshot(path):
+    """Load a snapshot into this instance, keeping anything already stored; returns what was added"""
+    started = time.monotonic()
+    with Snapshot(path) as snap:
+        try:
+            added = _import_sections(snap)
+        except SnapshotError:
+            raise
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            # Sections that decode but don't have the shape this version writes
+            raise SnapshotError(f"malformed snapshot: {e}") from e
+    logger.info("Imported snapshot %s in %.1fs: %s", path, time.monotonic() - started, added)
+    return added
+
+
+def _import_sections(snap):
+    library = pipeline.get_library()
+    added = {'videos': 0, 'digests': 0, 'answers': 0, 'chunks': 0}
+    videos = snap.json('videos', [])
+    starts, durations = snap.array('segment_starts'), snap.array('segment_durations')
+    texts = snap.texts('segment_texts')
+
+    def records():
+        # The file's transcript hash is recomputed rather than trusted, so older snapshots still line up
+        for (video_id, title, channel, language, source, fetched_at, duration,
+             _, checked_at, first, count) in videos:
+            segments = [
+                {'start': start, 'duration': length, 'text': text}
+                for start, length, text in zip(
+                    starts[first:first + count].tolist(), durations[first:first + count].tolist(),
+                    texts[first:first + count]
+                )
+            ]
+            yield {
+                'video_id': video_id, 'title': title, 'channel': channel, 'language': language,
+                'source': source, 'fetched_at': fetched_at, 'duration': duration,
+                'content_hash': content_hash(segments), 'checked_at': checked_at, 'segments': segments,
+            }
+
+    incoming = list(records())
+    stored = library.content_hashes()
+    added['videos'] = library.import_videos(r for r in incoming if r['video_id'] not in stored)
+
+    # Everything derived from a transcript only applies where ours matches the snapshot's
+    stored = library.content_hashes()
+    current = {r['video_id'] for r in incoming if stored.get(r['video_id']) == r['content_hash']}
+
+    digests = {vid: d for vid, d in snap.json('digests', {}).items() if vid in current}
+    added['digests'] = library.import_digests(digests)
+    library.import_section_summaries(snap.json('section_summaries', {}))
+
+    answers = pipeline.get_answer_cache()
+    for video_id, question, answer, *exact in snap.json('answers', []):
+        if video_id in current and not answers.has(video_id, question):
+            answers.put(video_id, question, answer, exact=bool(exact and exact[0]))
+            added['answers'] += 1
+
+    embedder, store = pipeline.get_embedding_index()
+    if snap.header.get('embedder') == embedder.name and snap.header.get('dim') == embedder.dim:
+        vectors = snap.array('vectors')
+        chunks = snap.json('chunks', [])
+        first = 0
+        # Chunks are grouped by video, so each video is one contiguous slice of the vectors
+        while first < len(chunks):
+            video_id = chunks[first][0]
+            end = first
+            while end < len(chunks) and chunks[end][0] == video_id:
+                end += 1
+            if video_id in current and not store.has_video(video_id):
+                store.add(
+                    video_id,
+                    [{'start': c[1], 'end': c[2], 'text': c[3]} for c in chunks[first:end]],
+                    vectors[first:end]
+                )
+                added['chunks'] += end - first
+            first = end
+    else:
+        logger.info("Snapshot embeddings are from %s; semantic search will re-embed as videos are used",
+                    snap.header.get('embedder'))
+    return added
+
+
+def download_snapshot(url, timeout=60):
+    """Save a snapshot served by another replica to the data directory and return its path"""
+    path = os.path.join(DATA_DIR, "snapshot.tmsnap")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        # Content-Length counts encoded bytes, so it can only be checked on a plain body
+        expected = None if response.headers.get('Content-Encoding') else response.headers.get('Content-Length')
+        received = 0
+        with open(path + '.part', 'wb') as f:
+            for chunk in response.iter_content(1 << 20):
+                f.write(chunk)
+                received += len(chunk)
+    if expected is not None and received != int(expected):
+        os.remove(path + '.part')
+        raise SnapshotError(f"download was cut short ({received} of {expected} bytes)")
+    os.replace(path + '.part', path)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def warm_start(source=SNAPSHOT_SOURCE):
+    """Import the configured snapshot once per process; a missing or bad snapshot only means a cold start"""
+    if not source:
+        return None
+    try:
+        path = download_snapshot(source) if source.startswith(('http://', 'https://')) else source
+        return import_snapshot(path)
+    except (OSError, SnapshotError, requests.RequestException) as e:
+        logger.warning("Skipping snapshot %s: %s", source, str(e)[:200])
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a TubeMind warm-start snapshot")
+    parser.add_argument('command', choices=['export', 'import', 'info'])
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == 'export':
+        print(json.dumps(export_snapshot(args.path)))
+    elif args.command == 'import':
+        print(json.dumps(import_snapshot(args.path)))
+    else:
+        with Snapshot(args.path) as snap:
+            print(json.dumps({k: v for k, v in snap.header.items() if k != 'sections'}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
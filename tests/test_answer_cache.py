@@ -0,0 +1,72 @@
+import pytest
+
+from answer_cache import MINOR_WORDS, AnswerCache, content_words_agree, normalize_question
+
+DIFFERENT_QUESTIONS = [
+    ("What are the risks of nuclear power?", "What are the benefits of nuclear power?"),
+    ("What are the risks of nuclear power?", "What are the risks of solar power?"),
+    ("Should I be buying Tesla stock?", "Should I be selling Tesla stock?"),
+    ("Does he recommend the product?", "Does he not recommend the product?"),
+    ("What topics are covered?", "What topics are not covered?"),
+    ("Does he recommend the product?", "Doesn't he recommend the product?"),
+    ("Did they talk about pricing?", "Did they talk about nothing but pricing?"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_different_questions_miss(cached, asked):
+    cache = AnswerCache()
+    cache.put('v1', cached, "answer")
+    assert cache.get('v1', asked) is None
+    assert not cache.has('v1', asked)
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_different_questions_disagree_on_words(cached, asked):
+    assert not content_words_agree(normalize_question(cached), normalize_question(asked))
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What are the risks of nuclear power?", "what are the risks of nuclear power"),
+    ("What does the video say about nuclear risks?", "What does the video say about nuclear risk?"),
+])
+def test_rephrasings_hit(cached, asked):
+    cache = AnswerCache()
+    cache.put('v1', cached, "answer")
+    assert cache.get('v1', asked) == "answer"
+
+
+def test_negations_must_match_even_among_minor_words(monkeypatch):
+    # A negation that also counted as a minor word would otherwise be ignored
+    monkeypatch.setattr('answer_cache.MINOR_WORDS', MINOR_WORDS | {'not'})
+    assert not content_words_agree(normalize_question("Is it covered?"), normalize_question("Is it not covered?"))
+
+
+def test_minor_words_may_differ():
+    assert content_words_agree(normalize_question("What are the key points?"),
+                               normalize_question("What are the key points of this video?"))
+
+
+def test_answers_are_per_video():
+    cache = AnswerCache()
+    cache.put('v1', "What is the main argument?", "answer")
+    assert cache.get('v2', "What is the main argument?") is None
+
+
+def test_eviction_and_invalidate():
+    cache = AnswerCache(max_entries=3, max_per_video=2)
+    for i in range(3):
+        cache.put('v1', f"question number {i} about topic{i}", str(i))
+    assert len(cache) == 2
+    assert cache.get('v1', "question number 0 about topic0") is None
+    cache.invalidate('v1')
+    assert len(cache) == 0
+
+
+def test_exact_entries_never_match_near_duplicates():
+    cache = AnswerCache()
+    cache.put('v1', "What topics are covered?", "seeded", exact=True)
+    assert cache.get('v1', "what topics are covered") == "seeded"
+    assert cache.get('v1', "What topics are not covered?") is None
+    assert cache.get('v1', "What topics are covered in detail?") is None
+    assert [exact for *_, exact in cache.items()] == [True]
@@ -0,0 +1,35 @@
+import pytest
+
+from api import ApiError, memory_from_history, require_question, resolve_video_id
+
+
+def test_history_becomes_memory():
+    memory = memory_from_history([
+        {'role': 'user', 'content': "What is it about?"},
+        {'role': 'assistant', 'content': "Bread."},
+        {'role': 'system', 'content': "ignored"},
+    ])
+    assert len(memory) == 2
+    assert len(memory_from_history(None)) == 0
+
+
+@pytest.mark.parametrize("history", ["hi", {'role': 'user'}, ["hi"], [{'role': 'user', 'content': 'x'}, 3]])
+def test_malformed_history_is_a_bad_request(history):
+    with pytest.raises(ApiError) as info:
+        memory_from_history(history)
+    assert info.value.status == 400
+
+
+@pytest.mark.parametrize("body", [{}, {'question': "  "}, {'question': 5}, {'question': ['q']}])
+def test_missing_question(body):
+    with pytest.raises(ApiError) as info:
+        require_question(body)
+    assert info.value.status == 400
+
+
+def test_video_ids():
+    assert resolve_video_id("https://www.youtube.com/watch?v=abc123def45") == "abc123def45"
+    assert resolve_video_id("abc123def45") == "abc123def45"
+    for value in (None, 7, "not a video", {'id': 'abc123def45'}):
+        with pytest.raises(ApiError):
+            resolve_video_id(value)
@@ -0,0 +1,34 @@
+import json
+
+from library_index import content_hash
+from pipeline import CAPTION_PARSERS, pick_caption_format
+
+# The same auto captions in both formats: json3 splits events into per-word segs and adds
+# newline-only events, srv1 groups lines differently and double-escapes entities
+JSON3 = json.dumps({'events': [
+    {'tStartMs': 0, 'dDurationMs': 2400, 'segs': [{'utf8': "it's"}, {'utf8': " time"}, {'utf8': " to"}]},
+    {'tStartMs': 1200, 'dDurationMs': 30, 'segs': [{'utf8': "\n"}]},
+    {'tStartMs': 1230, 'dDurationMs': 3000, 'segs': [{'utf8': "bake"}, {'utf8': " bread"}, {'utf8': " & rolls"}]},
+    {'tStartMs': 4230, 'dDurationMs': 2000},
+]})
+
+SRV1 = """<?xml version="1.0" encoding="utf-8" ?><transcript>
+<text start="0.08" dur="1.1">it&amp;#39;s time</text>
+<text start="1.18" dur="0.9">to bake</text>
+<text start="2.08" dur="2.2">bread &amp;amp;
+rolls</text>
+</transcript>"""
+
+
+def test_formats_hash_alike():
+    from_json3 = CAPTION_PARSERS['json3'](JSON3)
+    from_srv1 = CAPTION_PARSERS['srv1'](SRV1)
+    assert len(from_json3) != len(from_srv1)
+    assert content_hash(from_json3) == content_hash(from_srv1)
+
+
+def test_prefers_srv1():
+    formats = [{'ext': 'json3', 'url': 'j'}, {'ext': 'vtt', 'url': 'v'}, {'ext': 'srv1', 'url': 's'}]
+    assert pick_caption_format(formats) == ('srv1', 's')
+    assert pick_caption_format(formats[:2]) == ('json3', 'j')
+    assert pick_caption_format([{'ext': 'vtt', 'url': 'v'}]) is None
@@ -0,0 +1,101 @@
+import pytest
+
+from caption_tracks import (
+    CaptionTrack, accept_language, language_rank, page_tracks, pick_track, transcript_api_tracks, yt_dlp_tracks,
+)
+
+ASR = 'https://www.youtube.com/api/timedtext?v=X&kind=asr'
+
+
+def formats(url):
+    return [{'ext': 'json3', 'url': url}]
+
+
+def first_format(offered):
+    return ('json3', offered[0]['url']) if offered else None
+
+
+def describe(tracks, preferred, translate=False):
+    track = pick_track(tracks, preferred, translate)
+    return track and track.describe()
+
+
+# A German video whose auto captions yt-dlp also lists translated (tlang) into other languages
+GERMAN_AUTO = {
+    'de-orig': formats(ASR + '&lang=de'),
+    'de': formats(ASR + '&lang=de&tlang=de'),
+    'en': formats(ASR + '&lang=de&tlang=en'),
+    'fr': formats(ASR + '&lang=de&tlang=fr'),
+}
+
+
+@pytest.mark.parametrize("preferred, translate, expected", [
+    (['en'], False, "auto-generated subtitles (de)"),
+    (['en'], True, "auto-generated subtitles (en, auto-translated from de)"),
+    (['fr', 'en'], True, "auto-generated subtitles (fr, auto-translated from de)"),
+    (['de', 'en'], True, "auto-generated subtitles (de)"),
+])
+def test_yt_dlp_translations(preferred, translate, expected):
+    assert describe(yt_dlp_tracks({}, GERMAN_AUTO, first_format), preferred, translate) == expected
+
+
+def test_manual_beats_auto_and_regional_variants_still_count():
+    tracks = list(yt_dlp_tracks({'en-GB': formats('m-gb'), 'es': formats('m-es')}, {'en': formats(ASR + '&lang=en')}, first_format))
+    assert describe(tracks, ['en']) == "manual subtitles (en-GB)"
+    assert describe(tracks, ['es', 'en']) == "manual subtitles (es)"
+    exact = yt_dlp_tracks({'en-GB': formats('x'), 'en': formats('y')}, {}, first_format)
+    assert describe(exact, ['en']) == "manual subtitles (en)"
+
+
+def test_falls_back_to_the_videos_own_language():
+    # A Spanish video with manual Arabic and Spanish subtitles; yt-dlp lists the Spanish auto captions as es-orig
+    subtitles = {'ar': formats('m-ar'), 'es': formats('m-es')}
+    automatic = {'es-orig': formats(ASR + '&lang=es'), 'ar': formats(ASR + '&lang=es&tlang=ar')}
+    assert describe(yt_dlp_tracks(subtitles, automatic, first_format), ['en']) == "manual subtitles (es)"
+    # Without auto captions, yt-dlp's "language" says which one is original
+    tracks = yt_dlp_tracks({'ar': formats('m-ar'), 'es-MX': formats('m-es')}, {}, first_format)
+    assert pick_track(tracks, ['en'], False, original='es').describe() == "manual subtitles (es-MX)"
+    # Nothing to go on: manual tracks still come before auto-generated ones
+    assert describe(yt_dlp_tracks({'ar': formats('m-ar')}, {}, first_format), ['en']) == "manual subtitles (ar)"
+    page = [
+        {'baseUrl': 'https://y/api/timedtext?v=X&lang=fr', 'languageCode': 'fr'},
+        {'baseUrl': 'https://y/api/timedtext?v=X&lang=it&kind=asr', 'languageCode': 'it', 'kind': 'asr'},
+        {'baseUrl': 'https://y/api/timedtext?v=X&lang=it', 'languageCode': 'it'},
+    ]
+    assert describe(page_tracks(page, ['en'], False), ['en']) == "manual subtitles (it)"
+
+
+def test_page_tracks_offer_translation_only_when_enabled():
+    page = [{'baseUrl': 'https://y/api/timedtext?v=X&lang=ja', 'languageCode': 'ja', 'kind': 'asr', 'isTranslatable': True}]
+    assert pick_track(page_tracks(page, ['en'], True), ['en'], True).url.endswith('tlang=en')
+    assert describe(page_tracks(page, ['en'], False), ['en']) == "auto-generated subtitles (ja)"
+
+
+class FakeTranscript:
+    def __init__(self, language_code, is_generated, translatable=()):
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.is_translatable = bool(translatable)
+        self.translation_languages = [{'language_code': code} for code in translatable]
+
+
+def test_transcript_api_tracks():
+    listed = [FakeTranscript('de', True, translatable=('en', 'fr')), FakeTranscript('es', False)]
+    # The generated track is in the video's own language, which beats other manual tracks
+    assert pick_track(transcript_api_tracks(listed, ['en'], False), ['en'], False).language == 'de'
+    track = pick_track(transcript_api_tracks(listed, ['en'], True), ['en'], True)
+    assert (track.language, track.translated_from, track.transcript) == ('en', 'de', listed[0])
+    track = pick_track(transcript_api_tracks(listed, ['de', 'en'], True), ['de', 'en'], True)
+    assert (track.language, track.translated_from) == ('de', None)
+
+
+def test_nothing_usable():
+    assert pick_track([]) is None
+    assert pick_track([CaptionTrack('en', 'auto', 'u', translated_from='de')], ['en'], translate=False) is None
+
+
+def test_language_rank_and_header():
+    assert language_rank('en', ['de', 'en']) == 2
+    assert language_rank('en-US', ['de', 'en']) == 3
+    assert language_rank('ja', ['de', 'en']) is None
+    assert accept_language(['de', 'en', 'fr']) == 'de,en;q=0.9,fr;q=0.8'
@@ -0,0 +1,44 @@
+import os
+import time
+
+from chat_store import ChatHistoryStore
+
+
+def test_append_and_load(tmp_path):
+    store = ChatHistoryStore('s1', data_dir=str(tmp_path))
+    for i in range(5):
+        store.append('user' if i % 2 == 0 else 'assistant', f"message {i} ünïcode")
+    assert len(store) == 5
+    assert [m['content'] for m in store.load(1, 3)] == ["message 1 ünïcode", "message 2 ünïcode"]
+    assert store.tail(2)[-1] == {'role': 'user', 'content': "message 4 ünïcode"}
+
+    reopened = ChatHistoryStore('s1', data_dir=str(tmp_path))
+    assert len(reopened) == 5
+    reopened.clear()
+    assert len(reopened) == 0 and reopened.load(0) == []
+
+
+def test_old_logs_are_swept_when_a_session_starts(tmp_path):
+    old = ChatHistoryStore('old', data_dir=str(tmp_path))
+    old.append('user', "hi")
+    recent = ChatHistoryStore('recent', data_dir=str(tmp_path))
+    recent.append('user', "hello")
+    two_days_ago = time.time() - 48 * 3600
+    os.utime(old.path, (two_days_ago, two_days_ago))
+
+    ChatHistoryStore('new', data_dir=str(tmp_path), max_age_hours=24)
+    assert not os.path.exists(old.path)
+    assert os.path.exists(recent.path)
+
+    # The swept session carries on with an empty history
+    assert old.load(0) == []
+    old.append('user', "back again")
+    assert old.load(0) == [{'role': 'user', 'content': "back again"}]
+
+
+def test_zero_age_keeps_everything(tmp_path):
+    old = ChatHistoryStore('old', data_dir=str(tmp_path))
+    old.append('user', "hi")
+    os.utime(old.path, (0, 0))
+    ChatHistoryStore('new', data_dir=str(tmp_path), max_age_hours=0)
+    assert os.path.exists(old.path)
@@ -0,0 +1,115 @@
+import random
+import time
+
+import pytest
+
+from chunking import CHARS_PER_TOKEN, chunk_segments
+
+WORDS = "the a model video data speaker shows how we can build train test results small large fast".split()
+
+
+def make_segments(n, seed=0, sentence_every=4, gap_every=0):
+    """n caption segments a few seconds apart, every sentence_every-th ending a sentence"""
+    rng = random.Random(seed)
+    segments, start = [], 0.0
+    for i in range(n):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+        if sentence_every and i % sentence_every == sentence_every - 1:
+            text += '.'
+        duration = rng.uniform(1.5, 4.0)
+        segments.append({'start': round(start, 3), 'duration': duration, 'text': text})
+        start += duration - 0.2  # Auto captions overlap a little
+        if gap_every and i % gap_every == gap_every - 1:
+            start += 1.5
+    return segments
+
+
+def tokens(segments):
+    return sum((len(seg['text']) + 1) / CHARS_PER_TOKEN for seg in segments)
+
+
+def spans(segments, chunks):
+    """(first, end) segment index range of each chunk; checks it matches the chunk's times and text"""
+    by_start = {seg['start']: i for i, seg in enumerate(segments)}
+    result = []
+    for chunk in chunks:
+        first = by_start[chunk['start']]
+        end = first + 1
+        while ' '.join(seg['text'] for seg in segments[first:end]) != chunk['text']:
+            end += 1
+            assert end <= len(segments)
+        assert chunk['end'] == pytest.approx(segments[end - 1]['start'] + segments[end - 1]['duration'])
+        result.append((first, end))
+    return result
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_budget_coverage_and_overlap(seed):
+    segments = make_segments(400, seed)
+    chunks = chunk_segments(segments, max_tokens=120, overlap_tokens=20)
+    ranges = spans(segments, chunks)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(segments)
+    for first, end in ranges:
+        assert tokens(segments[first:end]) <= 120
+    for (first, end), (next_first, next_end) in zip(ranges, ranges[1:]):
+        assert first < next_first <= end  # Every segment covered, in order, always moving forward
+        assert next_end > end
+        assert tokens(segments[next_first:end]) <= 20
+
+
+def test_cuts_at_sentence_ends():
+    segments = make_segments(300, sentence_every=3)
+    chunks = chunk_segments(segments, max_tokens=100, overlap_tokens=40)
+    assert len(chunks) > 5
+    assert all(chunk['text'].endswith('.') for chunk in chunks[:-1])
+    # The overlap starts at a sentence when it holds a sentence start
+    ranges = spans(segments, chunks)
+    starts_sentence = [i == 0 or segments[i - 1]['text'].endswith('.') for i in range(len(segments))]
+    at_sentence = 0
+    for (_, end), (next_first, _) in zip(ranges, ranges[1:]):
+        assert starts_sentence[next_first] or not any(starts_sentence[next_first:end])
+        at_sentence += starts_sentence[next_first] and next_first < end
+    assert at_sentence > 3
+
+
+def test_cuts_at_pauses_without_punctuation():
+    segments = make_segments(300, sentence_every=0, gap_every=3)
+    chunks = chunk_segments(segments, max_tokens=100, overlap_tokens=0)
+    for (first, end) in spans(segments, chunks)[:-1]:
+        last, following = segments[end - 1], segments[end]
+        assert following['start'] - (last['start'] + last['duration']) >= 0.8
+
+
+def test_oversize_segment_is_its_own_chunk():
+    segments = make_segments(20)
+    segments[10] = dict(segments[10], text="word " * 400 + "end.")
+    chunks = chunk_segments(segments, max_tokens=100, overlap_tokens=20)
+    ranges = spans(segments, chunks)
+    assert (10, 11) in ranges
+    for first, end in ranges:
+        assert end - first == 1 or tokens(segments[first:end]) <= 100
+    assert ranges[-1][1] == len(segments)
+
+
+def test_no_overlap():
+    segments = make_segments(200)
+    ranges = spans(segments, chunk_segments(segments, max_tokens=80, overlap_tokens=0))
+    assert all(end == next_first for (_, end), (next_first, _) in zip(ranges, ranges[1:]))
+
+
+def test_empty_and_short_input():
+    assert chunk_segments([]) == []
+    segments = make_segments(3)
+    chunks = chunk_segments(segments)
+    assert len(chunks) == 1
+    assert chunks[0]['text'] == ' '.join(seg['text'] for seg in segments)
+    assert chunks[0]['start'] == segments[0]['start']
+
+
+def test_long_transcript_is_fast():
+    segments = make_segments(5000)  # About four hours of auto captions
+    started = time.perf_counter()
+    chunk_segments(segments)
+    # Takes a few tens of milliseconds; the bound only catches a return to quadratic behaviour
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+
+
+def test_unlimited():
+    deadline = Deadline()
+    assert deadline.remaining() == float('inf')
+    assert not deadline.expired()
+    assert deadline.timeout(None, "stage") is None
+    assert deadline.timeout(5, "stage") == 5
+
+
+def test_timeout_is_capped_by_time_left():
+    deadline = Deadline(2)
+    assert deadline.timeout(10, "stage") <= 2
+    assert deadline.timeout(1, "stage") == 1
+
+
+def test_expired_check_names_the_stage():
+    with pytest.raises(DeadlineExceeded) as info:
+        Deadline(0).check("the download")
+    assert info.value.stage == "the download"
+
+
+def test_limit_never_outlasts_the_parent():
+    assert Deadline(100).limit(5).remaining() <= 5
+    assert Deadline(1).limit(5).remaining() <= 1
+    assert Deadline().limit(5).remaining() <= 5
+
+
+def test_run_returns_and_raises():
+    deadline = Deadline(5)
+    assert deadline.run("stage", lambda x: x * 2, 21) == 42
+    with pytest.raises(KeyError):
+        deadline.run("stage", {}.__getitem__, 'missing')
+
+
+def test_cancel_abandons_a_running_call():
+    deadline = Deadline(30)
+    release = threading.Event()
+    threading.Timer(0.2, deadline.cancel).start()
+    started = time.monotonic()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            deadline.run("the slow call", release.wait, 30)
+    finally:
+        release.set()
+    assert time.monotonic() - started < 5
+    assert deadline.cancelled and deadline.expired() and deadline.remaining() == 0
+
+
+def test_cancel_ends_an_unlimited_deadline():
+    deadline = Deadline()
+    deadline.cancel()
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("stage")
@@ -0,0 +1,73 @@
+import numpy as np
+
+from embeddings import EmbeddingStore, HashingEmbedder, index_video
+
+DIM = 8
+
+
+def chunks_for(video_id, n):
+    return [{'start': float(i), 'end': float(i + 1), 'text': f"{video_id} chunk {i}"} for i in range(n)]
+
+
+def unit_vectors(first, n):
+    vectors = np.zeros((n, DIM), dtype=np.float32)
+    for i in range(n):
+        vectors[i, (first + i) % DIM] = 1
+        vectors[i, (first + i + 1) % DIM] = 0.5 * (first + i + 1)  # Distinct directions
+    return vectors
+
+
+def assert_finds_own_chunks(store, video_id, vectors):
+    for i, vector in enumerate(vectors):
+        assert store.search(vector, k=1)[0]['text'] == f"{video_id} chunk {i}"
+
+
+def test_add_search_and_replace(tmp_path):
+    store = EmbeddingStore(DIM, str(tmp_path))
+    store.add('a', chunks_for('a', 3), unit_vectors(0, 3))
+    store.add('b', chunks_for('b', 2), unit_vectors(3, 2))
+    assert len(store) == 5
+    assert_finds_own_chunks(store, 'b', unit_vectors(3, 2))
+
+    store.add('a', chunks_for('a', 1), unit_vectors(5, 1))
+    assert len(store) == 3
+    assert {hit['video_id'] for hit in store.search(unit_vectors(0, 1)[0], k=10)} == {'a', 'b'}
+    assert [hit['video_id'] for hit in store.search(unit_vectors(3, 1)[0], k=10, video_ids=['a'])] == ['a']
+
+
+def test_stores_sharing_a_directory(tmp_path):
+    # Two processes' stores on the same files: appends interleave without clobbering each other's rows
+    first, second = EmbeddingStore(DIM, str(tmp_path)), EmbeddingStore(DIM, str(tmp_path))
+    first.add('a', chunks_for('a', 2), unit_vectors(0, 2))
+    second.add('b', chunks_for('b', 2), unit_vectors(2, 2))
+    first.add('c', chunks_for('c', 2), unit_vectors(4, 2))
+    second.add('a', chunks_for('a', 1), unit_vectors(6, 1))
+
+    for store in (first, second, EmbeddingStore(DIM, str(tmp_path))):
+        assert len(store) == 5
+        assert_finds_own_chunks(store, 'b', unit_vectors(2, 2))
+        assert_finds_own_chunks(store, 'c', unit_vectors(4, 2))
+        assert_finds_own_chunks(store, 'a', unit_vectors(6, 1))
+
+
+def test_opening_leaves_other_writers_vectors_alone(tmp_path):
+    store = EmbeddingStore(DIM, str(tmp_path))
+    store.add('a', chunks_for('a', 2), unit_vectors(0, 2))
+    with open(store.vectors_path, "ab") as f:
+        f.write(unit_vectors(2, 1).tobytes())  # Another writer's append, not committed yet
+    EmbeddingStore(DIM, str(tmp_path))
+    assert len(open(store.vectors_path, "rb").read()) == 3 * DIM * 4
+
+    # Left over from an interrupted append: the next append writes over it
+    store.add('b', chunks_for('b', 1), unit_vectors(5, 1))
+    assert len(open(store.vectors_path, "rb").read()) == 3 * DIM * 4
+    assert_finds_own_chunks(store, 'b', unit_vectors(5, 1))
+
+
+def test_index_video(tmp_path):
+    embedder = HashingEmbedder(dim=64)
+    store = EmbeddingStore(embedder.dim, str(tmp_path))
+    segments = [{'start': i * 3.0, 'duration': 3.0, 'text': f"Sentence {i} is about topic {i}."} for i in range(200)]
+    assert index_video(store, embedder, 'vid', segments) > 1
+    assert store.has_video('vid') and not store.has_video('other')
+    assert store.search(embedder.embed_query("sentence 150 topic 150"), k=1)[0]['start'] <= 150 * 3.0
@@ -0,0 +1,28 @@
+import pipeline
+from deadline import Deadline
+
+
+class FakeTranscript:
+    def __init__(self, language_code, is_generated, entries):
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.is_translatable = False
+        self.translation_languages = []
+        self.entries = entries
+
+    def fetch(self):
+        return self.entries
+
+
+def test_transcript_api_is_a_fetch_method():
+    assert pipeline.get_fetch_strategy().methods['transcript-api'] is pipeline.get_transcript_method1
+
+
+def test_transcript_api_picks_a_preferred_track_and_reports_its_language(monkeypatch):
+    entries = [{'start': i * 2.0, 'duration': 2.0, 'text': f"Line number {i} of the captions"} for i in range(10)]
+    listed = [FakeTranscript('fr', False, entries[:5]), FakeTranscript('en-US', True, entries)]
+    monkeypatch.setattr(pipeline.YouTubeTranscriptApi, 'list_transcripts', lambda video_id: listed)
+    record = pipeline.get_transcript_method1('abc123def45', Deadline(5))
+    assert record['language'] == 'en-US'
+    assert record['source'] == 'transcript-api'
+    assert len(record['segments']) == 10
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from deadline import Deadline
+from hedging import Hedger
+
+
+def make_hedger(max_rate=1.0):
+    hedger = Hedger(percentile=50, max_rate=max_rate, min_samples=1)
+    hedger.record('k', 0.05)  # Hedge after 50 ms
+    return hedger
+
+
+def slow_primary(release):
+    def attempt(hedge):
+        if hedge:
+            return hedge
+        release.wait(5)
+        return 'primary'
+    return attempt
+
+
+def test_fast_call_is_not_hedged():
+    hedger = make_hedger()
+    assert hedger.call('k', lambda hedge: 'primary', Deadline(5)) == 'primary'
+    assert hedger.stats()['hedges'] == 0
+
+
+def test_hedge_gets_what_prepare_returns():
+    hedger, release = make_hedger(), threading.Event()
+    try:
+        assert hedger.call('k', slow_primary(release), Deadline(5), prepare=lambda: 'reservation') == 'reservation'
+    finally:
+        release.set()
+    stats = hedger.stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+
+
+def test_no_hedge_when_prepare_declines():
+    hedger, attempts = make_hedger(), []
+
+    def attempt(hedge):
+        attempts.append(hedge)
+        time.sleep(0.15)
+        return 'primary'
+
+    assert hedger.call('k', attempt, Deadline(5), prepare=lambda: None) == 'primary'
+    assert attempts == [False]
+    assert hedger.stats()['hedges'] == 0
+    assert not any(call.hedged for call in hedger._calls)
+
+
+def test_hedge_is_recorded_against_its_own_call():
+    hedger, release = make_hedger(max_rate=0.5), threading.Event()
+    result = []
+    slow = threading.Thread(target=lambda: result.append(hedger.call('k', slow_primary(release), Deadline(5))))
+    slow.start()
+    # A second call starts (and finishes) while the first is still waiting to hedge
+    assert hedger.call('k', lambda hedge: 'fast', Deadline(5)) == 'fast'
+    slow.join(5)
+    release.set()
+    assert result == [True]
+    assert [call.hedged for call in hedger._calls] == [True, False]
@@ -0,0 +1,44 @@
+import sqlite3
+
+from library_index import TranscriptLibrary, content_hash
+
+SEGMENTS = [
+    {'start': 0.0, 'duration': 2.0, 'text': "Welcome back to the channel."},
+    {'start': 2.0, 'duration': 3.0, 'text': "Today we look at  sourdough."},
+]
+
+
+def test_content_hash_ignores_segmentation_and_timing():
+    resplit = [
+        {'start': 0.1, 'duration': 1.0, 'text': "Welcome back"},
+        {'start': 1.1, 'duration': 1.5, 'text': "to the channel.\nToday"},
+        {'start': 2.6, 'duration': 2.0, 'text': "we look at sourdough. "},
+    ]
+    assert content_hash(resplit) == content_hash(SEGMENTS)
+
+
+def test_content_hash_changes_with_the_words():
+    edited = [dict(SEGMENTS[0]), dict(SEGMENTS[1], text="Today we look at rye.")]
+    assert content_hash(edited) != content_hash(SEGMENTS)
+
+
+def test_add_and_get_video(tmp_path):
+    library = TranscriptLibrary(str(tmp_path / "library.db"))
+    library.add_video('vid', SEGMENTS, title="Bread", language='en', source='test')
+    record = library.get_video('vid')
+    assert record['segments'] == SEGMENTS
+    assert record['content_hash'] == content_hash(SEGMENTS)
+    assert library.get_video('missing') is None
+
+
+def test_old_hashes_are_recomputed_on_open(tmp_path):
+    path = str(tmp_path / "library.db")
+    TranscriptLibrary(path).add_video('vid', SEGMENTS)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE videos SET content_hash = 'timing-based' WHERE video_id = 'vid'")
+        conn.execute("PRAGMA user_version = 0")
+    conn.close()
+
+    assert TranscriptLibrary(path).get_video('vid')['content_hash'] == content_hash(SEGMENTS)
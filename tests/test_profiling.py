@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from profiling import ProfileStore, StackSampler, in_context
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_keep_nothing(tmp_path):
+    store = ProfileStore(str(tmp_path), keep=0)
+    assert not store.add({'id': 'x', 'seconds': 1.0}, None, StackSampler(threading.get_ident()))
+    assert store.slowest() == []
+
+
+def test_keeps_the_slowest(tmp_path):
+    store = ProfileStore(str(tmp_path), keep=2)
+    sampler = StackSampler(threading.get_ident())
+    for i, seconds in enumerate([1.0, 3.0, 2.0, 0.5]):
+        store.add({'id': str(i), 'seconds': seconds}, None, sampler)
+    assert [e['seconds'] for e in store.slowest()] == [3.0, 2.0]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['1.collapsed', '2.collapsed', 'index.json']
+
+
+def test_samples_the_request_and_its_workers_only():
+    other = threading.Thread(target=spin, args=(0.6,), name="other-request")
+    other.start()
+    sampler = StackSampler(threading.get_ident(), interval=0.002)
+    token = profiling._sampler.set(sampler)
+    sampler.start()
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker") as pool:
+            pool.submit(in_context(spin), 0.3).result()
+    finally:
+        sampler.stop()
+        profiling._sampler.reset(token)
+    other.join()
+    roots = {stack.split(';', 1)[0] for stack in sampler.samples}
+    assert roots == {"request", "thread worker_0"}
@@ -0,0 +1,49 @@
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from llm import reserve_within
+from quota import QuotaExceeded, QuotaLedger, SQLiteQuotaBackend
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return QuotaLedger(SQLiteQuotaBackend(str(tmp_path / "quota.db")), rpm=10, tpm=1000, max_wait=0)
+
+
+def test_reserve_and_reconcile(ledger):
+    reservation = ledger.reserve(300)
+    assert ledger.usage()['requests'] == 1 and ledger.usage()['tokens'] == 300
+    ledger.reconcile(reservation, 120)
+    assert ledger.usage()['tokens'] == 120
+
+
+def test_token_limit(ledger):
+    ledger.reserve(800)
+    with pytest.raises(QuotaExceeded):
+        ledger.reserve(300)
+    assert ledger.usage()['requests'] == 1
+
+
+def test_paced_once_half_the_requests_are_used(ledger):
+    for _ in range(5):
+        ledger.reserve(10)
+    with pytest.raises(QuotaExceeded):
+        ledger.reserve(10)
+
+
+def test_rate_limited_blocks_everyone(ledger, tmp_path):
+    other = QuotaLedger(SQLiteQuotaBackend(str(tmp_path / "quota.db")), rpm=10, tpm=1000, max_wait=0)
+    ledger.report_rate_limited(cooldown=30)
+    with pytest.raises(QuotaExceeded):
+        other.reserve(10)
+
+
+def test_reserve_within_names_the_binding_limit(tmp_path):
+    busy = QuotaLedger(SQLiteQuotaBackend(str(tmp_path / "busy.db")), rpm=10, tpm=1000, max_wait=0.5)
+    busy.report_rate_limited(cooldown=30)
+    with pytest.raises(DeadlineExceeded):
+        reserve_within(busy, 10, Deadline(1))
+    with pytest.raises(QuotaExceeded):
+        reserve_within(busy, 10, Deadline(60))
+    with pytest.raises(QuotaExceeded):
+        reserve_within(busy, 10, Deadline())
@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from scheduler import BATCH, INTERACTIVE, SUMMARY, LLMScheduler, llm_job
+
+
+def queue_up(scheduler, jobs):
+    """Queue jobs of (user, priority) behind a held slot, release it, and return the order they ran in"""
+    order, threads = [], []
+
+    def run(user, priority):
+        with llm_job(user, priority), scheduler.slot():
+            order.append((user, priority))
+
+    with scheduler.slot():
+        for user, priority in jobs:
+            thread = threading.Thread(target=run, args=(user, priority))
+            thread.start()
+            threads.append(thread)
+            # Queue them one at a time, so arrival order is fixed
+            while sum(c['queued'] for c in scheduler.stats()['classes'].values()) < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_priority_then_users_take_turns():
+    jobs = [('bulk', BATCH), ('ann', INTERACTIVE), ('ann', INTERACTIVE), ('bob', INTERACTIVE), ('cy', SUMMARY)]
+    assert queue_up(LLMScheduler(concurrency=1), jobs) == [
+        ('ann', INTERACTIVE), ('bob', INTERACTIVE), ('ann', INTERACTIVE), ('cy', SUMMARY), ('bulk', BATCH),
+    ]
+
+
+def test_queue_wait_respects_the_deadline():
+    scheduler = LLMScheduler(concurrency=1)
+    with scheduler.slot():
+        with pytest.raises(DeadlineExceeded):
+            with scheduler.slot(Deadline(0.6)):
+                pass
+        assert scheduler.stats()['classes']['summary']['queued'] == 0
+    with scheduler.slot(Deadline(1)):
+        assert scheduler.stats()['active'] == 1
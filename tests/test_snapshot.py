@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from snapshot import Snapshot, SnapshotError, SnapshotWriter, warm_start
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_sample(path):
+    writer = SnapshotWriter(path)
+    writer.add_json('meta', {'videos': ['a', 'b'], 'note': 'ünïcode'})
+    writer.add_texts('texts', ['first', '', 'third'])
+    writer.add_array('vectors', np.arange(4096, dtype=np.float32).reshape(512, 8))
+    writer.close(embedder='hashing', dim=8)
+
+
+def test_sections_round_trip(tmp_path):
+    path = str(tmp_path / "sample.tmsnap")
+    write_sample(path)
+    with Snapshot(path) as snap:
+        assert snap.header['embedder'] == 'hashing'
+        assert snap.json('meta') == {'videos': ['a', 'b'], 'note': 'ünïcode'}
+        assert snap.json('missing', 'default') == 'default'
+        assert snap.texts('texts') == ['first', '', 'third']
+        vectors = snap.array('vectors')
+        assert vectors.shape == (512, 8)
+        assert np.array_equal(vectors, np.arange(4096, dtype=np.float32).reshape(512, 8))
+        del vectors
+
+
+@pytest.mark.parametrize("size", [0, 10, 100, 3000])
+def test_truncated_file_is_a_snapshot_error(tmp_path, size):
+    path = str(tmp_path / "cut.tmsnap")
+    write_sample(path)
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+    with pytest.raises(SnapshotError):
+        Snapshot(path)
+    assert warm_start.__wrapped__(path) is None
+
+
+def test_corrupt_section_is_a_snapshot_error(tmp_path):
+    path = str(tmp_path / "corrupt.tmsnap")
+    write_sample(path)
+    with Snapshot(path) as snap:
+        offset = snap._start + snap.header['sections']['meta']['offset']
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(b'\xff' * 8)
+    with Snapshot(path) as snap:
+        with pytest.raises(SnapshotError):
+            snap.json('meta')
+        with pytest.raises(SnapshotError):
+            snap.array('missing')
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b'PK\x03\x04' + b'\x00' * 100)
+    with pytest.raises(SnapshotError):
+        Snapshot(str(path))
+
+
+EXPORT = """
+from pipeline import get_library, get_answer_cache, index_once
+import snapshot
+segments = [{'start': i * 2.0, 'duration': 2.0, 'text': f'Sentence {i} about topic {i % 5}.'} for i in range(300)]
+get_library().add_video('abc123def45', segments, title='Sample', language='en', source='yt-dlp')
+get_library().save_digest('abc123def45', {'summary': 'S', 'chapters': [], 'key_points': [], 'takeaways': []})
+get_answer_cache().put('abc123def45', 'What is topic 3?', 'Topic three', exact=True)
+index_once('abc123def45', segments)
+snapshot.export_snapshot(SNAPSHOT)
+"""
+
+IMPORT = """
+import json
+from pipeline import get_library, get_answer_cache, get_embedding_index
+import snapshot
+added = snapshot.import_snapshot(SNAPSHOT)
+library = get_library()
+print(json.dumps({
+    'added': added,
+    'segments': len(library.get_video('abc123def45')['segments']),
+    'digest': library.get_digest('abc123def45'),
+    'answers': get_answer_cache().items(),
+    'indexed': get_embedding_index()[1].has_video('abc123def45'),
+}))
+"""
+
+
+def run_in_data_dir(code, data_dir, snapshot_path):
+    # Stores are per-process singletons under TUBEMIND_DATA_DIR, so each side runs in its own process
+    env = dict(os.environ, TUBEMIND_DATA_DIR=str(data_dir), TUBEMIND_EMBEDDER='hashing', GOOGLE_API_KEY='unused')
+    script = f"SNAPSHOT = {snapshot_path!r}\n" + textwrap.dedent(code)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return result.stdout
+
+
+def test_export_import_round_trip(tmp_path):
+    path = str(tmp_path / "replica.tmsnap")
+    run_in_data_dir(EXPORT, tmp_path / "source", path)
+    result = json.loads(run_in_data_dir(IMPORT, tmp_path / "target", path).strip().splitlines()[-1])
+
+    assert result['added']['videos'] == 1
+    assert result['added']['digests'] == 1
+    assert result['added']['chunks'] > 0
+    assert result['segments'] == 300
+    assert result['digest']['summary'] == 'S'
+    assert result['answers'] == [['abc123def45', 'topic 3', 'Topic three', True]]
+    assert result['indexed']
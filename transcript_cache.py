@@ -0,0 +1,170 @@
+"""
+Byte-bounded transcript cache shared by all sessions in a process
+Recently used transcripts stay as plain text, colder ones are kept zlib-compressed
+"""
+
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+# Byte budgets, configurable per deployment
+CACHE_MAX_BYTES = int(float(os.getenv("TUBEMIND_CACHE_MB", "64")) * 1024 * 1024)
+SESSION_MAX_BYTES = int(float(os.getenv("TUBEMIND_SESSION_CACHE_MB", "8")) * 1024 * 1024)
+
+
+class _Entry:
+    __slots__ = ('data', 'compressed', 'nbytes', 'raw_bytes', 'sessions')
+
+    def __init__(self, text):
+        self.data = text
+        self.compressed = False
+        self.nbytes = sys.getsizeof(text)
+        self.raw_bytes = self.nbytes
+        self.sessions = set()
+
+
+class TranscriptCache:
+    """LRU transcript cache with a per-process and a per-session byte budget"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, session_max_bytes=SESSION_MAX_BYTES, hot_entries=8, level=6):
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.hot_entries = hot_entries
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._sessions = {}            # session_id -> OrderedDict(key -> None), LRU order per session
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, session_id=None):
+        """Return the cached transcript (decompressing if cold), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._touch(key, entry, session_id)
+            if entry.compressed:
+                # Promote back to hot; another entry gets compressed in its place
+                text = zlib.decompress(entry.data).decode('utf-8')
+                self._set_data(entry, text, compressed=False)
+                self._cool_down()
+                self._enforce_budgets(session_id)
+            return entry.data
+
+    def put(self, key, text, session_id=None):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            entry = _Entry(text)
+            if old is not None:
+                self._bytes -= old.nbytes
+                entry.sessions = old.sessions
+
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            self._touch(key, entry, session_id)
+            self._cool_down()
+            self._enforce_budgets(session_id)
+
+    def release_session(self, session_id):
+        """Forget a session's claims; entries nobody else uses are freed"""
+        with self._lock:
+            for key in self._sessions.pop(session_id, {}):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry.sessions.discard(session_id)
+                if not entry.sessions:
+                    self._evict(key)
+
+    def session_keys(self, session_id):
+        return list(self._sessions.get(session_id, ()))
+
+    def stats(self, session_id=None):
+        """Memory accounting for display"""
+        with self._lock:
+            cold = sum(1 for e in self._entries.values() if e.compressed)
+            stats = {
+                'entries': len(self._entries),
+                'hot': len(self._entries) - cold,
+                'cold': cold,
+                'bytes': self._bytes,
+                'raw_bytes': sum(e.raw_bytes for e in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'sessions': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+            if session_id is not None:
+                stats['session_bytes'] = self._session_bytes(session_id)
+                stats['session_max_bytes'] = self.session_max_bytes
+            return stats
+
+    # Internal helpers - callers hold self._lock
+
+    def _touch(self, key, entry, session_id):
+        self._entries.move_to_end(key)
+        if session_id is not None:
+            entry.sessions.add(session_id)
+            keys = self._sessions.setdefault(session_id, OrderedDict())
+            keys[key] = None
+            keys.move_to_end(key)
+
+    def _set_data(self, entry, data, compressed):
+        self._bytes -= entry.nbytes
+        entry.data = data
+        entry.compressed = compressed
+        entry.nbytes = len(data) if compressed else sys.getsizeof(data)
+        self._bytes += entry.nbytes
+
+    def _cool_down(self):
+        """Compress everything outside the hot_entries most recently used"""
+        hot = 0
+        for entry in reversed(self._entries.values()):
+            if entry.compressed:
+                continue
+            hot += 1
+            if hot > self.hot_entries:
+                self._set_data(entry, zlib.compress(entry.data.encode('utf-8'), self.level), compressed=True)
+
+    def _session_bytes(self, session_id):
+        return sum(self._entries[k].nbytes for k in self._sessions.get(session_id, ()) if k in self._entries)
+
+    def _enforce_budgets(self, session_id):
+        # Per-session budget: the session drops its own least recently used claims
+        if session_id is not None:
+            keys = self._sessions.get(session_id)
+            while keys and len(keys) > 1 and self._session_bytes(session_id) > self.session_max_bytes:
+                key, _ = keys.popitem(last=False)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.sessions.discard(session_id)
+                    if not entry.sessions:
+                        self._evict(key)
+
+        # Process budget: drop globally least recently used entries
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._evict(key)
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+        self.evictions += 1
+        for session_id in entry.sessions:
+            keys = self._sessions.get(session_id)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del self._sessions[session_id]